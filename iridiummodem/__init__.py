@@ -7,3 +7,18 @@ Built on top of python-gsmmodem by Francois Aucamp <francois.aucamp@gmail.com>
 """
 
 from iridiummodem.modem import IridiumModem
+from iridiummodem.timeouts import CommandTimeoutPolicy
+from iridiummodem.aio import AsyncIridiumModem
+from iridiummodem.pool import ModemPool
+from iridiummodem.reactor import SerialReactor
+from iridiummodem.scheduler import SBDSessionScheduler
+from iridiummodem.sbdqueue import SBDRecordQueue
+from iridiummodem.indicators import IndicatorMonitor
+from iridiummodem.sampler import SignalSampler
+from iridiummodem.capabilities import CapabilityStore
+from iridiummodem.arbiter import CommandArbiter
+from iridiummodem.cache import PropertyCache
+from iridiummodem.clock import IridiumClock
+from iridiummodem.gps import PositionStream
+from iridiummodem.track import TrackCompressor
+from iridiummodem.compression import CodecRegistry
@@ -0,0 +1,327 @@
+""" asyncio interface to Iridium modems
+
+AsyncIridiumModem drives the serial port from the event loop instead of a
+reader thread: the port is opened non-blocking and watched with the loop's
+reader/writer callbacks, and each AT command is a coroutine that completes
+when the modem's final result code arrives.
+
+Timeouts raise gsmmodem's TimeoutException, as for IridiumModem; they can
+also be imposed from outside with asyncio.wait_for(). If a command is
+cancelled or times out, whatever the modem still sends for it is collected
+and thrown away before the next command is written, so a late response can
+never be taken as the answer to a different command: until the abandoned
+response has ended, further commands fail with TimeoutException without
+being sent. Reconnect to start afresh with a modem that never answers.
+
+Posix only, as it relies on loop.add_reader() for the serial port.
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+import serial
+
+from gsmmodem.modem import GsmModem
+from gsmmodem.serial_comms import SerialComms
+from gsmmodem.exceptions import CommandError, CmeError, CmsError, InvalidStateException, TimeoutException
+
+from iridiummodem.modem import IridiumProtocol, SBDFrameReader, SBDStateTracker, TERMINATOR
+from iridiummodem.timeouts import CommandTimeoutPolicy
+
+
+class _PendingResponse(object):
+    """ Response lines collected for the command currently written to the modem """
+    def __init__(self, future, expectedResponseTermSeq=None):
+        self.future = future
+        self.lines = []
+        self.expectedResponseTermSeq = expectedResponseTermSeq
+
+
+class AsyncIridiumModem(IridiumProtocol):
+    """ asyncio counterpart of IridiumModem
+
+    Usage::
+
+        async with AsyncIridiumModem('/dev/ttyUSB0') as modem:
+            status = await modem.initiateSBDSession()
+
+    Unsolicited lines from the modem are passed to notificationCallbackFunc
+    (as a list of lines) from the event loop.
+    """
+    log = logging.getLogger('iridiummodem.aio.AsyncIridiumModem')
+    # Same meaning as IridiumModem.leanSBDTransactions
+    leanSBDTransactions = False
+    # Same meaning as IridiumModem.payloadCodecs
+    payloadCodecs = None
+
+    def __init__(self, port, baudrate=19200, notificationCallbackFunc=None):
+        self.port = port
+        self.baudrate = baudrate
+        self.notificationCallback = notificationCallbackFunc
+        self.serial = None
+        self.timeoutPolicy = CommandTimeoutPolicy()
+        self._modelName = None
+        self._sbdState = SBDStateTracker()
+        self._sbdFrame = None # SBDFrameReader for an AT+SBDRB in progress
+        self._loop = None
+        self._lock = None # asyncio.Lock serialising commands, created by connect()
+        self._pending = None # _PendingResponse for the command in progress
+        self._rxBuffer = bytearray()
+        self._txBuffer = bytearray()
+        self._writerRegistered = False
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, excType, excValue, traceback):
+        self.close()
+
+    async def connect(self):
+        """ Opens the port and initializes the modem """
+        self.log.info('Connecting to modem on port %s at %dbps', self.port, self.baudrate)
+        self._loop = asyncio.get_running_loop()
+        self._lock = asyncio.Lock()
+        self._sbdState.reset()
+        self.serial = serial.Serial(port=self.port, baudrate=self.baudrate, timeout=0, dsrdtr=True, rtscts=True)
+        self._loop.add_reader(self.serial.fileno(), self._onReadable)
+        try:
+            await self.write('ATZ') # reset configuration
+            await self.write('ATE0') # echo off
+            await self.write('AT&K3')
+            await self.write('AT&D2')
+            try:
+                response = await self.write('AT+CGMM')
+                self._modelName = response[0] if len(response) > 1 else None
+            except (CommandError, TimeoutException):
+                self._modelName = None
+        except:
+            self.close()
+            raise
+
+    def close(self):
+        """ Stops watching the serial port and closes it """
+        if self.serial == None:
+            return
+        self._loop.remove_reader(self.serial.fileno())
+        if self._writerRegistered:
+            self._loop.remove_writer(self.serial.fileno())
+            self._writerRegistered = False
+        if self._pending != None and not self._pending.future.done():
+            self._pending.future.set_exception(InvalidStateException('modem closed'))
+        self._pending = None
+        self.serial.close()
+        self.serial = None
+
+    async def write(self, data, timeout=None, parseError=True, writeTerm=TERMINATOR, expectedResponseTermSeq=None):
+        """ Writes data to the modem and waits for the response
+
+        :param data: AT command (str) or raw data (bytes) to write
+        :param timeout: seconds to wait for the response; taken from self.timeoutPolicy if not given
+        :param parseError: if True, a CommandError is raised if the modem responds with an error
+        :param writeTerm: terminating sequence to append to the data
+        :param expectedResponseTermSeq: sequence that ends the response, if not a final result code
+
+        :raise CommandError: if the command returns an error (only if parseError is True)
+        :raise TimeoutException: if no response was received in time
+
+        :return: a list containing the response lines from the modem
+        """
+        async with self._lock:
+            return await self._command(data, timeout, parseError, writeTerm, expectedResponseTermSeq)
+
+    async def _command(self, data, timeout=None, parseError=True, writeTerm=TERMINATOR, expectedResponseTermSeq=None, sbdFrame=None):
+        """ Implementation of write(); the caller must hold self._lock
+
+        :param sbdFrame: SBDFrameReader to receive the binary part of the response (for AT+SBDRB)
+        """
+        if self.serial == None:
+            raise InvalidStateException('modem not connected')
+        policyTimeout = timeout == None
+        if policyTimeout:
+            timeout = self.timeoutPolicy.timeoutFor(data, self._modelName)
+        await self._discardAbandonedResponse(timeout)
+
+        self.log.debug('write: %s', data)
+        command = data
+        if isinstance(data, str):
+            data = data.encode()
+        if isinstance(writeTerm, str):
+            writeTerm = writeTerm.encode()
+        if expectedResponseTermSeq != None:
+            expectedResponseTermSeq = expectedResponseTermSeq.encode()
+        pending = _PendingResponse(self._loop.create_future(), expectedResponseTermSeq)
+        self._pending = pending
+        # Armed only now, so that the tail of an abandoned response is never read as message data
+        self._sbdFrame = sbdFrame
+        start = time.monotonic()
+        self._send(bytes(data) + writeTerm)
+        try:
+            # Shielded so that a timeout or cancellation leaves the response
+            # to be collected (and discarded) rather than misattributed
+            lines = await asyncio.wait_for(asyncio.shield(pending.future), timeout)
+        except asyncio.TimeoutError:
+            if policyTimeout:
+                self.timeoutPolicy.recordTimeout(command, timeout, self._modelName)
+            if len(pending.lines) > 0:
+                raise TimeoutException(list(pending.lines))
+            raise TimeoutException()
+        self.timeoutPolicy.record(command, time.monotonic() - start, self._modelName)
+        self.log.debug('response: %s', lines)
+        if parseError:
+            self._checkResponse(command, lines)
+        return lines
+
+    async def _discardAbandonedResponse(self, timeout):
+        """ Waits for the rest of the response to a cancelled or timed out command
+
+        :raise TimeoutException: if the response has not ended within timeout seconds
+        """
+        pending = self._pending
+        if pending != None and not pending.future.done():
+            try:
+                await asyncio.wait_for(asyncio.shield(pending.future), timeout)
+            except asyncio.TimeoutError:
+                self.log.debug('still waiting for the end of the response to an abandoned command: %s', pending.lines)
+                raise TimeoutException()
+
+    def _checkResponse(self, command, lines):
+        """ Raises the error reported by the final result code, as GsmModem.write does """
+        cmdStatusLine = lines[-1]
+        if 'ERROR' in cmdStatusLine:
+            cmErrorMatch = GsmModem.CM_ERROR_REGEX.match(cmdStatusLine)
+            if cmErrorMatch:
+                errorCode = int(cmErrorMatch.group(2))
+                if cmErrorMatch.group(1) == 'CME':
+                    raise CmeError(command, errorCode)
+                else:
+                    raise CmsError(command, errorCode)
+            raise CommandError(command)
+
+    def _send(self, data):
+        self._txBuffer.extend(data)
+        self._flush()
+
+    def _flush(self):
+        """ Writes as much of the transmit buffer as the port will take without blocking """
+        fd = self.serial.fileno()
+        try:
+            # os.write rather than Serial.write, which spins when the port would block
+            written = os.write(fd, self._txBuffer)
+        except BlockingIOError:
+            written = 0
+        del self._txBuffer[:written]
+        if len(self._txBuffer) > 0 and not self._writerRegistered:
+            self._loop.add_writer(fd, self._flush)
+            self._writerRegistered = True
+        elif len(self._txBuffer) == 0 and self._writerRegistered:
+            self._loop.remove_writer(fd)
+            self._writerRegistered = False
+
+    def _onReadable(self):
+        try:
+            data = self.serial.read(self.serial.in_waiting or 1)
+        except serial.SerialException as e:
+            self.log.error('serial port error: %s', e)
+            pending = self._pending
+            self.close()
+            if pending != None and not pending.future.done():
+                pending.future.set_exception(e)
+            return
+        if len(data) != 0:
+            self._dataReceived(data)
+
+    @property
+    def _expectResponseTermSeq(self):
+        """ Sequence ending the response to the command in progress, if not a final result code """
+        if self._pending != None:
+            return self._pending.expectedResponseTermSeq
+        return None
+
+    def _handleLineRead(self, line, checkForResponseTerm=True):
+        pending = self._pending
+        if pending != None and not (checkForResponseTerm and self.PARSER.isUnsolicited(line)):
+            pending.lines.append(line)
+            if not checkForResponseTerm or SerialComms.RESPONSE_TERM.match(line):
+                self._pending = None
+                if not pending.future.done():
+                    pending.future.set_result(pending.lines)
+        elif self.notificationCallback != None:
+            self.notificationCallback([line])
+        else:
+            self.log.debug('Unhandled unsolicited modem notification: %s', line)
+
+    async def signalStrength(self):
+        """ :return: The network signal strength as an integer between 0 and 5, or -1 if it is unknown """
+        return self._parseSignalStrength(await self.write('AT+CSQ'))
+
+    async def systemTime(self):
+        """ :return: The current GMT time as reported by the Iridium unit (datetime.datetime) """
+        return self._parseSystemTime(await self.write('AT-MSSTM'))
+
+    async def geoLocation(self):
+        return self._parseGeoLocation(await self.write('AT-MSGEO'))
+
+    async def gpsLocation(self):
+        return self._parseGpsLocation(await self.write('AT+GPSPOS'))
+
+    async def gpsFix(self):
+        return self._parseGpsFix(await self.write('AT+GPSPOS'))
+
+    async def getSBDStatus(self):
+        async with self._lock:
+            return await self._getSBDStatus()
+
+    async def _getSBDStatus(self):
+        ret = self._parseSBDStatus(await self._command('AT+SBDS'))
+        self._sbdState.sync(ret)
+        return ret
+
+    async def initiateSBDSession(self):
+        ret = self._parseSBDIX(await self.write('AT+SBDIX'))
+        known = self._sbdState.synced
+        if not self._sbdState.sessionCompleted(ret) and known:
+            self.log.debug('SBD session status does not match local status; will re-read with AT+SBDS')
+        return ret
+
+    async def clearIsuSBDOutboundMessage(self):
+        await self.write('AT+SBDD0')
+        self._sbdState.outboundCleared()
+
+    async def clearIsuSBDInboundMessage(self):
+        await self.write('AT+SBDD1')
+        self._sbdState.inboundCleared()
+
+    async def writeSBDMessageToIsu(self, msg):
+        async with self._lock:
+            payload = self._encodePayload(msg)
+            response = await self._command('AT+SBDWB='+format(len(payload.data)), expectedResponseTermSeq='READY')
+            if not self.SBDWB_READY_REGEX.match(response[0]):
+                raise CommandError()
+            try:
+                self._parseSBDWriteResult(await self._command(bytes(payload.data) + payload.generateChecksum, writeTerm=b''))
+            except CommandError:
+                self._sbdState.reset()
+                raise
+            if self.leanSBDTransactions and self._sbdState.synced:
+                self._sbdState.messageWritten()
+                ret = self._sbdState.snapshot()
+            else:
+                ret = await self._getSBDStatus()
+        msg.sequence = ret.outboundMSN
+        return ret
+
+    async def readSBDMessageFromIsu(self):
+        async with self._lock:
+            if self.leanSBDTransactions and self._sbdState.synced:
+                ret = self._sbdState.snapshot()
+            else:
+                ret = await self._getSBDStatus() # Get the sequence number
+            frame = SBDFrameReader()
+            try:
+                await self._command('AT+SBDRB', sbdFrame=frame)
+            finally:
+                self._sbdFrame = None
+        return self._decodePayload(frame.message(ret.inboundMSN))
@@ -0,0 +1,172 @@
+""" Sharing one modem between threads
+
+Only one command can be in progress on a serial port, so a thread that
+wants a quick status reading can find itself stuck behind a five minute
+SBD session with no idea how long it will wait. CommandArbiter queues the
+threads wanting the modem by priority, so short queries go ahead of long
+sessions that are still waiting, and turns a request away straight away
+when it cannot get the modem within its deadline. It also keeps track of
+how long requests have had to wait.
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from gsmmodem.exceptions import TimeoutException
+
+# Request priorities; lower numbers go first
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 10
+PRIORITY_LOW = 20
+
+
+class CommandRejectedError(TimeoutException):
+    """ Raised when a request cannot have the modem within its deadline
+
+    @ivar estimatedWait: how long (in seconds) the request was expected to wait
+    """
+
+    def __init__(self, label=None, estimatedWait=None):
+        super(CommandRejectedError, self).__init__(label)
+        self.estimatedWait = estimatedWait
+
+
+class CommandTicket(object):
+    """ A request for the modem, queued or in progress """
+
+    def __init__(self, priority, expected, label, queued):
+        self.priority = priority
+        self.expected = expected # seconds the request may hold the modem for
+        self.label = label
+        self.queued = queued
+        self.started = None
+
+    @property
+    def waited(self):
+        """ @return: seconds spent queued, or None if the request has not started """
+        return self.started - self.queued if self.started != None else None
+
+
+class CommandArbiter(object):
+    """ Grants one thread at a time the use of a modem, by priority and deadline
+
+    A thread holding the modem may claim it again (e.g. a property sending
+    several commands), which always succeeds straight away. Requests of equal
+    priority are served in the order they were made.
+    """
+    log = logging.getLogger('iridiummodem.arbiter.CommandArbiter')
+
+    def __init__(self, clock=time.monotonic, historySize=100):
+        self._clock = clock
+        self._condition = threading.Condition()
+        self._queue = [] # heap of (priority, sequence, ticket)
+        self._sequence = itertools.count()
+        self._holder = None # ticket of the request holding the modem
+        self._owner = None # thread holding the modem
+        self._depth = 0 # number of times the owner has claimed the modem
+        self._waits = deque(maxlen=historySize) # recent queue wait times
+        self.granted = 0
+        self.rejected = 0
+
+    @contextmanager
+    def claim(self, priority=PRIORITY_NORMAL, deadline=None, expected=30, label=None):
+        """ Holds the modem for the duration of a with block (see acquire()) """
+        ticket = self.acquire(priority, deadline, expected, label)
+        try:
+            yield ticket
+        finally:
+            self.release()
+
+    def acquire(self, priority=PRIORITY_NORMAL, deadline=None, expected=30, label=None):
+        """ Waits for the modem
+
+        @param priority: PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW or any other number
+        @param deadline: longest time (in seconds) to wait for the modem, or None to wait indefinitely
+        @param expected: longest time (in seconds) the request will hold the modem for
+        @param label: description of the request, for logging (e.g. the command)
+
+        @raise CommandRejectedError: if the modem is not expected to be free
+        within deadline, or did not become free within it
+        @return: the CommandTicket of the request
+        """
+        with self._condition:
+            if self._owner == threading.get_ident():
+                self._depth += 1
+                return self._holder
+            now = self._clock()
+            ticket = CommandTicket(priority, expected, label, now)
+            if deadline != None:
+                estimate = self._estimateWait(priority, now)
+                if estimate > deadline:
+                    self.rejected += 1
+                    self.log.debug('Rejecting %s: expected to wait %.1fs', label, estimate)
+                    raise CommandRejectedError(label, estimate)
+            entry = (priority, next(self._sequence), ticket)
+            heapq.heappush(self._queue, entry)
+            endTime = now + deadline if deadline != None else None
+            while self._holder != None or self._queue[0] is not entry:
+                wait = None
+                if endTime != None:
+                    wait = endTime - self._clock()
+                    if wait <= 0:
+                        self._queue.remove(entry)
+                        heapq.heapify(self._queue)
+                        self.rejected += 1
+                        # The request behind this one may be able to go now
+                        self._condition.notify_all()
+                        raise CommandRejectedError(label, deadline)
+                self._condition.wait(wait)
+            heapq.heappop(self._queue)
+            ticket.started = self._clock()
+            self._holder = ticket
+            self._owner = threading.get_ident()
+            self._depth = 1
+            self.granted += 1
+            self._waits.append(ticket.waited)
+            return ticket
+
+    def release(self):
+        """ Gives up a claim on the modem made by this thread """
+        with self._condition:
+            if self._owner != threading.get_ident():
+                raise RuntimeError('modem released by a thread that does not hold it')
+            self._depth -= 1
+            if self._depth == 0:
+                self._holder = None
+                self._owner = None
+                self._condition.notify_all()
+
+    def estimatedWait(self, priority=PRIORITY_NORMAL):
+        """ @return: the longest time (in seconds) a request made now with priority could wait """
+        with self._condition:
+            return self._estimateWait(priority, self._clock())
+
+    def _estimateWait(self, priority, now):
+        wait = 0
+        if self._holder != None:
+            wait += max(0, self._holder.started + self._holder.expected - now)
+        for queuedPriority, _, ticket in self._queue:
+            if queuedPriority <= priority:
+                wait += ticket.expected
+        return wait
+
+    @property
+    def queued(self):
+        """ @return: the number of requests waiting for the modem """
+        with self._condition:
+            return len(self._queue)
+
+    def stats(self):
+        """ @return: a dict of the number of requests granted and rejected, and the mean and
+        longest wait (in seconds) of the recently granted ones
+        """
+        with self._condition:
+            waits = list(self._waits)
+            return {'granted': self.granted, 'rejected': self.rejected, 'queued': len(self._queue),
+                    'meanWait': sum(waits) / len(waits) if len(waits) > 0 else 0.0,
+                    'maxWait': max(waits) if len(waits) > 0 else 0.0}
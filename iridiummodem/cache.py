@@ -0,0 +1,107 @@
+""" Caching of modem property reads
+
+Properties such as signalStrength and imei send a command every time they
+are read, so threads reading them at the same moment ask the modem the same
+question over and over. A PropertyCache keeps each value for a time to live
+chosen per property, and has concurrent readers of a property wait for the
+one command already in flight instead of sending their own.
+"""
+
+import threading
+import time
+
+# Time to live for values that never change while the modem is connected
+FOREVER = float('inf')
+
+# Time to live (in seconds) of each IridiumModem property; systemTime is a
+# clock reading, and is never cached
+DEFAULT_TTLS = {
+    'manufacturer': FOREVER,
+    'model': FOREVER,
+    'revision': FOREVER,
+    'imei': FOREVER,
+    'signalStrength': 10,
+    'signalStrengthFast': 2,
+    'geoLocation': 30,
+    'gpsLocation': 5,
+    'gpsFix': 5,
+}
+
+
+class _Flight(object):
+    """ A read in progress, which other readers of the same property wait for """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class PropertyCache(object):
+    """ Values of modem properties, each kept for its time to live
+
+    Properties without a time to live are not cached. Errors are never
+    cached, but are passed on to every reader waiting for the failed read.
+    """
+
+    def __init__(self, ttls=None, clock=time.monotonic):
+        """
+        @param ttls: property name: seconds; defaults to DEFAULT_TTLS
+        """
+        self.ttls = dict(DEFAULT_TTLS if ttls == None else ttls)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._values = {} # name: (value, expiry time)
+        self._flights = {} # name: _Flight
+        self.hits = 0 # reads answered from the cache
+        self.misses = 0 # reads that sent a command
+        self.coalesced = 0 # reads that waited for another thread's command
+
+    def get(self, name, fetch):
+        """ @return: the cached value of a property, or the result of calling fetch() to read it """
+        ttl = self.ttls.get(name)
+        if ttl == None:
+            return fetch()
+        with self._lock:
+            cached = self._values.get(name)
+            if cached != None and self._clock() < cached[1]:
+                self.hits += 1
+                return cached[0]
+            flight = self._flights.get(name)
+            if flight != None:
+                self.coalesced += 1
+                leader = False
+            else:
+                flight = self._flights[name] = _Flight()
+                self.misses += 1
+                leader = True
+        if not leader:
+            flight.done.wait()
+            if flight.error != None:
+                raise flight.error
+            return flight.value
+        try:
+            flight.value = fetch()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[name]
+                if flight.error == None:
+                    self._values[name] = (flight.value, self._clock() + ttl)
+            flight.done.set()
+        return flight.value
+
+    def invalidate(self, name=None):
+        """ Forgets the cached value of a property, or of all properties if name is None """
+        with self._lock:
+            if name == None:
+                self._values.clear()
+            else:
+                self._values.pop(name, None)
+
+    def stats(self):
+        """ @return: a dict of the hit, miss and coalesced read counts """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'coalesced': self.coalesced}
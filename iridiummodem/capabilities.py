@@ -0,0 +1,184 @@
+""" Cached modem capabilities
+
+GsmModem.connect() works through a long list of GSM set-up commands, most
+of which Iridium units reject. Which commands a unit accepts depends only
+on its model and firmware, so IridiumModem can probe once, remember the
+answers in a CapabilityStore and, on later connects to any unit of the
+same model and firmware revision, send just the commands that will work.
+
+Some commands fail only for a while (e.g. AT+SBDMTA? without network
+service), so a command found unsupported is probed again once the result
+is UNSUPPORTED_TTL old. Commands that time out are not recorded at all.
+
+tools/full-query.py fills a store with every command it knows about, and
+the response shape and latency seen for each.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+from iridiummodem.timeouts import commandVerb
+
+# Numbers in a response line, replaced with '#' in its shape
+NUMBER_REGEX = re.compile(r'\d+')
+
+# Seconds before a command found unsupported is probed again
+UNSUPPORTED_TTL = 7 * 24 * 3600
+
+
+def responseShape(lines):
+    """ @return: the lines of a command response, less blank lines and the final OK,
+    with each number replaced by '#' (e.g. ['+CSQ:#'] for a signal strength response)
+    """
+    if len(lines) > 0 and lines[-1] == 'OK':
+        lines = lines[:-1]
+    return [NUMBER_REGEX.sub('#', line) for line in lines if len(line) > 0]
+
+
+class CommandSupport(object):
+    """ What was learnt about one command when it was probed
+
+    shape is the responseShape() of the response, and latency the seconds
+    the unit took to answer; both are None if it did not answer. checked is
+    when the command was probed (seconds since the epoch), or None if not known.
+    """
+
+    def __init__(self, supported, shape=None, latency=None, checked=None):
+        self.supported = supported
+        self.shape = shape
+        self.latency = latency
+        self.checked = checked
+
+    def toDict(self):
+        return {'supported': self.supported, 'shape': self.shape, 'latency': self.latency, 'checked': self.checked}
+
+    @classmethod
+    def fromDict(cls, data):
+        if isinstance(data, bool):
+            return cls(data)
+        return cls(data.get('supported', False), data.get('shape'), data.get('latency'), data.get('checked'))
+
+
+class DeviceCapabilities(object):
+    """ What the units of one model and firmware revision support
+
+    imei is that of the unit the capabilities were last probed on, or (for
+    a copy made by forUnit()) of the unit connected to.
+    """
+
+    def __init__(self, imei=None, model=None, revision=None, commands=None, virtualIridium=False, clock=time.time):
+        self.imei = imei
+        self.model = model
+        self.revision = revision
+        self.commands = commands if commands != None else {} # command: CommandSupport
+        self.virtualIridium = virtualIridium
+        self._clock = clock
+
+    @property
+    def key(self):
+        return deviceKey(self.model, self.revision)
+
+    def forUnit(self, imei):
+        """ @return: a copy of the capabilities for the unit with the given IMEI """
+        return DeviceCapabilities(imei, self.model, self.revision, dict(self.commands), self.virtualIridium, self._clock)
+
+    def copy(self):
+        return self.forUnit(self.imei)
+
+    def record(self, command, supported, response=None, latency=None):
+        """ Records the outcome of sending command to the unit
+
+        @param response: the response lines, if the unit answered
+        @param latency: seconds the unit took to answer
+        """
+        shape = responseShape(response) if response != None else None
+        if latency != None:
+            latency = round(latency, 3)
+        self.commands[command] = CommandSupport(supported, shape, latency, round(self._clock()))
+
+    def supports(self, command):
+        """ @return: True or False if command has been probed, otherwise None
+
+        A command found unsupported more than UNSUPPORTED_TTL ago (or at an
+        unknown time) counts as not probed, so that it is tried again.
+        """
+        support = self.commands.get(command)
+        if support == None:
+            return None
+        if not support.supported and (support.checked == None or self._clock() - support.checked > UNSUPPORTED_TTL):
+            return None
+        return support.supported
+
+    def supportedCommands(self):
+        """ @return: a sorted list of the verbs (e.g. '+CSQ') of the commands the unit supports """
+        verbs = set(commandVerb(command) for command, support in self.commands.items() if support.supported)
+        verbs.discard(None)
+        return sorted(verbs)
+
+    def toDict(self):
+        return {'imei': self.imei, 'model': self.model, 'revision': self.revision,
+                'commands': dict((command, support.toDict()) for command, support in self.commands.items()),
+                'virtualIridium': self.virtualIridium}
+
+    @classmethod
+    def fromDict(cls, data):
+        commands = dict((command, CommandSupport.fromDict(support)) for command, support in data.get('commands', {}).items())
+        return cls(data.get('imei'), data.get('model'), data.get('revision'), commands, data.get('virtualIridium', False))
+
+
+def deviceKey(model, revision):
+    return '{0}/{1}'.format(model, revision)
+
+
+class CapabilityStore(object):
+    """ DeviceCapabilities for any number of models and firmware revisions, kept in a JSON file
+
+    Passing path=None keeps the store in memory only. The store keeps its own
+    copies of what is put in it and hands out copies, so it can be shared by
+    threads probing different units.
+    """
+    log = logging.getLogger('iridiummodem.capabilities.CapabilityStore')
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._devices = {}
+        if path != None and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+                for entry in data.get('devices', []):
+                    caps = DeviceCapabilities.fromDict(entry)
+                    self._devices[caps.key] = caps
+            except (ValueError, OSError) as e:
+                self.log.warning('Ignoring unreadable capability store %s: %s', path, e)
+
+    def get(self, model, revision):
+        """ @return: the DeviceCapabilities stored for a model and firmware revision, or None """
+        with self._lock:
+            caps = self._devices.get(deviceKey(model, revision))
+            return caps.copy() if caps != None else None
+
+    def put(self, caps):
+        """ Stores (and saves) the capabilities of a model and firmware revision """
+        with self._lock:
+            self._devices[caps.key] = caps.copy()
+            self._save()
+
+    def devices(self):
+        with self._lock:
+            return [caps.copy() for caps in self._devices.values()]
+
+    def _save(self):
+        if self.path == None:
+            return
+        data = {'devices': [caps.toDict() for caps in self._devices.values()]}
+        # Write then rename, so a crash never leaves a half-written store
+        tmpPath = self.path + '.tmp'
+        with open(tmpPath, 'w') as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+        os.replace(tmpPath, self.path)
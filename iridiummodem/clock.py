@@ -0,0 +1,135 @@
+""" Iridium network time kept by the local clock
+
+Iridium time is a count of 90ms ticks, so after reading it once (AT-MSSTM)
+the current time can be worked out from the local monotonic clock without
+asking the modem again. IridiumClock does that, with a bound on the error:
+half the command's round trip plus half a tick when the time is read, plus
+an allowance for the local clock drifting since. Reading the time costs no
+more than reading the local clock, which suits timestamping at high rates,
+and offset() gives the host clock's error for systems without NTP.
+"""
+
+import logging
+import time
+from datetime import datetime, timezone
+
+from gsmmodem.exceptions import CommandError
+
+from iridiummodem.iridiumtime import ERA_EPOCHS_MS, TICK_MS
+
+# Length of an Iridium time tick, in seconds
+TICK = TICK_MS / 1000.0
+
+# Shortest and longest wait (in seconds) before reading the time again, when a
+# reading could not bring the uncertainty within maxUncertainty
+MIN_RETRY_INTERVAL = 1
+MAX_RETRY_INTERVAL = 3600
+
+
+class IridiumClock(object):
+    """ Iridium (UTC) time extrapolated from occasional AT-MSSTM readings
+
+    @ivar lastStep: the difference (in seconds) between the last reading and
+    the time extrapolated from the one before it, or None
+    """
+    log = logging.getLogger('iridiummodem.clock.IridiumClock')
+
+    def __init__(self, modem, iridiumEra=2, driftRate=50e-6, maxUncertainty=None, clock=time.monotonic):
+        """
+        @param modem: IridiumModem to read the time from
+        @param iridiumEra: Start of Iridium clock base (0=1996, 1=2007, 2=2014 (default))
+        @param driftRate: how fast the local clock may drift, in seconds per second
+        @param maxUncertainty: re-read the time from the modem when the uncertainty
+        grows past this many seconds (None to only re-read when sync() is called);
+        if the round trip to the modem is too slow for a reading to meet it, the
+        time is re-read less and less often
+        @raise ValueError: if maxUncertainty is less than half a tick, which no reading can meet
+        """
+        if maxUncertainty != None and maxUncertainty < TICK / 2.0:
+            raise ValueError('maxUncertainty cannot be less than half an Iridium tick ({0}s)'.format(TICK / 2.0))
+        self.modem = modem
+        self.iridiumEra = iridiumEra
+        self.driftRate = driftRate
+        self.maxUncertainty = maxUncertainty
+        self._clock = clock
+        self._offset = None # UTC time (seconds since the epoch) less the local clock
+        self._syncedAt = None # local clock time of the last reading
+        self._syncUncertainty = None # uncertainty (seconds) at the time of the last reading
+        self._retryAt = None # local clock time before which maxUncertainty does not cause a re-read
+        self._retryInterval = MIN_RETRY_INTERVAL
+        self.lastStep = None
+
+    @property
+    def synced(self):
+        return self._offset != None
+
+    def sync(self):
+        """ Reads the time from the modem, keeping it if it is more accurate than the extrapolated time, or within maxUncertainty
+
+        @raise CommandError: if the modem does not report the time (e.g. no network service)
+        @return: the uncertainty (in seconds) of the time now
+        """
+        start = self._clock()
+        msstm = self.modem.PARSER.expect(self.modem.write('AT-MSSTM'), '-MSSTM')[0]
+        end = self._clock()
+        # The tick count read was current at some point during the round trip,
+        # and the time itself somewhere within that tick
+        readAt = (start + end) / 2.0
+        utc = ERA_EPOCHS_MS[self.iridiumEra] / 1000.0 + (int(msstm, 16) + 0.5) * TICK
+        uncertainty = (end - start) / 2.0 + TICK / 2.0
+        if self.synced:
+            self.lastStep = utc - (readAt + self._offset)
+            currentUncertainty = self._uncertaintyAt(readAt)
+            if abs(self.lastStep) > currentUncertainty + uncertainty:
+                self.log.warning('Iridium time stepped by %.3fs', self.lastStep)
+            elif uncertainty >= currentUncertainty and (self.maxUncertainty == None or uncertainty > self.maxUncertainty):
+                return self._uncertaintyAt(end) # The extrapolated time is still the better one
+        self._offset = utc - readAt
+        self._syncedAt = readAt
+        self._syncUncertainty = uncertainty
+        return self._uncertaintyAt(end)
+
+    def _uncertaintyAt(self, now):
+        return self._syncUncertainty + (now - self._syncedAt) * self.driftRate
+
+    def _check(self, now):
+        if not self.synced:
+            raise CommandError('Iridium time not known; call sync() first')
+        if self.maxUncertainty == None or self._uncertaintyAt(now) <= self.maxUncertainty:
+            return
+        if self._retryAt != None and now < self._retryAt:
+            return # The last reading could not do better; don't ask the modem on every call
+        if self.sync() > self.maxUncertainty:
+            self.log.debug('Iridium time read too slowly to meet maxUncertainty; reading it again in %ds', self._retryInterval)
+            self._retryAt = self._clock() + self._retryInterval
+            self._retryInterval = min(MAX_RETRY_INTERVAL, self._retryInterval * 2)
+        else:
+            self._retryAt = None
+            self._retryInterval = MIN_RETRY_INTERVAL
+
+    def timestamp(self):
+        """ @return: the current UTC time in seconds since the epoch, as time.time() would """
+        now = self._clock()
+        self._check(now)
+        return now + self._offset
+
+    def now(self):
+        """ @return: (the current UTC time as a datetime.datetime, its uncertainty in seconds) """
+        now = self._clock()
+        self._check(now)
+        return datetime.fromtimestamp(now + self._offset, timezone.utc), self._uncertaintyAt(now)
+
+    @property
+    def uncertainty(self):
+        """ @return: how far (in seconds) timestamp() may be from the true time, or None if not synced """
+        if not self.synced:
+            return None
+        return self._uncertaintyAt(self._clock())
+
+    def iridiumTime(self):
+        """ @return: the current Iridium time in ticks, as AT-MSSTM would report it """
+        return int((self.timestamp() - ERA_EPOCHS_MS[self.iridiumEra] / 1000.0) / TICK)
+
+    def offset(self, systemClock=time.time):
+        """ @return: how far (in seconds) the system clock is behind Iridium time """
+        return self.timestamp() - systemClock()
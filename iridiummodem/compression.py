@@ -0,0 +1,269 @@
+""" Compression of SBD message payloads
+
+An SBD message holds a few hundred bytes and is billed by the byte, so it
+is worth compressing telemetry before it goes out. A CodecRegistry holds
+the codecs both ends know about; each compressed payload starts with one
+byte naming the codec it was compressed with, so the receiving end knows
+how to decompress it and the sender can pick whichever codec does best
+for each message.
+
+Payloads this small are mostly too short for deflate to find repeats in,
+which is what a preset dictionary is for: trainDictionary() builds one from
+sample messages, and each end gives the same dictionary to its
+DeflateCodec. DeltaVarintCodec suits payloads made of fixed-width integer
+readings that change slowly.
+"""
+
+import heapq
+import struct
+import time
+import zlib
+from collections import Counter
+
+from iridiummodem.encoding import encodeSignedVarint, decodeSignedVarint
+
+# Codec numbers used in the header byte; applications can use the others
+RAW = 0
+DEFLATE = 1
+DELTA_VARINT = 2
+# Bytes compress() adds in front of the encoded payload; a payload that must
+# fit in an SBD message once compressed should be this much shorter
+HEADER_LENGTH = 1
+
+
+class RawCodec(object):
+    """ Leaves the payload as it is """
+    name = 'raw'
+
+    def __init__(self, codecId=RAW):
+        self.codecId = codecId
+
+    def encode(self, data):
+        return bytes(data)
+
+    def decode(self, data):
+        return bytes(data)
+
+
+class DeflateCodec(object):
+    """ zlib deflate (without the zlib header and checksum), optionally with a preset dictionary """
+
+    def __init__(self, codecId=DEFLATE, level=9, dictionary=None, name=None):
+        """
+        @param dictionary: preset dictionary (see trainDictionary()); the receiving end must use the same one
+        """
+        self.codecId = codecId
+        self.level = level
+        self.dictionary = bytes(dictionary) if dictionary != None else None
+        self.name = name if name != None else ('deflate+dict' if dictionary != None else 'deflate')
+
+    def _options(self):
+        return {'zdict': self.dictionary} if self.dictionary != None else {}
+
+    def encode(self, data):
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15, 9, zlib.Z_DEFAULT_STRATEGY, **self._options())
+        return compressor.compress(bytes(data)) + compressor.flush()
+
+    def decode(self, data):
+        decompressor = zlib.decompressobj(-15, **self._options())
+        try:
+            decoded = decompressor.decompress(bytes(data)) + decompressor.flush()
+        except zlib.error as e:
+            raise ValueError('invalid deflate data: {0}'.format(e))
+        if not decompressor.eof:
+            raise ValueError('truncated deflate data')
+        return decoded
+
+
+class DeltaVarintCodec(object):
+    """ Fixed-width integers, each written as its difference from the one before as a zigzag varint
+
+    Only payloads whose length is a multiple of width can be encoded.
+    """
+
+    def __init__(self, codecId=DELTA_VARINT, width=2, signed=True, byteOrder='<', name=None):
+        """
+        @param width: bytes per integer (1, 2, 4 or 8)
+        @param byteOrder: '<' for little endian, '>' for big endian
+        """
+        self.codecId = codecId
+        self.width = width
+        self._format = byteOrder + {1: 'b', 2: 'h', 4: 'i', 8: 'q'}[width]
+        if not signed:
+            self._format = self._format.upper()
+        self.name = name if name != None else 'delta-varint{0}'.format(width * 8)
+
+    def encode(self, data):
+        if len(data) % self.width != 0:
+            raise ValueError('payload is not a whole number of {0} byte integers'.format(self.width))
+        out = bytearray()
+        previous = 0
+        for value, in struct.iter_unpack(self._format, bytes(data)):
+            encodeSignedVarint(value - previous, out)
+            previous = value
+        return bytes(out)
+
+    def decode(self, data):
+        out = bytearray()
+        value = 0
+        pos = 0
+        while pos < len(data):
+            delta, pos = decodeSignedVarint(data, pos)
+            value += delta
+            try:
+                out.extend(struct.pack(self._format, value))
+            except struct.error:
+                raise ValueError('value out of range: {0}'.format(value))
+        return bytes(out)
+
+
+class CodecRegistry(object):
+    """ The codecs a payload may be compressed with, by header byte """
+
+    def __init__(self, codecs=None):
+        """
+        @param codecs: codecs to register; defaults to raw, deflate and 16 bit delta varints
+        """
+        self._codecs = {}
+        self.register(RawCodec())
+        for codec in (codecs if codecs != None else [DeflateCodec(), DeltaVarintCodec()]):
+            self.register(codec)
+
+    def register(self, codec):
+        """ Adds a codec, replacing any already registered with its number """
+        if not 0 <= codec.codecId <= 255:
+            raise ValueError('codec numbers must fit in a byte: {0}'.format(codec.codecId))
+        self._codecs[codec.codecId] = codec
+
+    def __getitem__(self, codecId):
+        return self._codecs[codecId]
+
+    @property
+    def codecs(self):
+        """ @return: the registered codecs, in number order """
+        return [self._codecs[codecId] for codecId in sorted(self._codecs)]
+
+    def compress(self, data, codecId=None):
+        """ Compresses a payload, tagging it with the codec used
+
+        Choosing the codec never makes the result longer than the payload plus
+        HEADER_LENGTH, as raw is always one of the choices.
+
+        @param codecId: codec to use, or None for whichever gives the shortest result
+        @raise ValueError: if the given codec cannot encode the payload
+        @return: the header byte followed by the encoded payload, as bytes
+        """
+        if codecId != None:
+            return bytes([codecId]) + self._codecs[codecId].encode(data)
+        best = None
+        for codec in self.codecs:
+            try:
+                encoded = bytes([codec.codecId]) + codec.encode(data)
+            except ValueError:
+                continue
+            if best == None or len(encoded) < len(best):
+                best = encoded
+        return best
+
+    def decompress(self, data):
+        """ @return: the payload that compress() turned into data, as bytes
+
+        @raise ValueError: if the codec is not registered or the data is not valid
+        """
+        if len(data) == 0:
+            raise ValueError('empty payload')
+        codec = self._codecs.get(data[0])
+        if codec == None:
+            raise ValueError('unknown codec {0}'.format(data[0]))
+        return codec.decode(data[1:])
+
+
+def trainDictionary(samples, size=1024, gramLength=6, segmentLength=48):
+    """ Builds a deflate preset dictionary from sample payloads
+
+    Segments of the samples are scored by how many other samples share the
+    strings (of gramLength bytes) in them, and the best are taken, without
+    counting a string again once a chosen segment holds it, until size
+    bytes are filled. Deflate refers back to nearby strings with fewer bits,
+    so the most useful segments go at the end.
+
+    @return: the dictionary, as bytes
+    """
+    samples = [bytes(sample) for sample in samples]
+    # Number of samples each string appears in
+    frequency = Counter()
+    for sample in samples:
+        frequency.update(set(sample[i:i + gramLength] for i in range(len(sample) - gramLength + 1)))
+
+    def grams(segment):
+        return set(segment[i:i + gramLength] for i in range(len(segment) - gramLength + 1))
+
+    def score(segment, covered):
+        return sum(frequency[gram] - 1 for gram in grams(segment) if gram not in covered)
+
+    step = max(1, gramLength // 2)
+    heap = []
+    for sample in samples:
+        for start in range(0, max(1, len(sample) - segmentLength + step), step):
+            segment = sample[start:start + segmentLength]
+            heap.append((-score(segment, ()), segment))
+    heapq.heapify(heap)
+    # Scores only fall as segments are chosen, so a segment whose recalculated
+    # score still beats the next best in the heap is the best one left
+    chosen = []
+    covered = set()
+    total = 0
+    while len(heap) > 0 and total < size:
+        negScore, segment = heapq.heappop(heap)
+        current = score(segment, covered)
+        if current <= 0:
+            continue
+        if len(heap) > 0 and current < -heap[0][0]:
+            heapq.heappush(heap, (-current, segment))
+            continue
+        segment = segment[:size - total]
+        chosen.append(segment)
+        covered.update(grams(segment))
+        total += len(segment)
+    return b''.join(reversed(chosen))
+
+
+def benchmark(codecs, samples, repeat=10, timer=time.perf_counter):
+    """ Measures how well, and how fast, each codec compresses sample payloads
+
+    Sizes include the header byte. Samples a codec cannot encode are left out
+    of its figures, and counted in 'skipped'.
+
+    @return: a list of dicts, one per codec: name, codecId, ratio (compressed
+    bytes / original bytes), encodeTime and decodeTime (mean seconds per
+    sample) and skipped
+    """
+    results = []
+    for codec in codecs:
+        original = compressed = skipped = 0
+        encodeTime = decodeTime = 0.0
+        encoded = []
+        for sample in samples:
+            try:
+                start = timer()
+                for _ in range(repeat):
+                    data = codec.encode(sample)
+                encodeTime += (timer() - start) / repeat
+            except ValueError:
+                skipped += 1
+                continue
+            original += len(sample)
+            compressed += len(data) + 1
+            encoded.append(data)
+        for data in encoded:
+            start = timer()
+            for _ in range(repeat):
+                codec.decode(data)
+            decodeTime += (timer() - start) / repeat
+        count = len(encoded)
+        results.append({'name': codec.name, 'codecId': codec.codecId,
+                        'ratio': compressed / float(original) if original > 0 else None,
+                        'encodeTime': encodeTime / count if count > 0 else None,
+                        'decodeTime': decodeTime / count if count > 0 else None,
+                        'skipped': skipped})
+    return results
@@ -0,0 +1,74 @@
+""" Compact integer encodings for SBD payloads
+
+Every byte of an SBD message is paid for, so lengths and other small
+integers are written as unsigned LEB128 varints: seven bits per byte, with
+the top bit set on every byte but the last. Signed integers (e.g. the
+differences between successive positions) are zigzag encoded first, so
+small negative numbers take as few bytes as small positive ones.
+"""
+
+
+def encodeVarint(value, out=None):
+    """ Appends an unsigned integer to a bytearray as a varint
+
+    @param out: bytearray to append to (a new one if not given)
+    @return: the bytearray
+    """
+    if value < 0:
+        raise ValueError('varints are unsigned: {0}'.format(value))
+    if out == None:
+        out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+    return out
+
+
+def decodeVarint(data, pos=0):
+    """ Reads a varint
+
+    @return: (value, position of the byte after it)
+    @raise ValueError: if data ends in the middle of the varint
+    """
+    value = 0
+    shift = 0
+    while True:
+        if pos >= len(data):
+            raise ValueError('truncated varint')
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def varintLength(value):
+    """ @return: the number of bytes encodeVarint() uses for value """
+    length = 1
+    while value >= 0x80:
+        value >>= 7
+        length += 1
+    return length
+
+
+def zigzag(value):
+    """ @return: a signed integer mapped to an unsigned one (0, -1, 1, -2... to 0, 1, 2, 3...) """
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def unzigzag(value):
+    """ @return: the signed integer that zigzag() mapped to value """
+    return value >> 1 if value & 1 == 0 else -(value >> 1) - 1
+
+
+def encodeSignedVarint(value, out=None):
+    """ Appends a signed integer to a bytearray as a zigzag varint; see encodeVarint() """
+    return encodeVarint(zigzag(value), out)
+
+
+def decodeSignedVarint(data, pos=0):
+    """ Reads a zigzag varint; see decodeVarint() """
+    value, pos = decodeVarint(data, pos)
+    return unzigzag(value), pos
@@ -0,0 +1,112 @@
+""" Identifying and probing many modems at once
+
+Commissioning a rack of transceivers one port at a time takes the sum of
+every unit's probe time, most of it spent waiting on the radios. probeFleet()
+gives each port its own worker thread, so the whole rack takes as long as
+the slowest unit, and collects the results into a single report.
+"""
+
+import fnmatch
+import json
+import logging
+import time
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+from serial.tools import list_ports
+
+from iridiummodem.modem import IridiumModem
+
+log = logging.getLogger('iridiummodem.fleet')
+
+# Device names that USB serial adapters and Iridium units with USB ports show up as
+DEFAULT_PORT_PATTERNS = ['/dev/ttyUSB*', '/dev/ttyACM*', 'COM*']
+
+
+def discoverPorts(patterns=None):
+    """ @return: a sorted list of the serial ports whose device names match any of patterns
+
+    @param patterns: fnmatch patterns, or None for DEFAULT_PORT_PATTERNS
+    """
+    if patterns == None:
+        patterns = DEFAULT_PORT_PATTERNS
+    ports = [port.device for port in list_ports.comports()]
+    return sorted(port for port in ports if any(fnmatch.fnmatch(port, pattern) for pattern in patterns))
+
+
+class ProbeResult(object):
+    """ Outcome of probing the modem on one port
+
+    capabilities is the DeviceCapabilities found (None if the modem could not
+    be identified) and error the exception that stopped the probe, if any.
+    """
+
+    def __init__(self, port):
+        self.port = port
+        self.capabilities = None
+        self.error = None
+        self.elapsed = None # seconds
+
+    @property
+    def ok(self):
+        return self.error == None
+
+    def toDict(self):
+        result = {'port': self.port, 'elapsed': self.elapsed,
+                  'error': format(self.error) if self.error != None else None}
+        if self.capabilities != None:
+            result.update(self.capabilities.toDict())
+        return result
+
+
+def probePort(port, baudrate=19200, commands=(), store=None, modemFactory=IridiumModem):
+    """ Connects to the modem on port, identifies it and tries each of commands
+
+    Errors are caught and returned in the result rather than raised.
+
+    @param store: CapabilityStore to connect with and to save the results in
+    @return: a ProbeResult
+    """
+    result = ProbeResult(port)
+    start = time.monotonic()
+    modem = modemFactory(port, baudrate)
+    modem.capabilityStore = store
+    try:
+        modem.connect()
+        result.capabilities = modem.probeCommands(list(commands))
+    except Exception as e:
+        log.warning('Probing %s failed: %s', port, e)
+        result.error = e
+        result.capabilities = modem.capabilities
+    finally:
+        try:
+            modem.close()
+        except Exception:
+            pass # The port may never have opened
+    result.elapsed = round(time.monotonic() - start, 3)
+    return result
+
+
+def probeFleet(ports, baudrate=19200, commands=(), store=None, workers=None, modemFactory=IridiumModem):
+    """ Probes the modems on all of ports at the same time (see probePort())
+
+    @param workers: maximum number of ports to probe at once (default: all of them)
+    @return: a list of ProbeResults, in the same order as ports
+    """
+    ports = list(ports)
+    if len(ports) == 0:
+        return []
+    with ThreadPoolExecutor(max_workers=workers or len(ports)) as executor:
+        futures = [executor.submit(probePort, port, baudrate, commands, store, modemFactory) for port in ports]
+        return [future.result() for future in futures]
+
+
+def fleetReport(results):
+    """ @return: a dictionary (ready for json.dump()) describing the results of probeFleet() """
+    return {'generated': datetime.now(timezone.utc).isoformat(),
+            'units': [result.toDict() for result in results]}
+
+
+def writeFleetReport(results, path):
+    with open(path, 'w') as f:
+        json.dump(fleetReport(results), f, indent=1, sort_keys=True)
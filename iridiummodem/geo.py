@@ -0,0 +1,106 @@
+""" Conversion of Iridium -MSGEO positions to latitude and longitude
+
+AT-MSGEO reports the modem's position as Earth-centred X, Y, Z coordinates
+(as calculated by the network) and the Iridium time of the fix. The same
+conversion is used for a single live fix and for whole arrays of logged
+fixes, so both give the same answers; the batch functions need NumPy,
+which is optional (pip install python-iridium-modem[numpy]).
+"""
+
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from iridiummodem.iridiumtime import CURRENT_ERA, ticksToDatetime64, ticksToDatetime
+from iridiummodem.parsers import ResponseParser
+
+# sqrt, acos, atan2 and degrees, for single values and for arrays
+_SCALAR_OPS = (math.sqrt, math.acos, math.atan2, math.degrees)
+_ARRAY_OPS = (numpy.sqrt, numpy.arccos, numpy.arctan2, numpy.degrees) if numpy != None else None
+
+_PARSER = ResponseParser()
+
+# Mean radius of the Earth, in metres
+EARTH_RADIUS = 6371008.8
+
+
+def _latLon(x, y, z, ops):
+    sqrt, acos, atan2, degrees = ops
+    # From: Weisstein, Eric W. "Spherical Coordinates." From MathWorld--A Wolfram Web Resource.
+    #       http://mathworld.wolfram.com/SphericalCoordinates.html
+    # Their phi is measured from the north pole, so we move the base to the equator
+    # by subtracting it from 90. atan2 keeps the longitude in the right quadrant
+    # when x is negative (i.e. more than 90 degrees from Greenwich).
+    r = sqrt(x * x + y * y + z * z)
+    return 90 - degrees(acos(z / r)), degrees(atan2(y, x))
+
+
+def xyzToLatLon(x, y, z):
+    """ @return: (latitude, longitude) in degrees of an -MSGEO X, Y, Z position
+
+    @raise ValueError: if the position is 0, 0, 0
+    """
+    try:
+        return _latLon(x, y, z, _SCALAR_OPS)
+    except ZeroDivisionError:
+        raise ValueError('no position')
+
+
+def geoLocation(x, y, z, ticks, iridiumEra=CURRENT_ERA):
+    """ @return: [latitude, longitude, datetime (UTC)] of an -MSGEO fix, as IridiumModem.geoLocation gives it """
+    lat, lon = xyzToLatLon(x, y, z)
+    return [lat, lon, ticksToDatetime(ticks, iridiumEra)]
+
+
+def surfaceDistance(lat1, lon1, lat2, lon2):
+    """ @return: the great circle distance in metres between two positions given in degrees """
+    lat1, lon1, lat2, lon2 = (math.radians(value) for value in (lat1, lon1, lat2, lon2))
+    # Haversine formula, which stays accurate for the short distances between successive fixes
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(h)))
+
+
+def _requireNumpy():
+    if numpy == None:
+        raise ImportError('NumPy is needed for batch geolocation')
+
+
+def xyzArrayToLatLon(x, y, z):
+    """ @return: (latitude, longitude) NumPy float arrays in degrees of arrays of X, Y, Z positions
+
+    Positions of 0, 0, 0 give NaN.
+    """
+    _requireNumpy()
+    x, y, z = (numpy.asarray(values, dtype=numpy.float64) for values in (x, y, z))
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        return _latLon(x, y, z, _ARRAY_OPS)
+
+
+def geoLocations(x, y, z, ticks, iridiumEra=CURRENT_ERA):
+    """ Converts arrays of -MSGEO fixes at once
+
+    @param ticks: Iridium times of the fixes, as tick counts or hex strings
+    @return: (latitude, longitude, time) NumPy arrays; times are datetime64[ms] (UTC)
+    """
+    lat, lon = xyzArrayToLatLon(x, y, z)
+    return lat, lon, ticksToDatetime64(ticks, iridiumEra)
+
+
+def parseGeoLines(lines, iridiumEra=CURRENT_ERA):
+    """ Converts logged -MSGEO response lines (e.g. '-MSGEO: 4024,-100,4924,2c781713')
+
+    Lines that are not -MSGEO responses are skipped.
+    @return: (latitude, longitude, time) NumPy arrays, as geoLocations() gives them
+    """
+    _requireNumpy()
+    columns = ([], [], [], [])
+    for line in lines:
+        parsed = _PARSER.parseLine(line)
+        if parsed != None and parsed.prefix == '-MSGEO':
+            for column, value in zip(columns, parsed.values):
+                column.append(value)
+    x, y, z, ticks = columns
+    return geoLocations(x, y, z, ticks, iridiumEra)
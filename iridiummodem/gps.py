@@ -0,0 +1,203 @@
+""" GPS positions from handsets with a GPS receiver (e.g. the 9575 Extreme)
+
+AT+GPSPOS reports the receiver's last position, e.g. '51.3842,N,001.2051,W,A',
+with its hemispheres and an NMEA style validity flag (A for a valid fix, V
+for none). PositionStream polls it for a tracking application: often while
+the handset is moving, less and less often while it stays put, and at a
+steady rate while the receiver is still looking for a fix. Positions that
+have not changed are not passed on, so subscribers only hear of new fixes.
+"""
+
+import logging
+import re
+import threading
+import time
+
+from gsmmodem.exceptions import CommandError, TimeoutException
+
+from iridiummodem.geo import surfaceDistance
+
+# 00.0000,N,000.0000,E,V (some firmware puts +GPSPOS: in front)
+GPSPOS_REGEX = re.compile(r'^(?:\+GPSPOS:\s*)?(\d+(?:\.\d*)?),([NS]),(\d+(?:\.\d*)?),([EW]),([0-9A-Za-z])', re.IGNORECASE)
+
+
+class GpsFix(object):
+    """ A position read from the GPS receiver
+
+    Latitudes south of the equator and longitudes west of Greenwich are negative.
+    """
+    __slots__ = ('latitude', 'longitude', 'valid', 'when')
+
+    def __init__(self, latitude, longitude, valid, when=None):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.valid = valid # False if the receiver has no fix (the position is then stale or 0, 0)
+        self.when = when # clock time the position was read
+
+    def samePosition(self, other):
+        """ @return: True if other is a GpsFix with the same position and validity """
+        return other != None and (self.latitude, self.longitude, self.valid) == (other.latitude, other.longitude, other.valid)
+
+    def distanceTo(self, other):
+        """ @return: the distance in metres to another fix """
+        return surfaceDistance(self.latitude, self.longitude, other.latitude, other.longitude)
+
+    def __repr__(self):
+        return 'GpsFix({0!r}, {1!r}, {2!r}, {3!r})'.format(self.latitude, self.longitude, self.valid, self.when)
+
+
+def parseGpsPosition(response, when=None):
+    """ @return: a GpsFix of an AT+GPSPOS response
+
+    @raise CommandError: if the response contains no position
+    """
+    for line in response:
+        gpspos = GPSPOS_REGEX.match(line.strip())
+        if gpspos:
+            lat = float(gpspos.group(1))
+            lon = float(gpspos.group(3))
+            if gpspos.group(2).upper() == 'S':
+                lat = -lat
+            if gpspos.group(4).upper() == 'W':
+                lon = -lon
+            return GpsFix(lat, lon, gpspos.group(5).upper() == 'A', when)
+    raise CommandError('invalid response for +GPSPOS')
+
+
+class PositionStream(object):
+    """ Polls a modem's GPS receiver at an interval suited to how the position is changing
+
+    With a valid fix the interval starts at minInterval, and doubles (up to
+    maxInterval) each time a poll finds the handset has moved less than
+    movementThreshold metres; moving further puts it back to minInterval.
+    Without a fix the receiver is polled every searchInterval seconds, and
+    asked for an update with AT+GPSUPD if the handset has that command.
+    If AT+GPSSTA? reports the receiver switched off, AT+GPSPOS is not sent
+    and the receiver is checked again after maxInterval.
+
+    Subscribers are called from the polling thread with each new GpsFix.
+    """
+    log = logging.getLogger('iridiummodem.gps.PositionStream')
+
+    def __init__(self, modem, minInterval=5, maxInterval=120, searchInterval=15, movementThreshold=25,
+                 clock=time.monotonic):
+        self.modem = modem
+        self.minInterval = minInterval
+        self.maxInterval = maxInterval
+        self.searchInterval = searchInterval
+        self.movementThreshold = movementThreshold
+        self._clock = clock
+        self.interval = minInterval # seconds until the next poll
+        self.latest = None # the last GpsFix published
+        self.polls = 0 # AT+GPSPOS commands sent
+        self.published = 0 # fixes passed to subscribers
+        self._lastRead = None # the last GpsFix read, published or not
+        self._useStatus = None # whether AT+GPSSTA? works, if known
+        self._useUpdate = None # whether AT+GPSUPD works, if known
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def subscribe(self, callback):
+        """ Calls callback(fix) with every new position """
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self._subscribers.remove(callback)
+
+    def _supported(self, command, known):
+        if known != None:
+            return known
+        capabilities = getattr(self.modem, 'capabilities', None)
+        if capabilities != None:
+            return capabilities.supports(command) != False
+        return True # Not probed: try it, and remember if it fails
+
+    def _receiverOn(self):
+        if not self._supported('AT+GPSSTA?', self._useStatus):
+            return True
+        try:
+            status = self.modem.PARSER.expect(self.modem.write('AT+GPSSTA?'), '+GPSSTA')[0]
+        except CommandError:
+            self.log.debug('AT+GPSSTA? not supported; assuming the GPS receiver is on')
+            self._useStatus = False
+            return True
+        self._useStatus = True
+        return status != 0
+
+    def _requestUpdate(self):
+        if not self._supported('AT+GPSUPD', self._useUpdate):
+            return
+        try:
+            self.modem.write('AT+GPSUPD')
+            self._useUpdate = True
+        except CommandError:
+            self.log.debug('AT+GPSUPD not supported')
+            self._useUpdate = False
+
+    def poll(self):
+        """ Reads the position, passing it to subscribers if it has changed, and works out the next interval
+
+        @raise CommandError: if the modem does not report a position
+        @return: the GpsFix published, or None if the position has not changed
+        """
+        if not self._receiverOn():
+            self.interval = self.maxInterval
+            return None
+        self.polls += 1
+        fix = parseGpsPosition(self.modem.write('AT+GPSPOS'), self._clock())
+        previous = self._lastRead
+        self._lastRead = fix
+        if not fix.valid:
+            self.interval = self.searchInterval
+            self._requestUpdate()
+        elif previous == None or not previous.valid or fix.distanceTo(previous) >= self.movementThreshold:
+            self.interval = self.minInterval
+        else:
+            self.interval = min(self.maxInterval, self.interval * 2)
+        if fix.samePosition(self.latest):
+            return None
+        self.latest = fix
+        self.published += 1
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            callback(fix)
+        return fix
+
+    def positions(self):
+        """ Generator of new positions, polling until stop() is called
+
+        A failed or timed out poll is logged and retried after searchInterval.
+        """
+        while not self._stop.is_set():
+            try:
+                fix = self.poll()
+            except (CommandError, TimeoutException) as e:
+                self.log.debug('GPS poll failed: %s', e)
+                self.interval = self.searchInterval
+                fix = None
+            if fix != None:
+                yield fix
+            self._stop.wait(self.interval)
+
+    def start(self):
+        """ Polls from a background thread, for subscribers """
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """ Stops polling, ending positions() and the background thread """
+        self._stop.set()
+        if self._thread != None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        for fix in self.positions():
+            pass
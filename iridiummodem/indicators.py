@@ -0,0 +1,122 @@
+""" Signal, service and antenna indicator events
+
+With AT+CIER enabled the ISU reports changes in signal strength, service
+availability and antenna state as unsolicited +CIEV lines, so the current
+state is known without sending AT+CSQ (which can take a minute and holds
+the serial line while it does). IndicatorMonitor keeps that state and lets
+callers wait for, or subscribe to, changes.
+"""
+
+import threading
+import time
+
+# +CIEV indicator numbers
+SIGNAL = 0 # signal strength, 0-5
+SERVICE = 1 # 1 if network service is available
+ANTENNA = 2 # 1 if there is an antenna fault
+
+
+class IndicatorState(object):
+    """ Snapshot of the ISU's indicators; None means not reported yet """
+    def __init__(self, signal=None, service=None, antennaFault=None, updated=None):
+        self.signal = signal
+        self.service = service
+        self.antennaFault = antennaFault
+        self.updated = updated # clock time of the last indicator event
+
+
+class IndicatorMonitor(object):
+    """ Tracks the indicators reported by +CIEV events
+
+    update() is called from the modem's read thread; subscribers are called
+    from there too, so they must not block or write to the modem.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._condition = threading.Condition()
+        self._state = IndicatorState()
+        self._signalEvents = 0 # number of signal indications so far
+        self._subscribers = []
+
+    @property
+    def state(self):
+        """ @return: an IndicatorState copy of the current indicators """
+        with self._condition:
+            return IndicatorState(self._state.signal, self._state.service, self._state.antennaFault, self._state.updated)
+
+    def subscribe(self, callback):
+        """ Calls callback(indicator, value, state) whenever an indicator is reported """
+        with self._condition:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._condition:
+            self._subscribers.remove(callback)
+
+    def reset(self):
+        """ Forgets the current state, e.g. after the modem has been reconnected """
+        with self._condition:
+            self._state = IndicatorState()
+            self._signalEvents += 1
+            self._condition.notify_all()
+
+    def update(self, indicator, value):
+        """ Records an indicator event (from a +CIEV line) """
+        with self._condition:
+            now = self._clock()
+            if indicator == SIGNAL:
+                self._state.signal = value
+                self._signalEvents += 1
+            elif indicator == SERVICE:
+                self._state.service = value == 1
+            elif indicator == ANTENNA:
+                self._state.antennaFault = value == 1
+            self._state.updated = now
+            self._condition.notify_all()
+            subscribers = list(self._subscribers)
+        state = self.state
+        for callback in subscribers:
+            callback(indicator, value, state)
+
+    def waitForSignal(self, minimum, samples=1, holdTime=0, timeout=None):
+        """ Blocks until the signal strength is at least minimum
+
+        The current signal level counts as the first sample; each further
+        signal indication at or above minimum counts as another, and one
+        below it starts the count again. The signal must also have stayed at
+        or above minimum for holdTime seconds. As the ISU only reports the
+        signal when it changes, holdTime is usually the better way to ask
+        for a steady signal.
+
+        @param timeout: seconds to wait, or None to wait indefinitely
+        @return: True if the condition was met, False if the timeout expired
+        """
+        deadline = None if timeout == None else self._clock() + timeout
+        with self._condition:
+            count = 0
+            since = None
+            seenEvents = None
+            while True:
+                signal = self._state.signal
+                if self._signalEvents != seenEvents:
+                    seenEvents = self._signalEvents
+                    if signal != None and signal >= minimum:
+                        count += 1
+                        if since == None:
+                            since = self._clock()
+                    else:
+                        count = 0
+                        since = None
+                now = self._clock()
+                if count >= samples and since != None and now - since >= holdTime:
+                    return True
+                wait = None
+                if deadline != None:
+                    wait = deadline - now
+                    if wait <= 0:
+                        return False
+                if since != None and count >= samples:
+                    holdLeft = holdTime - (now - since)
+                    wait = holdLeft if wait == None else min(wait, holdLeft)
+                self._condition.wait(wait)
@@ -0,0 +1,93 @@
+""" Conversion between Iridium network time and UTC
+
+Iridium time (as reported by AT-MSSTM and AT-MSGEO) counts 90ms ticks from
+the start of the current Iridium era. Everything here works in integer
+milliseconds, so conversions are exact, and none of it needs a modem.
+
+The batch functions convert whole arrays of tick counts (e.g. read from
+logs) to and from NumPy datetime64 values at once; they need NumPy, which
+is optional (pip install python-iridium-modem[numpy]).
+"""
+
+from datetime import datetime, timedelta, timezone
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Length of an Iridium time tick, in milliseconds
+TICK_MS = 90
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+ONE_MS = timedelta(milliseconds=1)
+
+# Start of each Iridium era (0=1996, 1=2007, 2=2014), in milliseconds since the Unix epoch
+ERA_EPOCHS_MS = tuple((start - EPOCH) // ONE_MS for start in (
+    datetime(1996, 6, 1, 0, 0, 11, tzinfo=timezone.utc),
+    datetime(2007, 3, 8, 3, 50, 21, tzinfo=timezone.utc),
+    datetime(2014, 5, 11, 14, 23, 55, tzinfo=timezone.utc),
+))
+CURRENT_ERA = 2
+
+
+def ticksToDatetime(ticks, iridiumEra=CURRENT_ERA):
+    """ @return: the UTC datetime of an Iridium time, given as a tick count or hex string (e.g. '2c781713') """
+    if isinstance(ticks, str):
+        ticks = int(ticks, 16)
+    return EPOCH + timedelta(milliseconds=ERA_EPOCHS_MS[iridiumEra] + ticks * TICK_MS)
+
+
+def datetimeToTicks(dt, iridiumEra=None):
+    """ @return: the Iridium time (in ticks) of a datetime, which is taken as local time if it has no tzinfo
+
+    @param iridiumEra: the era to count from, or None for the latest era that started before dt
+    @raise ValueError: if dt is before the start of the era (or of the Iridium network)
+    """
+    millis = (dt.astimezone(timezone.utc) - EPOCH) // ONE_MS
+    eras = range(len(ERA_EPOCHS_MS) - 1, -1, -1) if iridiumEra == None else [iridiumEra]
+    for era in eras:
+        if millis >= ERA_EPOCHS_MS[era]:
+            return (millis - ERA_EPOCHS_MS[era]) // TICK_MS
+    raise ValueError('{0} is before the start of Iridium time'.format(dt))
+
+
+def _requireNumpy():
+    if numpy == None:
+        raise ImportError('NumPy is needed for batch time conversion')
+
+
+def ticksArray(values):
+    """ @return: a NumPy int64 array of tick counts, from tick counts or hex strings """
+    _requireNumpy()
+    values = numpy.asarray(values)
+    if values.dtype.kind in 'USO':
+        return numpy.fromiter((int(value, 16) for value in values.ravel()), dtype=numpy.int64, count=values.size).reshape(values.shape)
+    return values.astype(numpy.int64)
+
+
+def ticksToDatetime64(values, iridiumEra=CURRENT_ERA):
+    """ @return: a NumPy datetime64[ms] array (UTC) of Iridium times given as tick counts or hex strings """
+    millis = ticksArray(values) * TICK_MS + ERA_EPOCHS_MS[iridiumEra]
+    return millis.astype('datetime64[ms]')
+
+
+def datetime64ToTicks(times, iridiumEra=None):
+    """ @return: a NumPy int64 array of the Iridium times (in ticks) of datetime64 values (UTC)
+
+    @param iridiumEra: the era to count from, or None for the latest era that started before each time
+    @raise ValueError: if a time is before the start of the era (or of the Iridium network)
+    """
+    _requireNumpy()
+    millis = numpy.asarray(times).astype('datetime64[ms]').astype(numpy.int64)
+    if iridiumEra != None:
+        bases = numpy.full(millis.shape, ERA_EPOCHS_MS[iridiumEra], dtype=numpy.int64)
+    else:
+        epochs = numpy.array(ERA_EPOCHS_MS, dtype=numpy.int64)
+        eras = numpy.searchsorted(epochs, millis, side='right') - 1
+        if numpy.any(eras < 0):
+            raise ValueError('time before the start of Iridium time')
+        bases = epochs[eras]
+    if numpy.any(millis < bases):
+        raise ValueError('time before the start of the Iridium era')
+    return (millis - bases) // TICK_MS
@@ -1,20 +1,57 @@
 #!/usr/bin/env python3
 
 import serial
-import sys
 import time
 import logging
 import threading
 import re
-import math
 
-from datetime import datetime, timezone
-import dateutil.parser
+from contextlib import contextmanager, nullcontext
+from copy import copy
 
 TERMINATOR = '\r'
+# Largest mobile terminated message any current ISU will deliver (9522B/9523)
+SBD_MAX_MT_LENGTH = 1890
+# Largest mobile originated message, by model family (from the AT+CGMM response);
+# the 9602/9603 only take 340 bytes, so that is assumed for anything unknown
+SBD_MAX_MO_LENGTHS = [('9602', 340), ('9603', 340), ('9600', 340), ('9522', 1960), ('9523', 1960), ('9520', 1960)]
+SBD_DEFAULT_MAX_MO_LENGTH = 340
+
+# Read-only queries that IridiumModem.queryBatch() can chain into one command
+# line: command -> (prefix of its response lines, or None for a single line
+# of plain text; name of the method that parses its response)
+BATCH_QUERIES = {'AT+CGMI': (None, '_parseText'),
+                 'AT+CGMM': (None, '_parseText'),
+                 'AT+CGSN': (None, '_parseText'),
+                 'AT+CIMI': (None, '_parseText'),
+                 'AT+CSQ': ('+CSQ:', '_parseSignalStrength'),
+                 'AT+CSQF': ('+CSQF:', '_parseSignalStrength'),
+                 'AT-MSSTM': ('-MSSTM:', '_parseSystemTime'),
+                 'AT-MSGEO': ('-MSGEO:', '_parseGeoLocation'),
+                 'AT+SBDS': ('+SBDS:', '_parseSBDStatus'),
+                 'AT+SBDSX': ('+SBDSX:', '_parseSBDStatusExtended')}
+
+
+def sbdMaxMOLength(modelName):
+    """ @return: the largest SBD message (in bytes) a modem of the given model will send """
+    if modelName != None:
+        for family, length in SBD_MAX_MO_LENGTHS:
+            if family in modelName:
+                return length
+    return SBD_DEFAULT_MAX_MO_LENGTH
 
 from gsmmodem.modem import GsmModem
-from gsmmodem.exceptions import InvalidStateException, CommandError
+from gsmmodem.serial_comms import SerialComms
+from gsmmodem.exceptions import InvalidStateException, CommandError, TimeoutException
+
+from iridiummodem.arbiter import PRIORITY_NORMAL, PRIORITY_LOW
+from iridiummodem.capabilities import DeviceCapabilities
+from iridiummodem.indicators import IndicatorMonitor
+from iridiummodem.iridiumtime import ticksToDatetime, datetimeToTicks
+from iridiummodem.geo import xyzToLatLon
+from iridiummodem.gps import parseGpsPosition
+from iridiummodem.parsers import ResponseParser
+from iridiummodem.timeouts import CommandTimeoutPolicy
 
 class bytesWrapper:
     dataBuffer = None
@@ -30,6 +67,8 @@ class bytesWrapper:
 
 class ISUSBDStatus(object):
     """ Status class to hold message sequence numbers and state flags """
+    __slots__ = ('outboundMSN', 'inboundMSN', 'outboundMsgPresent', 'inboundMsgPresent', 'inboundMessagesQueuedAtServer')
+
     def __init__(self, outboundMSN=-1, inboundMSN=-1,outboundMsgPresent=False,inboundMsgPresent=False,inboundMessagesQueuedAtServer=-1):
         self.outboundMSN = outboundMSN # MOMSN
         self.inboundMSN = inboundMSN # MTMSN
@@ -42,6 +81,8 @@ class ISUSBDStatus(object):
 
 class SBDTransferStatus(ISUSBDStatus):
     """ Status class to hold queue length and other transfer response data """
+    __slots__ = ('lastOutboundTransferStatus', 'lastInboundTransferStatus')
+
     def __init__(self, outboundMSN=-1, inboundMSN=-1,outboundMsgPresent=False,inboundMsgPresent=False,inboundMessagesQueuedAtServer=-1,lastOutboundTransferStatus=-1,lastInboundTransferStatus=-1):
         super(SBDTransferStatus, self).__init__(outboundMSN,inboundMSN,outboundMsgPresent,inboundMsgPresent,inboundMessagesQueuedAtServer)
         self.lastOutboundTransferStatus = lastOutboundTransferStatus # MO Status
@@ -49,6 +90,64 @@ class SBDTransferStatus(ISUSBDStatus):
     def __eq__(self, other):
         return super(SBDTransferStatus, self).__eq__(other) and self.lastOutboundTransferStatus == other.lastOutboundTransferStatus and self.lastInboundTransferStatus == other.lastInboundTransferStatus
 
+class SBDStateTracker(object):
+    """ Local copy of the ISU's SBD sequence numbers and buffer flags
+
+    Updated from the responses to the SBD commands sent through the modem, so
+    that AT+SBDS only needs to be sent when the local copy is not known or
+    turns out to disagree with what the ISU reports.
+    """
+    def __init__(self):
+        self.status = None # ISUSBDStatus, or None if not known
+
+    @property
+    def synced(self):
+        return self.status is not None
+
+    def reset(self):
+        self.status = None
+
+    def snapshot(self):
+        """ @return: a copy of the local status, or None if not known """
+        return copy(self.status) if self.status is not None else None
+
+    def sync(self, isuStatus):
+        """ Replaces the local status with one read from the ISU """
+        self.status = ISUSBDStatus(isuStatus.outboundMSN, isuStatus.inboundMSN, isuStatus.outboundMsgPresent,
+                                   isuStatus.inboundMsgPresent, isuStatus.inboundMessagesQueuedAtServer)
+
+    def messageWritten(self):
+        if self.status is not None:
+            self.status.outboundMsgPresent = True
+
+    def outboundCleared(self):
+        if self.status is not None:
+            self.status.outboundMsgPresent = False
+
+    def inboundCleared(self):
+        if self.status is not None:
+            self.status.inboundMsgPresent = False
+
+    def sessionCompleted(self, transferStatus):
+        """ Applies the result of an SBD session (in SBDIX form)
+
+        @return: False if the session did not match the local status, which is then forgotten
+        """
+        if self.status is None:
+            return False
+        if transferStatus.outboundMSN != self.status.outboundMSN:
+            self.reset()
+            return False
+        if transferStatus.lastOutboundTransferStatus <= 4:
+            # MOMSN in +SBDS is the one the next session will use
+            self.status.outboundMSN = transferStatus.outboundMSN + 1
+        if transferStatus.lastInboundTransferStatus == 1:
+            self.status.inboundMSN = transferStatus.inboundMSN
+            self.status.inboundMsgPresent = True
+        self.status.inboundMessagesQueuedAtServer = transferStatus.inboundMessagesQueuedAtServer
+        return True
+
+
 class SBDMessage(object):
     """ Abstract Short Burst Data message class """
 
@@ -77,6 +176,7 @@ class SBDBinaryMessage(SBDMessage):
     def __init__(self, sequence = -1, data=bytearray(b'')):
         super(SBDBinaryMessage, self).__init__(sequence)
         self.data = data
+        self.payloadError = None # why the data could not be decompressed (see IridiumModem.payloadCodecs), if it could not
 
     @property
     def generateChecksum(self):
@@ -104,19 +204,316 @@ class SBDBinaryMessage(SBDMessage):
         return super(SBDBinaryMessage, self).__eq__(other) and self.data == other.data
 
 
+class SBDFrameReader(object):
+    """ Collects a binary AT+SBDRB response straight off the serial port
+
+    The response is a 2-byte length, the message itself and a 2-byte checksum.
+    The length goes into a fixed header buffer; the message and checksum are
+    then read into one buffer allocated at the right size, and the message
+    handed out refers to that buffer through a memoryview instead of a copy.
+    """
+    def __init__(self, maxLength=SBD_MAX_MT_LENGTH):
+        self.maxLength = maxLength
+        self.header = bytearray(2)
+        self.error = False
+        self._buffer = None
+        self._view = None
+        self._filled = 0
 
+    @property
+    def done(self):
+        return self.error or (self._buffer != None and self._filled == len(self._buffer))
+
+    @property
+    def remaining(self):
+        """ Number of bytes still needed to complete the current part of the frame """
+        if self._buffer == None:
+            return len(self.header) - self._filled
+        return len(self._buffer) - self._filled
+
+    def feed(self, data):
+        """ Stores data read from the serial port (at most self.remaining bytes) """
+        count = len(data)
+        if self._buffer == None:
+            self.header[self._filled:self._filled + count] = data
+            self._filled += count
+            if self._filled == len(self.header):
+                msgLen = (self.header[0] << 8) | self.header[1]
+                if msgLen > self.maxLength:
+                    # Not a message frame (probably an error result code);
+                    # the caller hands the header back to the line reader
+                    self.error = True
+                    return
+                self._buffer = bytearray(msgLen + 2)
+                self._view = memoryview(self._buffer)
+                self._filled = 0
+        else:
+            self._view[self._filled:self._filled + count] = data
+            self._filled += count
 
-class IridiumModem(GsmModem):
+    def message(self, sequence=-1):
+        """ @return: the SBDBinaryMessage read, with its data backed by the frame buffer
+        @raise CommandError: if the frame is incomplete or the checksum does not match
+        """
+        if self.error or not self.done:
+            raise CommandError('AT+SBDRB')
+        msgLen = len(self._buffer) - 2
+        binMsg = SBDBinaryMessage(sequence, self._view[:msgLen])
+        if binMsg.validateChecksum(self._view[msgLen:]) == False:
+            raise CommandError('AT+SBDRB')
+        return binMsg
+
+
+
+
+class IridiumProtocol(object):
+    """ Response parsing and time conversion shared by the modem classes
+
+    Nothing here talks to the modem: each _parse method takes the response
+    lines returned for a command and turns them into a result, raising
+    CommandError if they are not in the expected form, and _dataReceived()
+    splits whatever has been read from the serial port into lines for
+    _handleLineRead().
+    """
+    # Parses the responses of the form +PREFIX: field, field...
+    PARSER = ResponseParser()
+    # Used for SBD write
+    SBDWB_READY_REGEX = re.compile(r'^READY')
+    SBDWB_RESP_REGEX = re.compile(r'^(\d+)')
+
+    def iridiumToDatetime(self, iridiumHex, iridiumEra = 2):
+        """ Converts Iridium network time to a datetime object
+        Useful when converting MSSTM or MSGEO(S) output.
+
+        @raise CommandError: if an error occurs
+        @param iridiumHex: Iridium time of the form 2c781713
+        @param iridiumEra: Start of Iridium clock base (0=1996, 1=2007, 2=2014 (default))
+        @return The GMT time as reported by the Iridium unit
+        @type datetime.datetime
+        """
+        return ticksToDatetime(iridiumHex, iridiumEra)
+
+    def datetimeToIridium(self, dt):
+        """ Converts a datetime object to Iridium network time
+
+        @raise CommandError: if an error occurs
+        @param dt: datetime.datetime object to convert
+        @return The Iridium time representing the given datetime
+        @type int
+        """
+        try:
+            return datetimeToTicks(dt)
+        except ValueError:
+            # We're in trouble: the time is before the start of the Iridium network!
+            raise CommandError()
+
+    def _parseSystemTime(self, response):
+        return self.iridiumToDatetime(self.PARSER.expect(response, '-MSSTM')[0])
+
+    def _parseGeoLocation(self, response):
+        # -MSGEO: 4024,-100,4924,2c781713
+        # lat 50.73489178019171 lon -1.423558380252216 time 2016-06-26 18:05:30.789999
+        iridiumX, iridiumY, iridiumZ, iridiumTime = self.PARSER.expect(response, '-MSGEO')
+        try:
+            lat, lon = xyzToLatLon(iridiumX, iridiumY, iridiumZ)
+        except ValueError:
+            raise CommandError('no position in -MSGEO response')
+        fixTime = self.iridiumToDatetime(iridiumTime)
+        return [lat, lon, fixTime]
+
+    def _parseGpsLocation(self, response):
+        fix = parseGpsPosition(response)
+        return [fix.latitude, fix.longitude]
+
+    def _parseGpsFix(self, response):
+        return parseGpsPosition(response, time.monotonic())
+
+    def _parseSignalStrength(self, response):
+        ss = self.PARSER.expect(response, '+CSQ', '+CSQF')[0]
+        return ss if ss != 99 else -1
+
+    def _parseSBDStatus(self, response):
+        # +SBDS: 1, 5, 0, -1
+        moFlag, moMSN, mtFlag, mtMSN = self.PARSER.expect(response, '+SBDS', 'SBDS')
+        return ISUSBDStatus(moMSN, mtMSN, moFlag == 1, mtFlag == 1)
+
+    def _parseSBDStatusExtended(self, response):
+        # +SBDSX: 1, 5, 0, -1, 0, 2
+        moFlag, moMSN, mtFlag, mtMSN, raFlag, waiting = self.PARSER.expect(response, '+SBDSX')
+        return ISUSBDStatus(moMSN, mtMSN, moFlag == 1, mtFlag == 1, waiting)
+
+    def _parseText(self, response):
+        """ @return: the first line of a response, e.g. the model name returned for AT+CGMM """
+        return response[0]
+
+    def _batchLine(self, commands):
+        """ @return: commands chained into one command line, e.g. AT+CGMI;+CGSN;-MSSTM """
+        return commands[0] + ''.join(';' + command[2:] for command in commands[1:])
+
+    def _parseBatch(self, commands, response):
+        """ Splits the response to a _batchLine() back up and parses each command's part
+
+        @raise CommandError: if the response does not have the lines expected
+        @return: a list of parsed results, one per command
+        """
+        lines = [line for line in response if len(line) > 0]
+        if len(lines) > 0 and lines[-1] == 'OK':
+            lines.pop()
+        results = []
+        pos = 0
+        for command in commands:
+            prefix, parser = BATCH_QUERIES[command]
+            start = pos
+            if prefix == None:
+                pos += 1
+            else:
+                while pos < len(lines) and lines[pos].startswith(prefix):
+                    pos += 1
+            if pos == start or pos > len(lines):
+                raise CommandError('unexpected response to batched {0}'.format(command))
+            results.append(getattr(self, parser)(lines[start:pos] + ['OK']))
+        if pos != len(lines):
+            raise CommandError('unexpected lines in batched response: {0}'.format(lines[pos:]))
+        return results
+
+    def _parseSBDIX(self, response):
+        # +SBDIX: 0, 8, 0, 0, 0, 0
+        moStatus, moMSN, mtStatus, mtMSN, mtLength, mtQueued = self.PARSER.expect(response, '+SBDIX')
+        # An error during the outbound transfer leaves the message in the MO buffer
+        return SBDTransferStatus(moMSN, mtMSN, moStatus > 5, mtLength != 0, mtQueued, moStatus, mtStatus)
+
+    def _parseSBDI(self, response):
+        # +SBDI: 1, 7, 0, 0, 0, 0
+        moStatus, moMSN, mtStatus, mtMSN, mtLength, mtQueued = self.PARSER.expect(response, '+SBDI')
+        # Convert to SBDIX-compatible numbers: 0/1 are success, 2 an error
+        return SBDTransferStatus(moMSN, mtMSN, moStatus == 2, mtLength != 0, mtQueued, 0 if moStatus < 2 else 5, mtStatus)
+
+    def _parseSBDWriteResult(self, response):
+        """ Checks the result code returned after SBD message data has been written """
+        code = self.SBDWB_RESP_REGEX.match(response[0])
+        if code == None or int(code.group(1)) != 0:
+            raise CommandError()
+
+    @property
+    def maxMOLength(self):
+        """ @return: the largest SBD message (in bytes) this modem will send """
+        return sbdMaxMOLength(self._modelName)
+
+    def _encodePayload(self, msg):
+        """ @return: the message to write to the ISU: msg, or a copy with its data compressed with self.payloadCodecs
+
+        @raise ValueError: if the compressed data (with its header byte) is longer than maxMOLength
+        """
+        if self.payloadCodecs == None:
+            return msg
+        data = self.payloadCodecs.compress(msg.data)
+        if len(data) > self.maxMOLength:
+            raise ValueError('compressed SBD message is {0} bytes; the modem sends at most {1}'.format(len(data), self.maxMOLength))
+        return SBDBinaryMessage(msg.sequence, data)
+
+    def _decodePayload(self, msg):
+        """ Decompresses the data of a message read from the ISU with self.payloadCodecs, if set
+
+        Data that is not a payload compressed by the codecs is left as it is,
+        with the reason in msg.payloadError, so the message is not lost.
+        """
+        if self.payloadCodecs != None:
+            try:
+                msg.data = self.payloadCodecs.decompress(msg.data)
+            except ValueError as e:
+                self.log.warning('Cannot decompress SBD message %d; passing it on as received: %s', msg.sequence, e)
+                msg.payloadError = str(e)
+        return msg
+
+    def _dataReceived(self, data):
+        """ Handles bytes read from the serial port
+
+        While an AT+SBDRB response is expected (self._sbdFrame is armed) its
+        binary part goes straight to the frame reader; everything else is
+        collected in self._rxBuffer and passed to self._handleLineRead() a
+        line at a time, or when self._expectResponseTermSeq is seen.
+        """
+        readTermSeq = SerialComms.RX_EOL_SEQ
+        view = memoryview(data)
+        pos = 0
+        while pos < len(data):
+            frame = self._sbdFrame
+            if frame != None and not frame.done:
+                count = min(frame.remaining, len(data) - pos)
+                frame.feed(view[pos:pos + count])
+                pos += count
+                if frame.error:
+                    self._rxBuffer.extend(frame.header)
+                continue
+            self._rxBuffer.append(data[pos])
+            pos += 1
+            if self._rxBuffer.endswith(readTermSeq):
+                # A line (or other logical segment) has been read
+                line = self._rxBuffer[:-len(readTermSeq)].decode(errors='replace')
+                self._rxBuffer = bytearray()
+                if len(line) > 0:
+                    self._handleLineRead(line)
+            elif self._expectResponseTermSeq:
+                if self._rxBuffer.endswith(self._expectResponseTermSeq):
+                    line = self._rxBuffer.decode(errors='replace')
+                    self._rxBuffer = bytearray()
+                    self._handleLineRead(line, checkForResponseTerm=False)
+
+
+class IridiumModem(GsmModem, IridiumProtocol):
     log = logging.getLogger('gsmmodem.modem.IridiumModem')
     virtualIridium = False
-    _iridiumEraBases = [0, 1, 2]
-    def __init__(self, port, baudrate=19200, incomingCallCallbackFunc=None, smsReceivedCallbackFunc=None, smsStatusReportCallback=None):
+    # Skip the AT+SBDS round trips around SBD reads and writes, relying on
+    # sequence numbers tracked locally from the session responses instead
+    leanSBDTransactions = False
+    # SerialReactor to read the serial port from, instead of a read thread per modem
+    reactor = None
+    # Enable SBD ring alerts (AT+SBDMTA=1) and automatic registration (AT+SBDAREG=1)
+    # in connect(), so that MT messages are fetched as soon as the gateway has them
+    ringAlerts = False
+    # CapabilityStore remembering which commands each unit supports; if set,
+    # connect() skips GsmModem's set-up and sends only those commands
+    capabilityStore = None
+    # Sent by connect() after ATZ/ATE0 if the unit supports them
+    INIT_COMMANDS = ['AT&K3', 'AT&D2', 'AT+CMEE=1']
+    # Optional features checked when a unit is first seen
+    PROBE_COMMANDS = ['AT+CSQF', 'AT+SBDMTA?', 'AT+CIER?']
+    # Let queryBatch() chain commands into one line; turned off automatically
+    # for modems found not to accept chained commands
+    commandChaining = True
+    # CommandArbiter sharing the modem between threads; commands are queued by
+    # priority, and a thread can claim the modem for several commands with
+    # arbiter.claim(priority, deadline)
+    arbiter = None
+    # PropertyCache keeping property values (signalStrength, imei...) for a
+    # while; give each modem its own, as the values belong to the unit
+    propertyCache = None
+    # Commands with timeouts at least this long (in seconds) are queued behind shorter ones
+    LONG_COMMAND_TIME = 60
+    # Enable indicator event reporting (AT+CIER) in connect(), keeping self.indicators
+    # up to date with signal strength, service availability and antenna faults
+    indicatorEvents = False
+    # CodecRegistry compressing the data of SBD messages written to the ISU, and
+    # decompressing those read from it; the other end must use the same codecs.
+    # The header byte counts towards maxMOLength, so build payloads of at most
+    # maxMOLength - compression.HEADER_LENGTH bytes
+    payloadCodecs = None
+    def __init__(self, port, baudrate=19200, incomingCallCallbackFunc=None, smsReceivedCallbackFunc=None, smsStatusReportCallback=None, sbdReceivedCallbackFunc=None):
         super(IridiumModem, self).__init__(port, baudrate, incomingCallCallbackFunc, smsReceivedCallbackFunc, smsStatusReportCallback)
+        self.sbdReceivedCallback = sbdReceivedCallbackFunc
+        self.registrationStatus = None # (event, error) from the last +AREG notification
+        self._ringLock = threading.Lock() # held while answering a ring alert
+        self.indicators = IndicatorMonitor()
+        self._csqfSupported = True
+        self.capabilities = None # DeviceCapabilities, when connected with a capabilityStore
+        self._gsmConnecting = False # set while GsmModem.connect() runs, so it skips its GSM setup
+        self._chainingWorks = None # whether a chained command line has been accepted yet
         self.timeout = 50
-        self._epochBaseTime = dateutil.parser.parse("1970-01-01T00:00:00.000Z")
-        self._iridiumEraBases[0] = (((dateutil.parser.parse("1996-06-01T00:00:11.000Z")) - self._epochBaseTime).total_seconds() ) * 1000
-        self._iridiumEraBases[1] = (((dateutil.parser.parse("2007-03-08T03:50:21.000Z")) - self._epochBaseTime).total_seconds() ) * 1000
-        self._iridiumEraBases[2] = (((dateutil.parser.parse("2014-05-11T14:23:55.000Z")) - self._epochBaseTime).total_seconds() ) * 1000
+        self._sbdFrame = None # SBDFrameReader for an AT+SBDRB in progress
+        self._rxBuffer = bytearray()
+        self._sbdState = SBDStateTracker()
+        self._modelName = None # Used to pick per-model command timeouts
+        self.timeoutPolicy = CommandTimeoutPolicy()
 
     def connect(self, pin=None):
         """ Opens the port and initializes the modem and SIM card
@@ -128,30 +525,40 @@ class IridiumModem(GsmModem):
         :raise IncorrectPinError: if the specified PIN is incorrect
         """
 
-        # Patch the CSQ regex to work with 9522 responses
-        self.CSQ_REGEX   = re.compile(r'^\+CSQ:\s*(\d+)')
-        # -MSSTM: 2c6bd0b1
-        self.MSSTM_REGEX = re.compile(r'^\-MSSTM:\s*([0-9A-Fa-f]+)')
-        # -MSGEO: 4024,-100,4924,2c781713
-        self.MSGEO_REGEX = re.compile(r'^\-MSGEO:\s*(-?\d+),(-?\d+),(-?\d+),([0-9A-Fa-f]+)')
-        # 00.0000,N,000.0000,E,V
-        self.GPSPOS_REGEX = re.compile(r'^(-?\d+).(-?\d+),([A-Za-z]),(-?\d+).(-?\d+),([A-Za-z]),([0-9A-Za-z])')
-        # Used for SBD write
-        self.SBDWB_READY_REGEX = re.compile(r'^READY')
-        self.SBDWB_RESP_REGEX = re.compile(r'^(\d+)')
-        # +SBDS: 1, 5, 0, -1
-        self.SBDS_REGEX = re.compile(r'^\+SBDS:\s*(-?\d+),\s*(-?\d+),\s*(-?\d+),\s*(-?\d+)')
-        # +SBDI: 1, 7, 0, 0, 0, 0
-        self.SBDI_REGEX = re.compile(r'^\+SBDI:\s*(-?\d+),\s*(-?\d+),\s*(-?\d+),\s*(-?\d+),\s*(-?\d+),\s*(-?\d+)')
-        # +SBDIX: 0, 8, 0, 0, 0, 0
-        self.SBDIX_REGEX = re.compile(r'^\+SBDIX:\s*(-?\d+),\s*(-?\d+),\s*(-?\d+),\s*(-?\d+),\s*(-?\d+),\s*(-?\d+)')
-
         self.log.info('Connecting to modem on port %s at %dbps', self.port, self.baudrate)
+        self._sbdState.reset()
+        if self.propertyCache != None:
+            self.propertyCache.invalidate() # It may be a different unit now
 
+        if self.capabilityStore != None:
+            self._connectWithCapabilities(pin)
+        else:
+            self._connectGeneric()
+
+        if self.ringAlerts and self._supports('AT+SBDMTA?') != False:
+            try:
+                self.write('AT+SBDMTA=1')
+                self.write('AT+SBDAREG=1')
+            except CommandError:
+                self.log.warning('Unable to enable SBD ring alerts')
+
+        self.indicators.reset()
+        if self.indicatorEvents and self._supports('AT+CIER?') != False:
+            try:
+                # Signal, service and antenna indicators
+                self.write('AT+CIER=1,1,1,1')
+            except CommandError:
+                self.log.warning('Unable to enable indicator event reporting')
+
+    def _connectGeneric(self):
+        """ Initializes the modem by way of GsmModem.connect() """
+        self._gsmConnecting = True
         try:
             super(IridiumModem, self).connect()
         except InvalidStateException:
             pass # This will always happen, and we ignore the exceptions and problems
+        finally:
+            self._gsmConnecting = False
 
         try:
             self.write('ATZ') # reset configuration
@@ -164,9 +571,113 @@ class IridiumModem(GsmModem):
             # returns "Call Processor Version: Long string"
             response = self.write('AT+GMR')
             if ': Long string' in response[0] or ': Long string' in response[1]:
-                virtualIridium = True
-                self.write('ATE0') # echo off
-                self.SBDS_REGEX = re.compile(r'\nSBDS:\s*(-?\d+),\s*(-?\d+),\s*(-?\d+),\s*(-?\d+)')
+                self._useVirtualIridium()
+
+        self._modelName = self._queryIdentity('AT+CGMM')
+
+    def _connectWithCapabilities(self, pin):
+        """ Initializes the modem with only the commands it is known to support
+
+        Capabilities are looked up by model and firmware revision; any of
+        the commands in INIT_COMMANDS and PROBE_COMMANDS that have not been
+        tried on that model and firmware (or were found unsupported too long
+        ago) are tried now, and the results saved in self.capabilityStore.
+        If an init command that is supposed to work fails, all of them are
+        probed again.
+        """
+        SerialComms.connect(self)
+        self.write('ATZ') # reset configuration
+        self.write('ATE0') # echo off
+        imei = self._queryIdentity('AT+CGSN')
+        model = self._queryIdentity('AT+CGMM')
+        revision = self._queryIdentity('AT+CGMR')
+        caps = self.capabilityStore.get(model, revision)
+        if caps == None:
+            self.log.info('Probing capabilities of %s %s', model, revision)
+            caps = DeviceCapabilities(imei, model, revision)
+        else:
+            caps = caps.forUnit(imei)
+        unknown = [command for command in self.INIT_COMMANDS + self.PROBE_COMMANDS if caps.supports(command) == None]
+        if len(unknown) > 0:
+            self._probeCapabilities(caps, unknown)
+            self.capabilityStore.put(caps)
+        self.capabilities = caps
+        if caps.virtualIridium:
+            self._useVirtualIridium()
+        stale = False
+        for command in self.INIT_COMMANDS:
+            if caps.supports(command):
+                try:
+                    self.write(command)
+                except (CommandError, TimeoutException):
+                    stale = True
+        if stale:
+            self.log.info('Stored capabilities of %s %s are out of date; probing again', model, revision)
+            self._probeCapabilities(caps, self.INIT_COMMANDS + self.PROBE_COMMANDS)
+            self.capabilityStore.put(caps)
+        self._unlockSim(pin)
+        self._modelName = model
+        self._csqfSupported = caps.supports('AT+CSQF') != False
+
+    def _probeCapabilities(self, caps, commands):
+        """ Tries each of commands, recording in caps which are supported
+
+        Commands that time out are left unrecorded, to be tried again next time.
+        """
+        for command in commands:
+            start = time.monotonic()
+            try:
+                response = self._write(command)
+            except CommandError:
+                caps.record(command, False, ['ERROR'], time.monotonic() - start)
+            except TimeoutException:
+                self.log.debug('No response to %s while probing capabilities', command)
+            else:
+                caps.record(command, True, response, time.monotonic() - start)
+        if 'AT&K3' in commands and not caps.supports('AT&K3'):
+            try:
+                response = self.write('AT+GMR')
+                caps.virtualIridium = any(': Long string' in line for line in response)
+            except (CommandError, TimeoutException):
+                pass
+        return caps
+
+    def probeCommands(self, commands):
+        """ Sends each of commands to the modem, recording which it supports
+
+        Commands already known not to be supported are tried again. The
+        results are added to self.capabilities (starting them if the modem
+        was connected without a capabilityStore) and saved in
+        self.capabilityStore if there is one.
+
+        @return: the updated DeviceCapabilities
+        """
+        caps = self.capabilities
+        if caps == None:
+            caps = DeviceCapabilities(self._queryIdentity('AT+CGSN'), self._queryIdentity('AT+CGMM'), self._queryIdentity('AT+CGMR'))
+        self._probeCapabilities(caps, commands)
+        self.capabilities = caps
+        if self.capabilityStore != None:
+            self.capabilityStore.put(caps)
+        return caps
+
+    def _queryIdentity(self, command):
+        """ @return: the text returned by an identification command (e.g. AT+CGMM), or None """
+        try:
+            response = self.write(command)
+        except (CommandError, TimeoutException):
+            return None
+        lines = [line for line in response[:-1] if len(line) > 0]
+        return ' '.join(lines) if len(lines) > 0 else None
+
+    def _supports(self, command):
+        """ @return: whether the modem is known to support command, or None if not known """
+        if self.capabilities == None:
+            return None
+        return self.capabilities.supports(command)
+
+    def _useVirtualIridium(self):
+        self.write('ATE0') # echo off
 
     def _unlockSim(self, pin):
         if pin != None:
@@ -186,65 +697,67 @@ class IridiumModem(GsmModem):
 
     @property
     def supportedCommands(self):
-        """ @return: list of AT commands supported by this modem (without the AT prefix). Returns None for Iridium modems, as they don't seem to support the AT+CLAC command  """
-        raise InvalidStateException()
-        #return None
+        """ @return: list of AT commands supported by this modem (without the AT prefix), as
+        recorded in self.capabilities; Iridium modems don't support the AT+CLAC command
 
-    def iridiumToDatetime(self, iridiumHex, iridiumEra = 2):
-        """ Converts Iridium network time to a datetime object
-        Useful when converting MSSTM or MSGEO(S) output.
-
-        @raise CommandError: if an error occurs
-        @param iridiumHex: Iridium time of the form 2c781713
-        @param iridiumEra: Start of Iridium clock base (0=1996, 1=2007, 2=2014 (default))
-        @return The GMT time as reported by the Iridium unit
-        @type datetime.datetime
+        @raise InvalidStateException: if the modem's capabilities are not known, or
+        GsmModem.connect() is asking (which stops it going on to set up GSM features)
         """
-        iridiumTime = int('0x'+(iridiumHex), 16)
-        iridiumMillis = iridiumTime * 90
-        timeMillis = iridiumMillis + self._iridiumEraBases[iridiumEra]
-        timeSeconds = timeMillis/1000.0
-        dt = datetime.utcfromtimestamp(timeSeconds)
-        # Iridium time is always UTC
-        dt = dt.replace(tzinfo=timezone.utc)
-        
-        # FP conversion in datetime causes rounding errors to creep in:
-        # timeSeconds: 1466973138.01 reads back as .009999
-        # Trying to use round() to fix it doesn't solve the problems completely
-        # in initial testing, so we take advantage of the fact we only need
-        # milliseconds (iridium time is based on 90ms ticks).
-        #
-        # Note that this is hard to reproduce as of 20200419
-        if ( dt.microsecond % 10 ) == 9:
-            dt = dt.replace(microsecond = (dt.microsecond+1))
-
-        return dt
-
-
-    def datetimeToIridium(self, dt):
-        """ Converts a datetime object to Iridium network time
-
-        @raise CommandError: if an error occurs
-        @param dt: datetime.datetime object to convert
-        @return The Iridium time representing the given datetime
-        @type int
+        if self.capabilities == None or self._gsmConnecting:
+            raise InvalidStateException()
+        return self.capabilities.supportedCommands()
+
+    def queryBatch(self, commands):
+        """ Sends several read-only queries (see BATCH_QUERIES) in one round trip
+
+        The commands are chained into a single command line, e.g.
+        AT+CGMI;+CGSN;-MSSTM;+SBDSX, and the response split back up between
+        them. If the modem rejects the line, or its response cannot be split,
+        the commands are sent one at a time instead, and if they all work that
+        way on a modem that has never accepted a chained line, commandChaining
+        is turned off for it.
+
+        The chained line is given the sum of its commands' timeouts, and its
+        response time is not fed back into self.timeoutPolicy, as it belongs
+        to no one command.
+
+        @raise ValueError: if a command is not in BATCH_QUERIES
+        @raise CommandError: if one of the commands fails
+        @raise TimeoutException: if the modem does not answer the chained line
+        (the commands are not then tried one at a time, as the late answer
+        could be taken for theirs)
+        @return: a list of results, one per command, as returned by the
+        corresponding property (e.g. a datetime for AT-MSSTM)
         """
-
-        epochSeconds = dt.timestamp() # This is a float
-        epochMilliseconds = epochSeconds * 1000
-
-        # Assume era2 (current at time of writing) unless we end up negative
-        iridiumMillis = epochMilliseconds - self._iridiumEraBases[2]
-        if iridiumMillis < 0:
-            iridiumMillis = epochMilliseconds - self._iridiumEraBases[1]
-        if iridiumMillis < 0:
-            iridiumMillis = epochMilliseconds - self._iridiumEraBases[0]
-        if iridiumMillis < 0:
-            # We're in trouble: the time is before the start of the Iridium network!
-            raise CommandError()
-
-        iridiumTime = int(iridiumMillis / 90)
-        return iridiumTime
+        commands = list(commands)
+        for command in commands:
+            if command not in BATCH_QUERIES:
+                raise ValueError('{0} cannot be batched'.format(command))
+        if len(commands) > 1 and self.commandChaining:
+            try:
+                results = self._parseBatch(commands, self._writeBatch(commands))
+            except CommandError as e:
+                self.log.debug('Batched query failed (%s); sending the commands one at a time', e)
+            else:
+                self._chainingWorks = True
+                return results
+        results = [getattr(self, BATCH_QUERIES[command][1])(self.write(command)) for command in commands]
+        if len(commands) > 1 and self.commandChaining and self._chainingWorks == None:
+            # Each command works on its own, so it was the chaining that failed
+            self.log.info('Modem does not accept chained commands; sending them one at a time')
+            self.commandChaining = False
+        return results
+
+    def _writeBatch(self, commands):
+        """ @return: the response to commands chained into one line, sent without involving the timeout learner """
+        line = self._batchLine(commands)
+        timeout = self._batchTimeout(commands)
+        with self._claim(line, timeout):
+            return super(IridiumModem, self).write(line, timeout=timeout)
+
+    def _batchTimeout(self, commands):
+        """ @return: the timeout for commands chained into one line: the sum of their own timeouts """
+        return sum(self.timeoutPolicy.timeoutFor(command, self._modelName) for command in commands)
 
     @property
     def systemTime(self, iridiumEra = 2):
@@ -255,170 +768,198 @@ class IridiumModem(GsmModem):
         @return The current GMT time as reported by the Iridium unit
         @type datetime.datetime
         """
-        response = self.write('AT-MSSTM')
-        msstm = self.MSSTM_REGEX.match(response[0])
-        if msstm:
-            return self.iridiumToDatetime(msstm.group(1))
-        else:
-            raise CommandError()
+        return self._parseSystemTime(self.write('AT-MSSTM'))
 
     @property
     def geoLocation(self):
-        response = self.write('AT-MSGEO')
-        msgeo = self.MSGEO_REGEX.match(response[0])
-        if msgeo:
-            # -MSGEO: 4024,-100,4924,2c781713
-            # lat 50.73489178019171 lon -1.423558380252216 time 2016-06-26 18:05:30.789999
-            iridiumX = int(msgeo.group(1))
-            iridiumY = int(msgeo.group(2))
-            iridiumZ = int(msgeo.group(3))
-            # From: Weisstein, Eric W. "Spherical Coordinates." From MathWorld--A Wolfram Web Resource.
-            #       http://mathworld.wolfram.com/SphericalCoordinates.html
-            iridiumR = math.sqrt(math.pow(iridiumX, 2) + math.pow(iridiumY, 2) + math.pow(iridiumZ, 2))
-            # Their phi is actually degrees from the north pole, so we move the base to the equator
-            # by subtracting it from 90.
-            lat = 90 - (math.degrees(math.acos(iridiumZ/iridiumR)))
-            lon = math.degrees(math.atan(iridiumY/iridiumX))
-            fixTime = self.iridiumToDatetime(msgeo.group(4))
-            # print('lat '+format(lat)+' lon '+format(lon)+' time '+format(fixTime))
-            return [lat, lon, fixTime]
-        else:
-            raise CommandError()
+        return self._cached('geoLocation', lambda: self._parseGeoLocation(self.write('AT-MSGEO')))
 
     @property
     def gpsLocation(self):
-        response = self.write('AT+GPSPOS')
-        gpspos = self.GPSPOS_REGEX.match(response[0])
-        if gpspos:
-            # 00.0000,N,000.0000,E,V
-            lat = int(gpspos.group(1)) + ( int(gpspos.group(2)) / 10000 )
-            lon = int(gpspos.group(4)) + ( int(gpspos.group(5)) / 10000 )
-            return [lat, lon]
-        else:
-            raise CommandError()
+        """ @return: [latitude, longitude] from the GPS receiver (negative south and west) """
+        return self._cached('gpsLocation', lambda: self._parseGpsLocation(self.write('AT+GPSPOS')))
 
     @property
-    def clearIsuSBDOutboundMessage(self):
-        response = self.write('AT+SBDD0')
+    def gpsFix(self):
+        """ @return: a GpsFix of the GPS receiver's position, including whether it is valid """
+        return self._cached('gpsFix', lambda: self._parseGpsFix(self.write('AT+GPSPOS')))
 
     @property
-    def clearIsuSBDInboundMessage(self):
-        response = self.write('AT+SBDD1')
+    def manufacturer(self):
+        return self._cached('manufacturer', lambda: GsmModem.manufacturer.fget(self))
 
     @property
-    def getSBDStatus(self):
-        # +SBDS: 1, 5, 0, -1
-        response = self.write('AT+SBDS')
-        sbds = self.SBDS_REGEX.match(response[0])
-        if sbds:
-            ret = ISUSBDStatus()
-            ret.outboundMSN = int(sbds.group(2))
-            ret.inboundMSN  = int(sbds.group(4))
-            if sbds.group(1) == "1":
-                ret.outboundMsgPresent = True
-            if sbds.group(3) == "1":
-                ret.inboundMsgPresent  = True
-            return ret
-        else:
-            raise CommandError()
+    def model(self):
+        return self._cached('model', lambda: GsmModem.model.fget(self))
+
+    @property
+    def revision(self):
+        return self._cached('revision', lambda: GsmModem.revision.fget(self))
 
+    @property
+    def imei(self):
+        return self._cached('imei', lambda: GsmModem.imei.fget(self))
 
+    def _cached(self, name, fetch):
+        """ @return: the value of a property from self.propertyCache, or straight from fetch() if there is no cache """
+        if self.propertyCache == None:
+            return fetch()
+        return self.propertyCache.get(name, fetch)
 
     @property
-    def initiateSBDSession(self):
-        # +SBDIX: 0, 8, 0, 0, 0, 0
-        #response = ['+SBDIX: 0, 8, 0, 0, 0, 0', 'OK']
-        response = self.write('AT+SBDIX', timeout=300)
-        sbdi = self.SBDIX_REGEX.match(response[0])
-        if sbdi:
-            ret = SBDTransferStatus()
-            ret.lastOutboundTransferStatus = int(sbdi.group(1))
-            ret.outboundMSN = int(sbdi.group(2))
-            ret.lastInboundTransferStatus = int(sbdi.group(3))
-            ret.inboundMSN  = int(sbdi.group(4))
-            if int(sbdi.group(1)) > 5: # Error ocurrred during outbound transfer
-                ret.outboundMsgPresent = True
-            if sbdi.group(5) != "0":
-                ret.inboundMsgPresent  = True
-            ret.inboundMessagesQueuedAtServer = int(sbdi.group(6))
-            return ret
-        else:
-            raise CommandError()
+    def clearIsuSBDOutboundMessage(self):
+        self.write('AT+SBDD0')
+        self._sbdState.outboundCleared()
+
+    @property
+    def clearIsuSBDInboundMessage(self):
+        self.write('AT+SBDD1')
+        self._sbdState.inboundCleared()
 
+    @property
+    def localSBDStatus(self):
+        """ @return: the SBD status as tracked locally from previous commands, or None if not known
+        @type ISUSBDStatus
+        """
+        return self._sbdState.snapshot()
 
     @property
-    def initiateOldSBDSession(self):
-        # +SBDI: 1, 7, 0, 0, 0, 0
-        #response = ['+SBDI: 1, 7, 0, 0, 0, 0', 'OK']
-        response = self.write('AT+SBDI', timeout=300)
-        sbdi = self.SBDI_REGEX.match(response[0])
-        if sbdi:
-            ret = SBDTransferStatus()
-            # Convert to SBDIX-compatible numbers
-            ret.lastOutboundTransferStatus = int(sbdi.group(1))
-            if int(sbdi.group(1)) < 2:
-                ret.lastOutboundTransferStatus = 0
-            else:
-                # Error
-                ret.lastOutboundTransferStatus = 5
-
-            ret.outboundMSN = int(sbdi.group(2))
-            ret.lastInboundTransferStatus = int(sbdi.group(3))
-            ret.inboundMSN  = int(sbdi.group(4))
-            if sbdi.group(1) == "2": # Error ocurrred during outbound transfer
-                ret.outboundMsgPresent = True
-            if sbdi.group(5) != "0":
-                ret.inboundMsgPresent  = True
-            ret.inboundMessagesQueuedAtServer = int(sbdi.group(6))
-            return ret
-        else:
-            raise CommandError()
+    def getSBDStatus(self):
+        ret = self._parseSBDStatus(self.write('AT+SBDS'))
+        self._sbdState.sync(ret)
+        return ret
 
+    @property
+    def initiateSBDSession(self):
+        ret = self._parseSBDIX(self.write('AT+SBDIX'))
+        known = self._sbdState.synced
+        if not self._sbdState.sessionCompleted(ret) and known:
+            self.log.debug('SBD session status does not match local status; will re-read with AT+SBDS')
+        return ret
 
+    @property
+    def initiateSBDSessionAnswer(self):
+        """ Initiates an SBD session in answer to a ring alert (AT+SBDIXA) """
+        ret = self._parseSBDIX(self.write('AT+SBDIXA'))
+        known = self._sbdState.synced
+        if not self._sbdState.sessionCompleted(ret) and known:
+            self.log.debug('SBD session status does not match local status; will re-read with AT+SBDS')
+        return ret
 
+    @property
+    def initiateOldSBDSession(self):
+        ret = self._parseSBDI(self.write('AT+SBDI'))
+        known = self._sbdState.synced
+        if not self._sbdState.sessionCompleted(ret) and known:
+            self.log.debug('SBD session status does not match local status; will re-read with AT+SBDS')
+        return ret
 
     # Used for testing!
     @property
     def copySentSBDToReceived(self):
-        response = self.write('AT+SBDTC')
+        self.write('AT+SBDTC')
+        self._sbdState.reset()
 
     def writeSBDMessageToIsu(self, msg):
-        response = self.write('AT+SBDWB='+format(len(msg.data)), expectedResponseTermSeq='READY')
+        with self._exclusive('AT+SBDWB'):
+            return self._writeSBDMessageToIsu(msg)
+
+    def _writeSBDMessageToIsu(self, msg):
+        payload = self._encodePayload(msg)
+        response = self.write('AT+SBDWB='+format(len(payload.data)), expectedResponseTermSeq='READY')
         ready = self.SBDWB_READY_REGEX.match(response[0])
         if ready:
-            messageData = msg.data + msg.generateChecksum
+            messageData = bytearray(payload.data) + payload.generateChecksum
             #response = self.write(messageData, writeTerm=b'')
             response = self.write(bytesWrapper(messageData), writeTerm=b'')
-            code = self.SBDWB_RESP_REGEX.match(response[0])
-            if int(code.group(1)) == 0:
-                ret = self.getSBDStatus
-                msg.sequence = ret.outboundMSN
-                return ret
+            try:
+                self._parseSBDWriteResult(response)
+            except CommandError:
+                self._sbdState.reset()
+                raise
+            if self.leanSBDTransactions and self._sbdState.synced:
+                self._sbdState.messageWritten()
+                ret = self._sbdState.snapshot()
             else:
-                raise CommandError()
+                ret = self.getSBDStatus
+            msg.sequence = ret.outboundMSN
+            return ret
         else:
             raise CommandError()
 
     @property
     def readSBDMessageFromIsu(self):
-        ret = self.getSBDStatus # Get the sequence number
-        response = self.write('AT+SBDRB')
-        byteResponse = bytes(response[0], 'iso-8859-1')
-        if len(byteResponse) < 4:
-            raise CommandError()
-        msgLen = int(byteResponse[0]) * 256
-        msgLen = int(byteResponse[1]) + msgLen
-        if len(byteResponse) != (msgLen + 2 + 2):
-            raise CommandError()
-
-        binData = byteResponse[2:(len(byteResponse)-2)]
-        binMsg = SBDBinaryMessage(ret.inboundMSN, binData)
-        #checksum = binMsg.generateChecksum
-
-        cksum = byteResponse[(len(byteResponse)-2):len(byteResponse)]
-        if binMsg.validateChecksum(cksum) == False:
-            raise CommandError()
-        return binMsg
+        if self.leanSBDTransactions and self._sbdState.synced:
+            ret = self._sbdState.snapshot()
+        else:
+            ret = self.getSBDStatus # Get the sequence number
+        return self._readSBDMessage(ret.inboundMSN)
+
+    def _readSBDMessage(self, sequence):
+        """ Reads the MT buffer with AT+SBDRB, labelling the message with the given MTMSN """
+        frame = SBDFrameReader()
+        with self._exclusive('AT+SBDRB'):
+            # Arm the binary reader before the command goes out so that the
+            # read thread never tries to decode the message as text
+            self._sbdFrame = frame
+            try:
+                self.write('AT+SBDRB')
+            finally:
+                self._sbdFrame = None
+        return self._decodePayload(frame.message(sequence))
+
+    def drainSBDMessages(self, outbound=None, maxSessions=None, answerRing=False, clearMO=False):
+        """ Retrieves every MT message queued at the gateway, in as few sessions as possible
+
+        Generator that keeps initiating SBD sessions for as long as the
+        gateway reports more messages queued, yielding each message as it is
+        read from the ISU. Outbound messages are sent on the same sessions.
+
+        Draining stops after a session in which nothing was received, or
+        after a session fails; a message that failed to go out is left in
+        the MO buffer. Otherwise the first session also sends any message
+        already waiting in the MO buffer, which is then cleared so that it
+        does not go out again on the following sessions.
+
+        :param outbound: iterable of SBDBinaryMessages to send along the way
+        :param maxSessions: the most sessions to initiate, or None for no limit
+        :param answerRing: start with AT+SBDIXA, as when answering an SBD ring alert
+        :param clearMO: discard whatever is in the MO buffer first, instead of sending it
+
+        :raise CommandError: if a message read from the ISU fails its checksum
+        """
+        outbound = iter(outbound if outbound != None else ())
+        nextMO = next(outbound, None)
+        if clearMO:
+            self.clearIsuSBDOutboundMessage
+        state = self._sbdState.snapshot()
+        # A message written earlier may be waiting in the MO buffer
+        moPending = not clearMO and (state is None or state.outboundMsgPresent)
+        sessions = 0
+        while maxSessions == None or sessions < maxSessions:
+            if nextMO is not None:
+                self.writeSBDMessageToIsu(nextMO)
+                moPending = True
+            if answerRing and sessions == 0:
+                status = self.initiateSBDSessionAnswer
+            else:
+                status = self.initiateSBDSession
+            sessions += 1
+            if nextMO is not None and status.lastOutboundTransferStatus > 4:
+                return
+            if moPending and status.lastOutboundTransferStatus <= 4:
+                if nextMO is not None:
+                    nextMO = next(outbound, None)
+                if nextMO is None:
+                    # Don't send it again on the following sessions
+                    self.clearIsuSBDOutboundMessage
+                    moPending = False
+            if status.lastInboundTransferStatus == 1:
+                yield self._readSBDMessage(status.inboundMSN)
+            elif status.lastInboundTransferStatus == 2 or nextMO is None:
+                return
+            if status.inboundMessagesQueuedAtServer == 0 and nextMO is None:
+                return
 
     @property
     def testStuff(self):
@@ -431,8 +972,9 @@ class IridiumModem(GsmModem):
     def signalStrength(self):
         """  Checks the modem's cellular network signal strength
 
-            Override from gsmmodem to change the timeout, as Iridium phones take
-            a while to get the signal strength.
+            Override from gsmmodem to change the response format and timeout, as
+            Iridium phones take a while to get the signal strength (see the
+            +CSQ entry in CommandTimeoutPolicy).
 
         :raise CommandError: if an error occurs
 
@@ -441,20 +983,167 @@ class IridiumModem(GsmModem):
         """
 
         # Should check CREG first in line with Iridium spec section 5.94
-        csq = self.CSQ_REGEX.match(self.write('AT+CSQ', waitForResponse=True, timeout=60, parseError=True, writeTerm='\r', expectedResponseTermSeq=None)[0])
-        if csq:
-            ss = int(csq.group(1))
-            return ss if ss != 99 else -1
-        else:
-            raise CommandError("invalid response for AT+CSQ")
+        return self._cached('signalStrength', lambda: self._parseSignalStrength(self.write('AT+CSQ')))
+
+    @property
+    def signalStrengthFast(self):
+        """ Returns the signal strength last measured by the ISU (AT+CSQF), without waiting for a new measurement
+
+        Falls back to signalStrength on units that do not support AT+CSQF.
+
+        :return: The network signal strength as an integer between 0 and 5, or -1 if it is unknown
+        :rtype: int
+        """
+        return self._cached('signalStrengthFast', self._readSignalStrengthFast)
+
+    def _readSignalStrengthFast(self):
+        if self._csqfSupported:
+            try:
+                return self._parseSignalStrength(self.write('AT+CSQF'))
+            except CommandError:
+                self.log.debug('AT+CSQF not supported; using AT+CSQ')
+                self._csqfSupported = False
+        return self.signalStrength
     
-    def write(self, data, waitForResponse=True, timeout=10, parseError=True, writeTerm=TERMINATOR, expectedResponseTermSeq=None):
+    def _readLoop(self):
+        """ Read thread main loop
+
+        Replaces the gsmmodem read loop so that binary AT+SBDRB responses are
+        read straight off the serial port instead of being decoded as lines.
+        If the modem has a reactor, the port is handed over to it instead and
+        the read thread exits straight away.
+        """
+        self._rxBuffer = bytearray()
+        if self.reactor != None:
+            self.reactor.register(self)
+            return
+        try:
+            while self.alive:
+                frame = self._sbdFrame
+                if frame != None and not frame.done:
+                    data = self.serial.read(frame.remaining)
+                else:
+                    data = self.serial.read(1)
+                if len(data) != 0: # check for timeout
+                    self._dataReceived(data)
+        except serial.SerialException as e:
+            self._serialError(e)
+
+    def _handleLineRead(self, line, checkForResponseTerm=True):
+        if checkForResponseTerm and self.PARSER.isUnsolicited(line):
+            # Never part of a command response, even if one is being waited for
+            self.log.debug('notification: %s', line)
+            self.notifyCallback([line])
+        else:
+            super(IridiumModem, self)._handleLineRead(line, checkForResponseTerm)
+
+    def _handleModemNotification(self, lines):
+        handled = False
+        for line in lines:
+            parsed = self.PARSER.parseLine(line)
+            prefix = parsed.prefix if parsed != None else None
+            if prefix == 'SBDRING':
+                # Not an incoming call, which is how GsmModem would take it
+                threading.Thread(target=self._handleSBDRing).start()
+            elif prefix == '+CIEV':
+                self.indicators.update(*parsed.values)
+            elif prefix == '+AREG':
+                self.registrationStatus = parsed.values
+                self.log.debug('SBD automatic registration event %d, error %d', *self.registrationStatus)
+            else:
+                continue
+            handled = True
+        if not handled:
+            super(IridiumModem, self)._handleModemNotification(lines)
+
+    def _handleSBDRing(self):
+        """ Fetches the messages waiting at the gateway after a ring alert """
+        self.log.info('SBD ring alert')
+        if self.sbdReceivedCallback == None:
+            return
+        if not self._ringLock.acquire(False):
+            return # The alert is repeated until answered; already on it
+        try:
+            messages = []
+            try:
+                # Hold the modem throughout, so that no other thread's commands
+                # (e.g. the two halves of an AT+SBDWB) are split by the sessions
+                with self._exclusive('AT+SBDIXA'):
+                    for msg in self.drainSBDMessages(answerRing=True):
+                        messages.append(msg)
+            except (CommandError, TimeoutException) as e:
+                self.log.error('Unable to retrieve SBD messages after ring alert: %s', e)
+            # Delivered once the modem is free, so the callback may wait on
+            # other threads that use it (e.g. to queue a reply)
+            for msg in messages:
+                self.sbdReceivedCallback(msg)
+        finally:
+            self._ringLock.release()
+
+    def _serialError(self, e):
+        """ Shuts down after the serial port fails """
+        self.alive = False
+        try:
+            self.serial.close()
+        except Exception:
+            pass
+        # Notify the fatal error handler
+        self.fatalErrorCallback(e)
+
+    def close(self):
+        if self.reactor != None:
+            self.reactor.unregister(self)
+        super(IridiumModem, self).close()
+
+    def write(self, data, waitForResponse=True, timeout=None, parseError=True, writeTerm=TERMINATOR, expectedResponseTermSeq=None):
         """ Write data to the modem.
 
-        This method ad
+        Unless a timeout is given, it is taken from self.timeoutPolicy for the
+        command being sent, and the time the modem takes to respond is fed
+        back into the policy.
+
+        If there is an arbiter, the command waits for its turn at the modem.
+
+        @raise CommandRejectedError: if the arbiter turned the command away
+        """
+        if self.arbiter == None:
+            return self._write(data, waitForResponse, timeout, parseError, writeTerm, expectedResponseTermSeq)
+        with self._claim(data, timeout):
+            return self._write(data, waitForResponse, timeout, parseError, writeTerm, expectedResponseTermSeq)
+
+    def _claim(self, command, timeout=None):
+        """ @return: a context manager holding self.arbiter (if there is one) while command is in progress
+
+        Commands that may run for LONG_COMMAND_TIME or more go behind everything else.
         """
-        #print('In wrapper write')
-        newTimeout = timeout
-        if newTimeout < 30:
-            newTimeout = 30
-        return super(IridiumModem, self).write(data, writeTerm=writeTerm, waitForResponse=waitForResponse, timeout=newTimeout, expectedResponseTermSeq=expectedResponseTermSeq)
+        if self.arbiter == None:
+            return nullcontext()
+        if timeout == None:
+            timeout = self.timeoutPolicy.timeoutFor(command, self._modelName)
+        priority = PRIORITY_LOW if timeout >= self.LONG_COMMAND_TIME else PRIORITY_NORMAL
+        return self.arbiter.claim(priority, expected=timeout, label=command if isinstance(command, str) else None)
+
+    @contextmanager
+    def _exclusive(self, command):
+        """ Holds the modem (the arbiter, if any, and the serial port) for a sequence of commands starting with command """
+        with self._claim(command), self._txLock:
+            yield
+
+    def _write(self, data, waitForResponse=True, timeout=None, parseError=True, writeTerm=TERMINATOR, expectedResponseTermSeq=None):
+        policyTimeout = timeout == None
+        if policyTimeout:
+            timeout = self.timeoutPolicy.timeoutFor(data, self._modelName)
+        start = time.monotonic()
+        try:
+            response = super(IridiumModem, self).write(data, writeTerm=writeTerm, waitForResponse=waitForResponse, timeout=timeout, parseError=parseError, expectedResponseTermSeq=expectedResponseTermSeq)
+        except TimeoutException:
+            if policyTimeout:
+                self.timeoutPolicy.recordTimeout(data, timeout, self._modelName)
+            raise
+        except CommandError:
+            # The modem did respond, just not with OK
+            self.timeoutPolicy.record(data, time.monotonic() - start, self._modelName)
+            raise
+        if waitForResponse:
+            self.timeoutPolicy.record(data, time.monotonic() - start, self._modelName)
+        return response
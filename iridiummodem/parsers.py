@@ -0,0 +1,136 @@
+""" Table-driven parsing of Iridium response lines
+
+Most Iridium responses, solicited or not, are a prefix followed by comma
+separated fields: +SBDIX: 0, 8, 0, 0, 0, 0. Rather than every command
+matching its own regular expression, RESPONSE_FORMATS declares each prefix
+and the types of its fields once, and ResponseParser dispatches a line to
+its format with a dictionary lookup on the prefix. Supporting another
+command is a matter of adding a line to the table.
+"""
+
+from gsmmodem.exceptions import CommandError
+
+
+def hexField(field):
+    """ Checks that a field is hexadecimal (e.g. an Iridium time) and returns it unchanged """
+    int(field, 16)
+    return field
+
+
+class ResponseFormat(object):
+    """ The prefix of one kind of response line and the types of its fields
+
+    Each of fields converts the text of one field, raising ValueError if it is
+    not valid. Fields beyond those declared are ignored.
+    """
+    __slots__ = ('prefix', 'fields', 'unsolicited')
+
+    def __init__(self, prefix, fields=(), unsolicited=False):
+        self.prefix = prefix
+        self.fields = tuple(fields)
+        self.unsolicited = unsolicited # sent by the modem at any time, not in reply to a command
+
+    def parse(self, text):
+        """ @return: a tuple of the converted fields in text (the line after the prefix), or None if they are not valid """
+        if len(self.fields) == 0:
+            return ()
+        parts = text.split(',')
+        if len(parts) < len(self.fields):
+            return None
+        try:
+            return tuple([convert(part.strip()) for convert, part in zip(self.fields, parts)])
+        except ValueError:
+            return None
+
+
+class ResponseLine(object):
+    """ A parsed response line: its prefix and field values """
+    __slots__ = ('prefix', 'values')
+
+    def __init__(self, prefix, values):
+        self.prefix = prefix
+        self.values = values
+
+    def __repr__(self):
+        return 'ResponseLine({0!r}, {1!r})'.format(self.prefix, self.values)
+
+
+# Six integer fields, as in the SBD session and extended status responses
+SIX_INTS = (int,) * 6
+
+RESPONSE_FORMATS = [
+    # +CSQ:5 (the 9522 leaves out the space) and +CSQF:5
+    ResponseFormat('+CSQ', (int,)),
+    ResponseFormat('+CSQF', (int,)),
+    # -MSSTM: 2c6bd0b1
+    ResponseFormat('-MSSTM', (hexField,)),
+    # -MSGEO: 4024,-100,4924,2c781713
+    ResponseFormat('-MSGEO', (int, int, int, hexField)),
+    # +SBDS: 1, 5, 0, -1 (virtual Iridium leaves out the +)
+    ResponseFormat('+SBDS', (int,) * 4),
+    ResponseFormat('SBDS', (int,) * 4),
+    # +SBDSX: 1, 5, 0, -1, 0, 2
+    ResponseFormat('+SBDSX', SIX_INTS),
+    # +SBDI: 1, 7, 0, 0, 0, 0
+    ResponseFormat('+SBDI', SIX_INTS),
+    # +SBDIX: 0, 8, 0, 0, 0, 0
+    ResponseFormat('+SBDIX', SIX_INTS),
+    # +GPSSTA: 1
+    ResponseFormat('+GPSSTA', (int,)),
+    # Lines the modem may send at any time, even in the middle of a command response
+    ResponseFormat('SBDRING', unsolicited=True),
+    # +AREG: 1,0
+    ResponseFormat('+AREG', (int, int), unsolicited=True),
+    # +CIEV:0,4
+    ResponseFormat('+CIEV', (int, int), unsolicited=True),
+]
+
+
+def splitPrefix(line):
+    """ @return: (prefix, rest) for a response line, e.g. ('+CSQ', '5') for '+CSQ:5' """
+    line = line.strip()
+    idx = line.find(':')
+    if idx == -1:
+        return line, ''
+    return line[:idx].rstrip(), line[idx + 1:]
+
+
+class ResponseParser(object):
+    """ Dispatches response lines to their ResponseFormat by prefix """
+
+    def __init__(self, formats=RESPONSE_FORMATS):
+        self._formats = {}
+        for responseFormat in formats:
+            self.register(responseFormat)
+
+    def register(self, responseFormat):
+        """ Adds a format, replacing any already registered for its prefix """
+        self._formats[responseFormat.prefix] = responseFormat
+
+    def parseLine(self, line):
+        """ @return: a ResponseLine, or None if line is not of a registered format """
+        prefix, rest = splitPrefix(line)
+        responseFormat = self._formats.get(prefix)
+        if responseFormat == None:
+            return None
+        values = responseFormat.parse(rest)
+        if values == None:
+            return None
+        return ResponseLine(prefix, values)
+
+    def isUnsolicited(self, line):
+        """ @return: True if line is of a format the modem sends unprompted (e.g. SBDRING) """
+        responseFormat = self._formats.get(splitPrefix(line)[0])
+        return responseFormat != None and responseFormat.unsolicited
+
+    def expect(self, response, *prefixes):
+        """ Finds the first line of a command response with one of prefixes
+
+        @raise CommandError: if there is no such line, or its fields are not valid
+        @return: the tuple of field values from the line
+        """
+        for line in response:
+            parsed = self.parseLine(line)
+            if parsed != None and parsed.prefix in prefixes:
+                return parsed.values
+        raise CommandError('invalid response for {0}'.format('/'.join(prefixes)))
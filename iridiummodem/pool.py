@@ -0,0 +1,174 @@
+""" Pool of Iridium modems sharing outbound SBD traffic
+
+A site with several transceivers can hand all of its outbound messages to a
+ModemPool, which sends each one through whichever idle modem looks most
+likely to get it through (recent signal strength and session success rate),
+running sessions on different modems at the same time.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from gsmmodem.exceptions import InvalidStateException
+
+
+class PooledModem(object):
+    """ A modem in a ModemPool, with the statistics used to choose between modems """
+
+    # Weight given to the latest session when updating successRate
+    SUCCESS_RATE_WEIGHT = 0.3
+    # Signal strength assumed for modems that have not reported one yet
+    UNKNOWN_SIGNAL = 3
+
+    def __init__(self, modem):
+        self.modem = modem
+        self.busy = False
+        self.signalStrength = None # last reading (0-5), or None if not known
+        self.successRate = 1.0 # moving average of SBD session outcomes
+        self.sessions = 0
+        self.failures = 0
+        self.lastUsed = 0 # time.monotonic() of the last session start
+        self.lastError = None
+
+    @property
+    def score(self):
+        """ @return: how likely a session on this modem is to succeed, relative to the others in the pool """
+        signal = self.signalStrength if self.signalStrength != None and self.signalStrength >= 0 else self.UNKNOWN_SIGNAL
+        return self.successRate * (signal + 1) / 6.0
+
+    def sessionCompleted(self, success):
+        self.sessions += 1
+        if not success:
+            self.failures += 1
+        self.successRate += self.SUCCESS_RATE_WEIGHT * ((1.0 if success else 0.0) - self.successRate)
+
+
+class ModemPool(object):
+    """ Routes outbound SBD messages across several IridiumModem connections
+
+    send() queues a message and returns a concurrent.futures.Future. Whenever a
+    modem is idle, the queued message at the head of the line goes to the idle
+    modem with the best score (see PooledModem.score); ties go to the modem
+    that has been idle longest, spreading load over equally good radios. The
+    future's result is the SBDTransferStatus of the session (check its
+    lastOutboundTransferStatus: 0-4 means the message was delivered), or the
+    exception raised while talking to the modem.
+    """
+    log = logging.getLogger('iridiummodem.pool.ModemPool')
+
+    def __init__(self, modems):
+        """
+        @param modems: IridiumModem instances (connected or not) for the pool to own
+        """
+        self.modems = [PooledModem(modem) for modem in modems]
+        self._pending = deque() # (msg, future)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, len(self.modems)))
+        self._closed = False
+
+    def connect(self):
+        """ Connects every modem in the pool, concurrently """
+        for future in [self._executor.submit(pooled.modem.connect) for pooled in self.modems]:
+            future.result()
+
+    def close(self):
+        """ Stops accepting messages, waits for sessions in progress and closes the modems
+
+        Messages still queued have their futures cancelled.
+        """
+        with self._lock:
+            self._closed = True
+            pending = list(self._pending)
+            self._pending.clear()
+        for msg, future in pending:
+            future.cancel()
+        self._executor.shutdown(wait=True)
+        for pooled in self.modems:
+            pooled.modem.close()
+
+    def send(self, msg):
+        """ Queues an SBD message for the next suitable modem
+
+        @param msg: the SBDBinaryMessage to send
+        @return: a concurrent.futures.Future for the SBDTransferStatus of the session
+        """
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise InvalidStateException('modem pool closed')
+            self._pending.append((msg, future))
+        self._dispatch()
+        return future
+
+    def refreshSignalStrength(self):
+        """ Reads the signal strength of every idle modem, concurrently
+
+        Each reading can take some time, so this is left to the caller to
+        schedule; modems in a session keep their previous reading.
+        """
+        refreshing = []
+        with self._lock:
+            for pooled in self.modems:
+                if not pooled.busy:
+                    pooled.busy = True
+                    refreshing.append(pooled)
+        futures = [self._executor.submit(self._readSignal, pooled) for pooled in refreshing]
+        for future in futures:
+            future.result()
+
+    @property
+    def queued(self):
+        """ @return: the number of messages waiting for a modem """
+        with self._lock:
+            return len(self._pending)
+
+    def _readSignal(self, pooled):
+        try:
+            pooled.signalStrength = pooled.modem.signalStrength
+        except Exception as e:
+            pooled.lastError = e
+            pooled.signalStrength = None
+        finally:
+            self._release(pooled)
+
+    def _dispatch(self):
+        """ Assigns queued messages to idle modems """
+        with self._lock:
+            while len(self._pending) > 0:
+                idle = [pooled for pooled in self.modems if not pooled.busy]
+                if len(idle) == 0:
+                    return
+                msg, future = self._pending.popleft()
+                if not future.set_running_or_notify_cancel():
+                    continue
+                pooled = max(idle, key=lambda p: (p.score, -p.lastUsed))
+                pooled.busy = True
+                pooled.lastUsed = time.monotonic()
+                self._executor.submit(self._transmit, pooled, msg, future)
+
+    def _transmit(self, pooled, msg, future):
+        try:
+            pooled.modem.writeSBDMessageToIsu(msg)
+            status = pooled.modem.initiateSBDSession
+        except Exception as e:
+            self.log.warning('SBD session on %s failed: %s', pooled.modem.port, e)
+            pooled.lastError = e
+            pooled.sessionCompleted(False)
+            self._release(pooled)
+            future.set_exception(e)
+        else:
+            pooled.sessionCompleted(status.lastOutboundTransferStatus <= 4)
+            # Free the modem before the caller hears about it, so that a
+            # message sent in response can go to the same modem
+            self._release(pooled)
+            future.set_result(status)
+
+    def _release(self, pooled):
+        with self._lock:
+            pooled.busy = False
+            if self._closed:
+                return
+        self._dispatch()
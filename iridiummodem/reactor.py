@@ -0,0 +1,147 @@
+""" Single-thread I/O for many modems
+
+Every IridiumModem normally has its own read thread blocking on its serial
+port. A SerialReactor replaces those threads with one thread waiting on all
+of the ports at once (epoll/kqueue/poll via the selectors module), which
+matters when dozens of mostly idle modems are attached to one host.
+
+Usage::
+
+    reactor = SerialReactor()
+    reactor.start()
+    for port in ports:
+        modem = IridiumModem(port)
+        modem.reactor = reactor
+        modem.connect()
+
+Commands are still written with the blocking IridiumModem.write(); only the
+reading of responses and unsolicited lines moves to the reactor thread.
+"""
+
+import logging
+import os
+import selectors
+import threading
+
+import serial
+
+from gsmmodem.exceptions import InvalidStateException
+
+
+class SerialReactor(object):
+    """ Reads the serial ports of many modems from one thread """
+    log = logging.getLogger('iridiummodem.reactor.SerialReactor')
+
+    def __init__(self):
+        self._selector = selectors.DefaultSelector()
+        self._lock = threading.Lock()
+        self._changes = [] # [modem, register, threading.Event, error] waiting for the reactor thread
+        self._wakeRead, self._wakeWrite = os.pipe()
+        os.set_blocking(self._wakeRead, False)
+        self._selector.register(self._wakeRead, selectors.EVENT_READ)
+        self._modems = {} # modem: file descriptor
+        self._thread = None
+        self.alive = False
+
+    def start(self):
+        """ Starts the reactor thread """
+        self.alive = True
+        self._thread = threading.Thread(target=self._run, name='SerialReactor')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """ Stops the reactor thread; the modems' ports are left open """
+        self.alive = False
+        self._wake()
+        self._thread.join()
+        self._selector.close()
+        os.close(self._wakeRead)
+        os.close(self._wakeWrite)
+
+    @property
+    def modems(self):
+        """ @return: the modems currently being read """
+        with self._lock:
+            return list(self._modems)
+
+    def register(self, modem):
+        """ Starts reading modem.serial, passing data to modem._dataReceived() """
+        self._change(modem, True)
+
+    def unregister(self, modem):
+        """ Stops reading modem.serial; once this returns, no more data is passed to the modem """
+        self._change(modem, False)
+
+    def _change(self, modem, register):
+        if not self.alive:
+            if register:
+                raise InvalidStateException('reactor not running')
+            with self._lock:
+                self._modems.pop(modem, None)
+            return
+        if threading.current_thread() is self._thread:
+            # Called back from the reactor thread itself (e.g. by a fatal error handler)
+            self._apply(modem, register)
+            return
+        change = [modem, register, threading.Event(), None]
+        with self._lock:
+            self._changes.append(change)
+        self._wake()
+        change[2].wait()
+        if change[3] != None:
+            raise change[3]
+
+    def _wake(self):
+        try:
+            os.write(self._wakeWrite, b'\0')
+        except BlockingIOError:
+            pass # already woken
+
+    def _apply(self, modem, register):
+        with self._lock:
+            if register and modem not in self._modems:
+                fd = modem.serial.fileno()
+                self._selector.register(fd, selectors.EVENT_READ, modem)
+                self._modems[modem] = fd
+            elif not register and modem in self._modems:
+                self._selector.unregister(self._modems.pop(modem))
+
+    def _applyChanges(self):
+        with self._lock:
+            changes = self._changes
+            self._changes = []
+        for change in changes:
+            try:
+                self._apply(change[0], change[1])
+            except (OSError, ValueError) as e:
+                change[3] = e
+            finally:
+                change[2].set()
+
+    def _run(self):
+        while self.alive:
+            for key, events in self._selector.select():
+                if key.fd == self._wakeRead:
+                    try:
+                        os.read(self._wakeRead, 4096)
+                    except BlockingIOError:
+                        pass
+                else:
+                    self._read(key.data)
+            self._applyChanges()
+        # Release anyone still waiting on a change
+        self._applyChanges()
+
+    def _read(self, modem):
+        try:
+            data = modem.serial.read(modem.serial.in_waiting or 1)
+            if len(data) != 0:
+                modem._dataReceived(data)
+        except (serial.SerialException, OSError) as e:
+            self.log.error('serial port error on %s: %s', modem.port, e)
+            self._apply(modem, False)
+            modem._serialError(e)
+        except Exception:
+            # Keep serving the other modems
+            self.log.exception('error handling data from %s', modem.port)
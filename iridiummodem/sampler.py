@@ -0,0 +1,174 @@
+""" Continuous signal strength sampling
+
+AT+CSQ makes the ISU measure the signal, which can take tens of seconds;
+AT+CSQF returns the last measurement straight away. SignalSampler reads
+AT+CSQF at a steady rate into a fixed-size ring buffer and keeps running
+totals per signal level (there are only six), so the rolling statistics
+below cost the same however many samples are kept.
+"""
+
+import logging
+import threading
+import time
+from array import array
+
+# Signal strength levels reported by AT+CSQ/AT+CSQF
+SIGNAL_LEVELS = 6
+
+
+class SignalSampler(object):
+    """ Rolling window of timestamped signal strength samples
+
+    A sample's level is taken to hold until the next sample, which is what
+    timeAbove() adds up; the newest sample holds until now.
+    """
+    log = logging.getLogger('iridiummodem.sampler.SignalSampler')
+
+    def __init__(self, capacity=64, clock=time.monotonic):
+        self.capacity = capacity
+        self._clock = clock
+        self._times = array('d', [0.0] * capacity)
+        self._levels = array('b', [0] * capacity)
+        self._start = 0 # index of the oldest sample
+        self._count = 0
+        self._counts = [0] * SIGNAL_LEVELS # samples at each level
+        self._dwell = [0.0] * SIGNAL_LEVELS # seconds spent at each level, up to the newest sample
+        self._sum = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def __len__(self):
+        return self._count
+
+    def add(self, strength, when=None):
+        """ Records a sample; the oldest is dropped once the buffer is full
+
+        Readings outside 0-5 (e.g. -1 for unknown) are ignored.
+        """
+        if strength < 0 or strength >= SIGNAL_LEVELS:
+            return
+        if when == None:
+            when = self._clock()
+        with self._lock:
+            if self._count == self.capacity:
+                # Evict the oldest sample, and the time it held for
+                oldest = self._start
+                nextIdx = (oldest + 1) % self.capacity
+                level = self._levels[oldest]
+                self._counts[level] -= 1
+                self._sum -= level
+                if self._count > 1:
+                    self._dwell[level] -= self._times[nextIdx] - self._times[oldest]
+                self._start = nextIdx
+                self._count -= 1
+            if self._count > 0:
+                newest = (self._start + self._count - 1) % self.capacity
+                self._dwell[self._levels[newest]] += when - self._times[newest]
+            idx = (self._start + self._count) % self.capacity
+            self._times[idx] = when
+            self._levels[idx] = strength
+            self._counts[strength] += 1
+            self._sum += strength
+            self._count += 1
+
+    def samples(self):
+        """ @return: a list of (time, strength) samples, oldest first """
+        with self._lock:
+            return [(self._times[(self._start + i) % self.capacity], self._levels[(self._start + i) % self.capacity])
+                    for i in range(self._count)]
+
+    @property
+    def latest(self):
+        """ @return: the newest sample's signal strength, or None if there are none """
+        with self._lock:
+            if self._count == 0:
+                return None
+            return self._levels[(self._start + self._count - 1) % self.capacity]
+
+    @property
+    def mean(self):
+        """ @return: the mean signal strength over the window, or None if there are no samples """
+        with self._lock:
+            return self._sum / float(self._count) if self._count > 0 else None
+
+    @property
+    def minimum(self):
+        with self._lock:
+            for level in range(SIGNAL_LEVELS):
+                if self._counts[level] > 0:
+                    return level
+        return None
+
+    @property
+    def maximum(self):
+        with self._lock:
+            for level in range(SIGNAL_LEVELS - 1, -1, -1):
+                if self._counts[level] > 0:
+                    return level
+        return None
+
+    def percentile(self, fraction):
+        """ @return: the lowest level that at least fraction (0-1) of the samples are at or below """
+        with self._lock:
+            if self._count == 0:
+                return None
+            wanted = max(1, fraction * self._count)
+            total = 0
+            for level in range(SIGNAL_LEVELS):
+                total += self._counts[level]
+                if total >= wanted:
+                    return level
+        return SIGNAL_LEVELS - 1
+
+    def timeAbove(self, threshold, now=None):
+        """ @return: seconds within the window that the signal was at or above threshold """
+        with self._lock:
+            if self._count == 0:
+                return 0.0
+            total = sum(self._dwell[max(0, threshold):])
+            newest = (self._start + self._count - 1) % self.capacity
+            if self._levels[newest] >= threshold:
+                total += (self._clock() if now == None else now) - self._times[newest]
+            return total
+
+    def fractionAbove(self, threshold, now=None):
+        """ @return: the fraction (0-1) of the window that the signal was at or above threshold """
+        with self._lock:
+            if self._count == 0:
+                return 0.0
+            span = (self._clock() if now == None else now) - self._times[self._start]
+        if span <= 0:
+            return 1.0 if self.latest >= threshold else 0.0
+        return self.timeAbove(threshold, now) / span
+
+    def sample(self, modem):
+        """ Reads the signal strength from a modem (AT+CSQF) and records it
+
+        @return: the signal strength read
+        """
+        strength = modem.signalStrengthFast
+        self.add(strength)
+        return strength
+
+    def start(self, modem, interval=5):
+        """ Samples a modem every interval seconds from a background thread """
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(modem, interval))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """ Stops background sampling """
+        self._stop.set()
+        if self._thread != None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self, modem, interval):
+        while not self._stop.is_set():
+            try:
+                self.sample(modem)
+            except Exception as e:
+                self.log.debug('signal sample failed: %s', e)
+            self._stop.wait(interval)
@@ -0,0 +1,176 @@
+""" Durable outbound queue packing small records into SBD messages
+
+Applications that produce many small records (a few tens of bytes each)
+waste most of every session if each record goes in its own SBD message.
+SBDRecordQueue stores records in SQLite until they are delivered, packs as
+many as fit into each mobile originated message, and only asks for a
+session once a message is full or the oldest record has waited long enough.
+
+Each record in a message is preceded by its length as a varint (one byte
+for records under 128 bytes); unpackRecords() reverses this at the
+receiving end.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+
+from iridiummodem.encoding import encodeVarint, decodeVarint, varintLength
+from iridiummodem.modem import SBDBinaryMessage, SBD_DEFAULT_MAX_MO_LENGTH
+
+
+def packRecords(records):
+    """ @return: a bytearray holding each record preceded by its length """
+    data = bytearray()
+    for record in records:
+        encodeVarint(len(record), data)
+        data.extend(record)
+    return data
+
+
+def unpackRecords(data):
+    """ @return: the list of records packed into an SBD message by packRecords()
+
+    @raise ValueError: if the data is not a valid sequence of records
+    """
+    records = []
+    pos = 0
+    while pos < len(data):
+        length, pos = decodeVarint(data, pos)
+        if pos + length > len(data):
+            raise ValueError('truncated record')
+        records.append(bytes(data[pos:pos + length]))
+        pos += length
+    return records
+
+
+class SBDRecordQueue(object):
+    """ Persistent queue of application records waiting to go out over SBD
+
+    Records are kept until the session carrying them succeeds, so a crash
+    or failed session means they are sent again (at least once delivery).
+    """
+    log = logging.getLogger('iridiummodem.sbdqueue.SBDRecordQueue')
+
+    def __init__(self, path=':memory:', maxPayload=SBD_DEFAULT_MAX_MO_LENGTH, maxLatency=600, clock=time.time):
+        """
+        @param path: SQLite database file (the default keeps the queue in memory only)
+        @param maxPayload: largest SBD message to build (see IridiumModem.maxMOLength; less
+                           compression.HEADER_LENGTH if the modem has payloadCodecs)
+        @param maxLatency: seconds a record may wait for the message it goes in to fill up
+        """
+        self.maxPayload = maxPayload
+        self.maxLatency = maxLatency
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute('CREATE TABLE IF NOT EXISTS records (id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                             'created REAL NOT NULL, data BLOB NOT NULL, inflight INTEGER NOT NULL DEFAULT 0)')
+            # Anything that was being sent when the queue was last closed goes out again
+            self._db.execute('UPDATE records SET inflight = 0')
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def put(self, record):
+        """ Adds a record to the queue
+
+        @raise ValueError: if the record cannot fit in an SBD message on its own
+        """
+        record = bytes(record)
+        if len(record) + varintLength(len(record)) > self.maxPayload:
+            raise ValueError('record of {0} bytes does not fit in a {1} byte SBD message'.format(len(record), self.maxPayload))
+        with self._lock, self._db:
+            self._db.execute('INSERT INTO records (created, data) VALUES (?, ?)', (self._clock(), record))
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM records').fetchone()[0]
+
+    @property
+    def pendingBytes(self):
+        """ @return: the size of the packed records not already being sent """
+        with self._lock:
+            lengths = self._db.execute('SELECT LENGTH(data) FROM records WHERE inflight = 0').fetchall()
+        return sum(length + varintLength(length) for (length,) in lengths)
+
+    @property
+    def payloadReady(self):
+        """ @return: True if the pending records fill a message, or the oldest has waited maxLatency """
+        with self._lock:
+            oldest = self._db.execute('SELECT MIN(created) FROM records WHERE inflight = 0').fetchone()[0]
+        if oldest == None:
+            return False
+        return self._clock() - oldest >= self.maxLatency or self.pendingBytes >= self.maxPayload
+
+    def nextPayload(self):
+        """ Packs the oldest pending records into an SBD message
+
+        Records are taken in order, skipping any that would overflow the
+        message so that a later, smaller one can use the space. They stay
+        queued until acknowledge() (or release()) is called with the message.
+
+        @return: an SBDBinaryMessage, or None if nothing is pending
+        """
+        with self._lock:
+            rows = self._db.execute('SELECT id, data FROM records WHERE inflight = 0 ORDER BY id').fetchall()
+            ids = []
+            records = []
+            space = self.maxPayload
+            for rowId, data in rows:
+                size = len(data) + varintLength(len(data))
+                if size <= space:
+                    ids.append(rowId)
+                    records.append(data)
+                    space -= size
+                    if space == 0:
+                        break
+            if len(ids) == 0:
+                return None
+            with self._db:
+                self._db.executemany('UPDATE records SET inflight = 1 WHERE id = ?', [(rowId,) for rowId in ids])
+        msg = SBDBinaryMessage(data=packRecords(records))
+        msg.recordIds = ids
+        return msg
+
+    def acknowledge(self, msg):
+        """ Removes the records carried by a successfully sent message """
+        with self._lock, self._db:
+            self._db.executemany('DELETE FROM records WHERE id = ?', [(rowId,) for rowId in msg.recordIds])
+
+    def release(self, msg):
+        """ Returns the records of a message that could not be sent to the queue """
+        with self._lock, self._db:
+            self._db.executemany('UPDATE records SET inflight = 0 WHERE id = ?', [(rowId,) for rowId in msg.recordIds])
+
+    def flush(self, modem, scheduler=None, force=False):
+        """ Sends messages through a modem for as long as payloads are ready
+
+        @param scheduler: SBDSessionScheduler to run the sessions, if not initiated directly
+        @param force: send whatever is pending even if payloadReady is False
+        @return: the number of messages sent
+        """
+        sent = 0
+        while force or self.payloadReady:
+            msg = self.nextPayload()
+            if msg is None:
+                break
+            try:
+                modem.writeSBDMessageToIsu(msg)
+                if scheduler != None:
+                    status = scheduler.runSession()
+                else:
+                    status = modem.initiateSBDSession
+            except:
+                self.release(msg)
+                raise
+            if status.lastOutboundTransferStatus > 4:
+                self.log.debug('SBD session failed with status %d; records kept', status.lastOutboundTransferStatus)
+                self.release(msg)
+                break
+            self.acknowledge(msg)
+            sent += 1
+        return sent
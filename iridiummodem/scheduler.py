@@ -0,0 +1,225 @@
+""" Scheduling of SBD sessions around signal strength and failures
+
+Every AT+SBDIX costs airtime whether or not it gets through, and the
+Iridium ISU AT command reference gives each failure code a meaning: some
+failures call for a better signal, some for a short wait, and 36 for a
+fixed three minutes. SBDSessionScheduler keeps track of recent signal
+readings and session outcomes, holds sessions back while they are unlikely
+to succeed, and retries with jittered exponential backoff chosen by the
+class of the last failure.
+"""
+
+import logging
+import random
+import time
+from collections import deque
+
+from gsmmodem.exceptions import CommandError, TimeoutException
+
+
+# Classes of +SBDIX MO status codes
+SUCCESS = 'success'
+RADIO = 'radio' # link dropped or no service: wait for a better signal
+BUSY = 'busy' # the ISU is busy with something else
+GATEWAY = 'gateway' # the gateway did not accept the session
+TRY_LATER = 'try-later' # must wait 3 minutes since the last registration
+FATAL = 'fatal' # retrying will not help
+
+STATUS_CLASSES = {
+    10: GATEWAY, # GSS reported that the call did not complete in the allowed time
+    11: GATEWAY, # MO message queue at the GSS is full
+    12: FATAL, # MO message has too many segments
+    13: RADIO, # GSS reported that the session did not complete
+    14: FATAL, # invalid segment size
+    15: FATAL, # access is denied
+    16: FATAL, # ISU has been locked and may not make SBD calls
+    17: RADIO, # gateway not responding (local session timeout)
+    18: RADIO, # connection lost (RF drop)
+    19: RADIO, # link failure (a protocol error caused termination of the call)
+    32: RADIO, # no network service, unable to initiate call
+    33: FATAL, # antenna fault
+    34: FATAL, # radio is disabled
+    35: BUSY, # ISU is busy, unable to initiate call
+    36: TRY_LATER, # try later, must wait 3 minutes since last registration
+    37: GATEWAY, # SBD service is temporarily disabled
+    38: GATEWAY, # try later, traffic management period
+}
+
+
+def statusClass(moStatus):
+    """ @return: the class (e.g. RADIO) of an MO status code from +SBDIX or +SBDI """
+    if 0 <= moStatus <= 4:
+        return SUCCESS
+    return STATUS_CLASSES.get(moStatus, GATEWAY)
+
+
+class SBDSessionError(CommandError):
+    """ Raised when an SBD session fails in a way that retrying will not fix
+
+    @ivar status: the SBDTransferStatus of the failed session
+    """
+
+    def __init__(self, status):
+        super(SBDSessionError, self).__init__('AT+SBDIX', 'SBD', status.lastOutboundTransferStatus)
+        self.status = status
+
+
+class Backoff(object):
+    """ Retry delays for one class of failure (in seconds)
+
+    The n-th successive failure waits base * 2**(n-1), capped at maximum,
+    scaled by a random factor between 1 - jitter and 1 so that modems that
+    failed together do not all retry together.
+    """
+    def __init__(self, base, maximum, jitter=0.5):
+        self.base = base
+        self.maximum = maximum
+        self.jitter = jitter
+
+    def delay(self, failures, rand=random.random):
+        delay = min(self.maximum, self.base * 2 ** max(0, failures - 1))
+        return delay * (1 - self.jitter * rand())
+
+
+class SBDSessionScheduler(object):
+    """ Decides when an SBD session is worth attempting
+
+    Feed it signal readings with recordSignal() and session results with
+    recordOutcome(), or let runSession() do both while it sends the message
+    already written to the modem's MO buffer.
+    """
+    log = logging.getLogger('iridiummodem.scheduler.SBDSessionScheduler')
+
+    BACKOFF = {
+        RADIO: Backoff(10, 300),
+        BUSY: Backoff(5, 60),
+        GATEWAY: Backoff(60, 900),
+        TRY_LATER: Backoff(180, 180, jitter=0), # a floor, not a guess
+    }
+    # Chance of a session getting through at each signal strength, before any have been seen
+    PRIOR_SUCCESS = [0.02, 0.2, 0.5, 0.7, 0.85, 0.9]
+    # Weight given to the latest outcome when updating the success estimates
+    SUCCESS_WEIGHT = 0.2
+
+    def __init__(self, modem=None, minSignal=2, signalMaxAge=30, signalPollInterval=10, sessionDuration=20,
+                 sampleWindow=16, clock=time.monotonic, sleep=time.sleep, rand=random.random):
+        """
+        @param modem: the IridiumModem used by runSession()
+        @param minSignal: weakest signal (0-5) at which a session is attempted
+        @param signalMaxAge: seconds after which a signal reading is too old to act on
+        @param signalPollInterval: seconds between signal readings while waiting for coverage
+        @param sessionDuration: typical seconds taken by AT+SBDIX, used for estimates
+        """
+        self.modem = modem
+        self.minSignal = minSignal
+        self.signalMaxAge = signalMaxAge
+        self.signalPollInterval = signalPollInterval
+        self.sessionDuration = sessionDuration
+        self._clock = clock
+        self._sleep = sleep
+        self._rand = rand
+        self._signals = deque(maxlen=sampleWindow) # (time, strength)
+        self._successRates = list(self.PRIOR_SUCCESS)
+        self._failures = 0 # successive failures
+        self._lastClass = None
+        self._notBefore = 0 # earliest time for the next session
+
+    def recordSignal(self, strength, when=None):
+        """ Records a signal strength reading (0-5, or -1 if unknown) """
+        self._signals.append((self._clock() if when == None else when, strength))
+
+    @property
+    def signal(self):
+        """ @return: the latest signal reading if it is recent enough to act on, otherwise None """
+        if len(self._signals) == 0:
+            return None
+        when, strength = self._signals[-1]
+        if self._clock() - when > self.signalMaxAge or strength < 0:
+            return None
+        return strength
+
+    def recordOutcome(self, status):
+        """ Records the SBDTransferStatus of a session and schedules the next one
+
+        @return: the class of the outcome (e.g. SUCCESS or RADIO)
+        """
+        outcome = statusClass(status.lastOutboundTransferStatus)
+        signal = self.signal
+        if signal != None and outcome != BUSY:
+            success = 1.0 if outcome == SUCCESS else 0.0
+            signal = min(signal, len(self._successRates) - 1)
+            self._successRates[signal] += self.SUCCESS_WEIGHT * (success - self._successRates[signal])
+        if outcome == SUCCESS:
+            self._failures = 0
+            self._notBefore = 0
+        elif outcome != FATAL:
+            self._failures = self._failures + 1 if outcome == self._lastClass else 1
+            delay = self.BACKOFF[outcome].delay(self._failures, self._rand)
+            self._notBefore = self._clock() + delay
+            self.log.debug('SBD session failed with status %d (%s); next attempt in %.0fs',
+                           status.lastOutboundTransferStatus, outcome, delay)
+        self._lastClass = outcome
+        return outcome
+
+    @property
+    def backoffRemaining(self):
+        """ @return: seconds until the backoff from the last failure runs out """
+        return max(0, self._notBefore - self._clock())
+
+    @property
+    def readyToSend(self):
+        """ @return: True if a session may be attempted now, going by the latest signal reading """
+        signal = self.signal
+        return self.backoffRemaining == 0 and signal != None and signal >= self.minSignal
+
+    def successProbability(self, signal=None):
+        """ @return: the estimated chance of a session getting through at a signal strength
+        (the latest reading by default)
+        """
+        if signal == None:
+            signal = self.signal
+        if signal == None or signal < 0:
+            return self._successRates[self.minSignal]
+        return self._successRates[min(signal, len(self._successRates) - 1)]
+
+    def expectedTimeToSend(self):
+        """ @return: estimated seconds until the message gets through, if sessions are attempted
+        whenever allowed
+        """
+        p = max(0.01, self.successProbability(max(self.minSignal, self.signal or 0)))
+        attempts = 1 / p
+        retryDelay = self.BACKOFF[RADIO].delay(1, lambda: 0.5)
+        wait = self.backoffRemaining
+        if not self.readyToSend and wait == 0:
+            wait = self.signalPollInterval
+        return wait + attempts * self.sessionDuration + (attempts - 1) * retryDelay
+
+    def runSession(self, timeout=None):
+        """ Sends the message in the modem's MO buffer, waiting for signal and retrying as needed
+
+        @param timeout: seconds to keep trying, or None to keep going until it is sent
+        @raise SBDSessionError: if a session fails in a way that retrying will not fix
+        @raise TimeoutException: if the message was not sent within timeout
+        @return: the SBDTransferStatus of the successful session
+        """
+        deadline = None if timeout == None else self._clock() + timeout
+        poll = False # whether the signal must be read again before the next session
+        while True:
+            wait = self.backoffRemaining
+            if wait == 0:
+                if poll or self.signal == None:
+                    self.recordSignal(self.modem.signalStrength)
+                if self.readyToSend:
+                    status = self.modem.initiateSBDSession
+                    outcome = self.recordOutcome(status)
+                    if outcome == SUCCESS:
+                        return status
+                    elif outcome == FATAL:
+                        raise SBDSessionError(status)
+                    poll = True
+                    continue
+                wait = self.signalPollInterval
+            if deadline != None and self._clock() + wait > deadline:
+                raise TimeoutException()
+            self._sleep(wait)
+            poll = True
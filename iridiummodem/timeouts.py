@@ -0,0 +1,146 @@
+""" Per-command timeouts for AT commands sent to Iridium modems
+
+Iridium units answer most commands within a fraction of a second, but a few
+(signal strength, SBD sessions, registration) legitimately take minutes. A
+single timeout floor for everything means a lost response to a trivial
+command stalls the caller for as long as an SBD session would; the policy
+here gives each command its own budget and learns from observed latencies.
+"""
+
+import math
+import re
+import threading
+from collections import deque
+
+# Timeout for commands that are not in the table and for raw data writes
+DEFAULT_TIMEOUT = 30
+
+# Splits an AT command line into its verb: AT+SBDWB=10 -> +SBDWB, ATZ -> Z, AT&K3 -> &K
+VERB_REGEX = re.compile(r'^AT([+\-&*%$^][A-Z]+|[A-Z]?)', re.IGNORECASE)
+
+
+def commandVerb(data):
+    """ @return: the verb of an AT command line (e.g. '+CSQ' for 'AT+CSQ'), '' for a bare 'AT',
+    or None if data is not an AT command (e.g. SBD message data)
+    """
+    if not isinstance(data, str):
+        return None
+    match = VERB_REGEX.match(data)
+    if match:
+        return match.group(1).upper()
+    return None
+
+
+class CommandTimeout(object):
+    """ Timeout settings for one AT command verb (all values in seconds)
+
+    initial is used until enough responses have been seen; learned values are
+    kept between minimum and maximum. A fixed timeout is never learned.
+    """
+    def __init__(self, initial, minimum=None, maximum=None, fixed=False):
+        self.initial = initial
+        self.minimum = minimum if minimum != None else initial
+        self.maximum = maximum if maximum != None else initial
+        self.fixed = fixed
+
+
+class CommandTimeoutPolicy(object):
+    """ Chooses the timeout for each AT command from its verb and the modem model
+
+    Until minSamples responses have been seen for a command on a given model,
+    the table entry's initial timeout is used. After that the timeout is the
+    given percentile of the recent response times, multiplied by factor and
+    with margin seconds added, kept within the entry's minimum and maximum.
+    Commands that time out are recorded at the timeout they were given, so a
+    table that has learned too tight a value loosens again.
+
+    Entries set with setTimeout() override everything else for that command.
+    """
+
+    # Long-running commands keep their full budgets; everything else may learn down
+    DEFAULT_TABLE = {
+        '': CommandTimeout(5, 1, 10),
+        'Z': CommandTimeout(10, 2, 30),
+        '+CSQ': CommandTimeout(60, fixed=True),
+        '+SBDI': CommandTimeout(300, fixed=True),
+        '+SBDIX': CommandTimeout(300, fixed=True),
+        '+SBDIXA': CommandTimeout(300, fixed=True),
+        '+SBDREG': CommandTimeout(300, fixed=True),
+    }
+    # Used for verbs that are not in the table
+    DEFAULT_ENTRY = CommandTimeout(DEFAULT_TIMEOUT, 2, 60)
+
+    def __init__(self, percentile=0.95, factor=2.0, margin=1.0, minSamples=5, windowSize=32):
+        self.percentile = percentile
+        self.factor = factor
+        self.margin = margin
+        self.minSamples = minSamples
+        self.windowSize = windowSize
+        self._overrides = {} # (model, verb): seconds
+        self._samples = {} # (model, verb): deque of response times
+        self._learned = {} # (model, verb): seconds
+        self._lock = threading.Lock()
+
+    def timeoutFor(self, data, model=None):
+        """ @return: the timeout (in seconds) to use when sending data to a modem of the given model """
+        verb = commandVerb(data)
+        if verb == None:
+            return DEFAULT_TIMEOUT
+        with self._lock:
+            for key in ((model, verb), (None, verb)):
+                if key in self._overrides:
+                    return self._overrides[key]
+            if (model, verb) in self._learned:
+                return self._learned[(model, verb)]
+            return self.DEFAULT_TABLE.get(verb, self.DEFAULT_ENTRY).initial
+
+    def record(self, data, elapsed, model=None):
+        """ Records the time taken (in seconds) for the modem to respond to data """
+        verb = commandVerb(data)
+        if verb == None:
+            return
+        entry = self.DEFAULT_TABLE.get(verb, self.DEFAULT_ENTRY)
+        if entry.fixed:
+            return
+        key = (model, verb)
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples == None:
+                samples = self._samples[key] = deque(maxlen=self.windowSize)
+            samples.append(elapsed)
+            if len(samples) >= self.minSamples:
+                ordered = sorted(samples)
+                observed = ordered[max(0, int(math.ceil(self.percentile * len(ordered))) - 1)]
+                timeout = observed * self.factor + self.margin
+                self._learned[key] = min(entry.maximum, max(entry.minimum, timeout))
+
+    def recordTimeout(self, data, timeout, model=None):
+        """ Records that the modem did not respond to data within timeout seconds """
+        self.record(data, timeout, model)
+
+    def setTimeout(self, verb, timeout, model=None):
+        """ Fixes the timeout for a command verb (e.g. '+CSQ'), optionally for one model only
+
+        @param timeout: timeout in seconds, or None to remove a previous override
+        """
+        key = (model, verb.upper())
+        with self._lock:
+            if timeout == None:
+                self._overrides.pop(key, None)
+            else:
+                self._overrides[key] = timeout
+
+    def samples(self, verb, model=None):
+        """ @return: the recent response times recorded for a command verb """
+        with self._lock:
+            return list(self._samples.get((model, verb.upper()), ()))
+
+    def table(self):
+        """ @return: a dict of (model, verb) to the timeout currently in use, where a model
+        of None applies to all models
+        """
+        with self._lock:
+            result = dict(((None, verb), entry.initial) for verb, entry in self.DEFAULT_TABLE.items())
+            result.update(self._learned)
+            result.update(self._overrides)
+            return result
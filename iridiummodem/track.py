@@ -0,0 +1,221 @@
+""" Compression of position tracks for SBD messages
+
+A tracker sending a fix every minute spends most of its payload on points
+that lie on a straight line between their neighbours. TrackCompressor
+buffers fixes (from gpsFix or geoLocation), drops every point that
+can be interpolated from the ones kept to within an error bound, and packs
+the rest into a binary block for an SBDBinaryMessage.
+
+Points are (latitude, longitude, time) tuples, with the time in seconds
+since the Unix epoch. A packed track is:
+    - one byte: the number of decimal places the coordinates are kept to
+    - the first point: its time as a varint, then its latitude and
+      longitude (in units of the last decimal place) as zigzag varints
+    - each following point: the seconds since the point before as a varint,
+      and its latitude and longitude less those of the point before as
+      zigzag varints
+A point a minute or so from the last one, within a few hundred metres of
+it, takes four or five bytes.
+"""
+
+import time
+from datetime import datetime
+
+from iridiummodem.encoding import encodeVarint, decodeVarint, encodeSignedVarint, decodeSignedVarint
+from iridiummodem.geo import surfaceDistance
+from iridiummodem.modem import SBDBinaryMessage, SBD_DEFAULT_MAX_MO_LENGTH
+
+# Decimal places kept by default; 5 is about a metre
+DEFAULT_PLACES = 5
+
+
+def _interpolationError(start, end, point):
+    """ @return: the distance in metres between point and where it would be put by interpolating start-end at its time """
+    span = end[2] - start[2]
+    fraction = (point[2] - start[2]) / span if span > 0 else 0.0
+    lat = start[0] + (end[0] - start[0]) * fraction
+    lon = start[1] + (end[1] - start[1]) * fraction
+    return surfaceDistance(lat, lon, point[0], point[1])
+
+
+def simplifyTrack(points, tolerance):
+    """ Douglas-Peucker line simplification, measured at each point's time
+
+    Each dropped point is within tolerance metres of where interpolating
+    between the points kept either side of it, by time, puts it; so stops
+    and changes of speed are kept as well as turns.
+
+    @param points: (latitude, longitude, time) tuples in time order
+    @return: the list of points kept, including the first and last
+    """
+    points = list(points)
+    if len(points) < 3:
+        return points
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    spans = [(0, len(points) - 1)]
+    while len(spans) > 0:
+        first, last = spans.pop()
+        worst = tolerance
+        worstIdx = None
+        for i in range(first + 1, last):
+            error = _interpolationError(points[first], points[last], points[i])
+            if error > worst:
+                worst = error
+                worstIdx = i
+        if worstIdx != None:
+            keep[worstIdx] = True
+            spans.append((first, worstIdx))
+            spans.append((worstIdx, last))
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+def _quantise(point, scale):
+    return int(round(point[2])), int(round(point[0] * scale)), int(round(point[1] * scale))
+
+
+def _appendPoint(out, point, previous):
+    if previous == None:
+        encodeVarint(point[0], out)
+        encodeSignedVarint(point[1], out)
+        encodeSignedVarint(point[2], out)
+    else:
+        if point[0] < previous[0]:
+            raise ValueError('track points are not in time order')
+        encodeVarint(point[0] - previous[0], out)
+        encodeSignedVarint(point[1] - previous[1], out)
+        encodeSignedVarint(point[2] - previous[2], out)
+    return out
+
+
+def encodeTrack(points, places=DEFAULT_PLACES):
+    """ @return: a bytearray holding the (latitude, longitude, time) points in time order
+
+    @raise ValueError: if the points are not in time order
+    """
+    scale = 10 ** places
+    out = bytearray([places])
+    previous = None
+    for point in points:
+        current = _quantise(point, scale)
+        _appendPoint(out, current, previous)
+        previous = current
+    return out
+
+
+def decodeTrack(data):
+    """ @return: the list of (latitude, longitude, time) points packed by encodeTrack()
+
+    @raise ValueError: if the data is not a valid track
+    """
+    if len(data) == 0:
+        raise ValueError('empty track')
+    scale = 10 ** data[0]
+    points = []
+    pos = 1
+    when = lat = lon = 0
+    while pos < len(data):
+        value, pos = decodeVarint(data, pos)
+        dlat, pos = decodeSignedVarint(data, pos)
+        dlon, pos = decodeSignedVarint(data, pos)
+        when += value
+        lat += dlat
+        lon += dlon
+        points.append((lat / float(scale), lon / float(scale), when))
+    return points
+
+
+class TrackCompressor(object):
+    """ Buffers fixes and packs them, simplified, into SBD messages
+
+    Each packed block stands alone: it starts with an absolute fix, so a
+    lost message loses only its own points.
+    """
+
+    def __init__(self, tolerance=25, places=DEFAULT_PLACES, maxPayload=SBD_DEFAULT_MAX_MO_LENGTH, clock=time.time):
+        """
+        @param tolerance: how far (in metres) a dropped point may be from the simplified track
+        @param places: decimal places to keep the coordinates to
+        @param maxPayload: largest block to pack (see IridiumModem.maxMOLength; less
+                           compression.HEADER_LENGTH if the modem has payloadCodecs)
+        """
+        self.tolerance = tolerance
+        self.places = places
+        self.maxPayload = maxPayload
+        self._clock = clock
+        self._points = []
+
+    def __len__(self):
+        return len(self._points)
+
+    def add(self, latitude, longitude, when=None):
+        """ Buffers a fix
+
+        @param when: time of the fix as a datetime or seconds since the epoch (default: now)
+        """
+        if when == None:
+            when = self._clock()
+        elif isinstance(when, datetime):
+            when = when.timestamp()
+        self._points.append((latitude, longitude, when))
+
+    def addLocation(self, location):
+        """ Buffers the result of IridiumModem.gpsLocation ([lat, lon]) or geoLocation ([lat, lon, time]) """
+        self.add(*location)
+
+    def sample(self, modem, useGps=False):
+        """ Reads and buffers the modem's position, from the GPS receiver if useGps, otherwise AT-MSGEO
+
+        A GPS reading without a valid fix (whose position is stale or 0, 0) is
+        not buffered. GPS fixes are timed by when the receiver was read.
+        @return: the location read, or None if the GPS receiver has no fix
+        """
+        if not useGps:
+            location = modem.geoLocation
+            self.addLocation(location)
+            return location
+        fix = modem.gpsFix
+        if not fix.valid:
+            return None
+        when = None
+        if fix.when != None:
+            # GpsFix.when is a monotonic clock time
+            when = self._clock() - (time.monotonic() - fix.when)
+        self.add(fix.latitude, fix.longitude, when)
+        return [fix.latitude, fix.longitude]
+
+    def simplified(self):
+        """ @return: the buffered points that simplification keeps """
+        return simplifyTrack(sorted(self._points, key=lambda point: point[2]), self.tolerance)
+
+    def pack(self):
+        """ Packs as many of the simplified points as fit into maxPayload bytes, and removes them from the buffer
+
+        Points that did not fit stay buffered for the next block.
+        @return: the packed bytearray, or None if no points are buffered
+        """
+        points = self.simplified()
+        if len(points) == 0:
+            return None
+        scale = 10 ** self.places
+        out = bytearray([self.places])
+        previous = None
+        packed = 0
+        for point in points:
+            current = _quantise(point, scale)
+            length = len(out)
+            _appendPoint(out, current, previous)
+            if len(out) > self.maxPayload:
+                del out[length:]
+                break
+            previous = current
+            packed += 1
+        if packed == 0:
+            raise ValueError('maxPayload too small for a track point')
+        self._points = points[packed:]
+        return out
+
+    def message(self):
+        """ @return: an SBDBinaryMessage of pack(), or None if no points are buffered """
+        data = self.pack()
+        return SBDBinaryMessage(data=data) if data != None else None
@@ -123,6 +123,7 @@ setup(
     extras_require={
         'dev': ['check-manifest'],
         'test': ['coverage'],
+        'numpy': ['numpy'],
     },
     cmdclass = {'test': RunUnitTests,
                 'coverage': RunUnitTestsCoverage}
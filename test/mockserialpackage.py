@@ -68,7 +68,7 @@ class MockSerialPackage(object):
             
             if timeout != None:
                 time.sleep(0.001)
-                return ''
+                return b''
             else:
                 while self._alive:
                     if len(self.writeQueue) > 0:
@@ -85,8 +85,11 @@ class MockSerialPackage(object):
                         time.sleep(value)                        
                         if len(self.responseSequence) > 0:                            
                             self._setupReadValue(command)                    
-                    else:                        
-                        self._readQueue = list(value)
+                    else:
+                        # Hand back single bytes, as pyserial does
+                        if type(value) == str:
+                            value = value.encode('iso-8859-1')
+                        self._readQueue = [value[i:i+1] for i in range(len(value))]
                 else:
                     self.responseSequence = self.modem.getResponse(command)
                     if len(self.responseSequence) > 0:
@@ -0,0 +1,46 @@
+""" Fake modem on a pseudo-terminal, for tests that need a real serial port """
+
+import os, threading, tty, select
+
+from test import fakeiridiummodems
+
+class PtyModem(object):
+    """ Answers AT commands written to the master end of a pseudo-terminal, from its own thread """
+
+    def __init__(self, responses=None):
+        self.responses = responses or {} # command: bytes to send back
+        self.modem = fakeiridiummodems.GenericTestModem() # answers everything else
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.master)
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self.commands = []
+        self.alive = True
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self.alive = False
+        self._thread.join()
+        os.close(self.master)
+        os.close(self.slave)
+
+    def send(self, data):
+        os.write(self.master, data)
+
+    def _run(self):
+        buf = bytearray()
+        while self.alive:
+            if len(select.select([self.master], [], [], 0.05)[0]) == 0:
+                continue
+            buf.extend(os.read(self.master, 4096))
+            while b'\r' in buf:
+                idx = buf.index(b'\r')
+                command = buf[:idx].decode(errors='replace')
+                del buf[:idx + 1]
+                self.commands.append(command)
+                if command in self.responses:
+                    self.send(self.responses[command])
+                else:
+                    self.send(''.join(['\r\n' + line for line in self.modem.getResponse(command + '\r')]).encode())
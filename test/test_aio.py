@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+
+""" Test suite for iridiummodem.aio """
+import sys, os, unittest, logging, asyncio, tty
+from datetime import datetime, timezone
+sys.path.append('..')
+
+from gsmmodem.exceptions import CommandError, TimeoutException
+
+from iridiummodem.aio import AsyncIridiumModem
+from iridiummodem.modem import SBDBinaryMessage, ISUSBDStatus, SBDTransferStatus
+
+class FakeModem(object):
+    """ Answers AT commands written to the master end of a pseudo-terminal """
+
+    def __init__(self, responses):
+        self.responses = responses # command: bytes to send back, or None to stay silent
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.master)
+        tty.setraw(self.slave)
+        os.set_blocking(self.master, False)
+        self.port = os.ttyname(self.slave)
+        self.commands = []
+        self.rawData = None # number of raw bytes expected after AT+SBDWB
+        self._buffer = bytearray()
+
+    def start(self):
+        asyncio.get_running_loop().add_reader(self.master, self._onReadable)
+
+    def stop(self):
+        asyncio.get_running_loop().remove_reader(self.master)
+        os.close(self.master)
+        os.close(self.slave)
+
+    def _onReadable(self):
+        try:
+            self._buffer.extend(os.read(self.master, 4096))
+        except OSError:
+            return
+        while True:
+            if self.rawData != None:
+                if len(self._buffer) < self.rawData:
+                    return
+                data = bytes(self._buffer[:self.rawData])
+                del self._buffer[:self.rawData]
+                self.rawData = None
+                self._received(data)
+            elif b'\r' in self._buffer:
+                idx = self._buffer.index(b'\r')
+                command = self._buffer[:idx].decode()
+                del self._buffer[:idx + 1]
+                if command.startswith('AT+SBDWB='):
+                    self.rawData = int(command[9:]) + 2
+                self._received(command)
+            else:
+                return
+
+    def _received(self, command):
+        self.commands.append(command)
+        response = self.responses.get(command, b'\r\nOK\r\n')
+        if response != None:
+            os.write(self.master, response)
+
+
+class TestAsyncIridiumModem(unittest.TestCase):
+    """ Tests the asyncio modem interface against a fake modem on a pseudo-terminal """
+
+    def run_modem(self, responses, test):
+        """ Connects an AsyncIridiumModem to a fake modem and runs the test coroutine """
+        async def main():
+            fake = FakeModem(responses)
+            fake.start()
+            try:
+                async with AsyncIridiumModem(fake.port) as modem:
+                    await test(modem, fake)
+            finally:
+                fake.stop()
+        asyncio.run(main())
+
+    def test_connect(self):
+        async def test(modem, fake):
+            self.assertEqual(['ATZ', 'ATE0', 'AT&K3', 'AT&D2', 'AT+CGMM'], fake.commands)
+            self.assertEqual('IRIDIUM 9600 Family SBD Transceiver', modem._modelName)
+        self.run_modem({'AT+CGMM': b'\r\nIRIDIUM 9600 Family SBD Transceiver\r\n\r\nOK\r\n'}, test)
+
+    def test_queries(self):
+        async def test(modem, fake):
+            self.assertEqual(4, await modem.signalStrength())
+            self.assertEqual(datetime(2020, 4, 8, 17, 25, 35, 530000, tzinfo=timezone.utc), await modem.systemTime())
+            with self.assertRaises(CommandError):
+                await modem.write('AT+BAD')
+        self.run_modem({'AT+CSQ': b'\r\n+CSQ:4\r\n\r\nOK\r\n',
+                        'AT-MSSTM': b'\r\n-MSSTM: 7b8bd31d\r\n\r\nOK\r\n',
+                        'AT+BAD': b'\r\nERROR\r\n'}, test)
+
+    def test_sbdWriteRead(self):
+        payload = bytearray(b'\x00\r\nOK\r\n\xff\xf0')
+        msg = SBDBinaryMessage(data=payload)
+        mtFrame = bytes([0, len(payload)]) + bytes(payload) + bytes(msg.generateChecksum)
+        responses = {'AT+SBDWB=' + str(len(payload)): b'READY\r\n',
+                     bytes(payload) + bytes(msg.generateChecksum): b'\r\n0\r\n\r\nOK\r\n',
+                     'AT+SBDS': b'\r\n+SBDS: 1, 5, 1, 7\r\n\r\nOK\r\n',
+                     'AT+SBDIX': b'\r\n+SBDIX: 0, 5, 1, 7, 10, 0\r\n\r\nOK\r\n',
+                     'AT+SBDRB': mtFrame + b'\r\nOK\r\n'}
+        async def test(modem, fake):
+            self.assertEqual(ISUSBDStatus(5, 7, True, True), await modem.writeSBDMessageToIsu(SBDBinaryMessage(data=payload)))
+            self.assertEqual(SBDTransferStatus(5, 7, False, True, 0, 0, 1), await modem.initiateSBDSession())
+            received = await modem.readSBDMessageFromIsu()
+            self.assertEqual(payload, bytes(received.data))
+            self.assertEqual(7, received.sequence)
+        self.run_modem(responses, test)
+
+    def test_timeout(self):
+        async def test(modem, fake):
+            with self.assertRaises(TimeoutException):
+                await modem.write('AT+SILENT', timeout=0.1)
+            # Nothing more is sent until the response to AT+SILENT ends...
+            with self.assertRaises(TimeoutException):
+                await modem.write('AT', timeout=0.1)
+            self.assertEqual(['AT+SILENT'], fake.commands[-1:])
+            # ...however late it is, and it is not taken for the next command's
+            os.write(fake.master, b'\r\n+SILENT:1\r\n')
+            await asyncio.sleep(0.05)
+            os.write(fake.master, b'\r\nOK\r\n')
+            self.assertEqual(['+CSQ:4', 'OK'], await modem.write('AT+CSQ', timeout=0.5))
+        self.run_modem({'AT+SILENT': None, 'AT+CSQ': b'\r\n+CSQ:4\r\n\r\nOK\r\n'}, test)
+
+    def test_cancelledCommandResponseDiscarded(self):
+        async def test(modem, fake):
+            task = asyncio.ensure_future(modem.write('AT+SLOW'))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            # The late response to AT+SLOW must not be returned for AT+CSQ
+            os.write(fake.master, b'\r\n+SLOW:1\r\n\r\nOK\r\n')
+            self.assertEqual(4, await modem.signalStrength())
+        self.run_modem({'AT+SLOW': None, 'AT+CSQ': b'\r\n+CSQ:4\r\n\r\nOK\r\n'}, test)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.DEBUG)
+    unittest.main()
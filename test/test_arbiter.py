@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+""" Test suite for iridiummodem.arbiter """
+import sys, unittest, threading, time
+sys.path.append('..')
+
+from iridiummodem.arbiter import CommandArbiter, CommandRejectedError, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
+
+
+class TestCommandArbiter(unittest.TestCase):
+    """ Tests queueing of requests for a shared modem """
+
+    def setUp(self):
+        self.arbiter = CommandArbiter()
+
+    def queue(self, name, order, **kwargs):
+        """ Starts a thread that claims the arbiter and records name in order once it has it """
+        def run():
+            try:
+                with self.arbiter.claim(label=name, **kwargs):
+                    order.append(name)
+            except CommandRejectedError:
+                order.append(name + ' rejected')
+        thread = threading.Thread(target=run)
+        thread.start()
+        return thread
+
+    def waitQueued(self, count):
+        end = time.monotonic() + 5
+        while self.arbiter.queued < count and time.monotonic() < end:
+            time.sleep(0.01)
+        self.assertEqual(count, self.arbiter.queued)
+
+    def test_priorities(self):
+        order = []
+        self.arbiter.acquire(expected=1)
+        threads = [self.queue('session', order, priority=PRIORITY_LOW)]
+        self.waitQueued(1)
+        threads.append(self.queue('status', order, priority=PRIORITY_NORMAL))
+        self.waitQueued(2)
+        threads.append(self.queue('urgent', order, priority=PRIORITY_HIGH))
+        self.waitQueued(3)
+        self.arbiter.release()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(['urgent', 'status', 'session'], order)
+        stats = self.arbiter.stats()
+        self.assertEqual(4, stats['granted'])
+        self.assertEqual(0, stats['queued'])
+        self.assertGreater(stats['maxWait'], 0)
+
+    def test_deadlines(self):
+        order = []
+        # A 300s session is in progress: a request that will only wait 5s is turned away at once
+        self.arbiter.acquire(expected=300, label='AT+SBDIX')
+        start = time.monotonic()
+        self.queue('status', order, priority=PRIORITY_HIGH, deadline=5).join()
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(['status rejected'], order)
+        self.arbiter.release()
+
+        # One that looked possible but did not get the modem in time gives up
+        self.arbiter.acquire(expected=0)
+        start = time.monotonic()
+        self.queue('late', order, deadline=0.1).join()
+        self.assertGreaterEqual(time.monotonic() - start, 0.1)
+        self.assertEqual(['status rejected', 'late rejected'], order)
+        self.assertEqual(0, self.arbiter.queued)
+        self.assertEqual(2, self.arbiter.rejected)
+        self.arbiter.release()
+
+    def test_reentrant(self):
+        with self.arbiter.claim(expected=10) as ticket:
+            with self.arbiter.claim(deadline=0) as inner:
+                self.assertIs(ticket, inner)
+            self.assertGreater(self.arbiter.estimatedWait(), 0)
+        self.assertEqual(0, self.arbiter.estimatedWait())
+        self.assertRaises(RuntimeError, self.arbiter.release)
+
+
+if __name__ == "__main__":
+    unittest.main()
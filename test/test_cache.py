@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+""" Test suite for iridiummodem.cache """
+import sys, time, unittest, threading
+sys.path.append('..')
+
+from iridiummodem.cache import PropertyCache, FOREVER
+
+
+class TestPropertyCache(unittest.TestCase):
+    """ Tests time to live and single-flight reads """
+
+    def setUp(self):
+        self.now = 0.0
+        self.cache = PropertyCache({'signalStrength': 5, 'imei': FOREVER}, clock=lambda: self.now)
+        self.reads = 0
+
+    def fetch(self):
+        self.reads += 1
+        return self.reads
+
+    def test_ttl(self):
+        self.assertEqual(1, self.cache.get('signalStrength', self.fetch))
+        self.now = 4.9
+        self.assertEqual(1, self.cache.get('signalStrength', self.fetch))
+        self.now = 5.0
+        self.assertEqual(2, self.cache.get('signalStrength', self.fetch))
+        self.now = 1e9
+        self.assertEqual(3, self.cache.get('imei', self.fetch))
+        self.assertEqual(3, self.cache.get('imei', self.fetch))
+        # Properties without a time to live are always read
+        self.assertEqual(4, self.cache.get('systemTime', self.fetch))
+        self.assertEqual(5, self.cache.get('systemTime', self.fetch))
+        self.cache.invalidate('imei')
+        self.assertEqual(6, self.cache.get('imei', self.fetch))
+        self.assertEqual({'hits': 2, 'misses': 4, 'coalesced': 0}, self.cache.stats())
+
+    def test_singleFlight(self):
+        started = threading.Event()
+        release = threading.Event()
+        def slowFetch():
+            started.set()
+            release.wait()
+            return self.fetch()
+        results = []
+        readers = [threading.Thread(target=lambda: results.append(self.cache.get('signalStrength', slowFetch)))]
+        readers[0].start()
+        started.wait()
+        for i in range(3):
+            readers.append(threading.Thread(target=lambda: results.append(self.cache.get('signalStrength', slowFetch))))
+            readers[-1].start()
+        while self.cache.stats()['coalesced'] < 3:
+            time.sleep(0.001)
+        release.set()
+        for reader in readers:
+            reader.join()
+        self.assertEqual([1, 1, 1, 1], results)
+        self.assertEqual({'hits': 0, 'misses': 1, 'coalesced': 3}, self.cache.stats())
+
+    def test_errors(self):
+        def failingFetch():
+            raise ValueError()
+        self.assertRaises(ValueError, self.cache.get, 'signalStrength', failingFetch)
+        self.assertEqual(1, self.cache.get('signalStrength', self.fetch))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+
+""" Test suite for iridiummodem.capabilities """
+import sys, os, unittest, logging, tempfile, shutil
+sys.path.append('..')
+
+import serial
+import gsmmodem.serial_comms
+from gsmmodem.exceptions import CommandError, InvalidStateException
+
+from iridiummodem.modem import IridiumModem
+from iridiummodem.capabilities import CapabilityStore, DeviceCapabilities, UNSUPPORTED_TTL
+from test.ptymodem import PtyModem
+
+IDENTITY = {'AT+CGSN': b'\r\n300234010753370\r\n\r\nOK\r\n',
+            'AT+CGMM': b'\r\nIRIDIUM 9600 Family SBD Transceiver\r\n\r\nOK\r\n',
+            'AT+CGMR': b'\r\nCall Processor Version: TA16005\r\n\r\nOK\r\n',
+            'AT+CSQF': b'\r\n+CSQF:4\r\n\r\nOK\r\n',
+            'AT+CMEE=1': b'\r\nERROR\r\n',
+            'AT+CIER?': b'\r\nERROR\r\n'}
+IDENTITY_MODEL = 'IRIDIUM 9600 Family SBD Transceiver'
+IDENTITY_REVISION = 'Call Processor Version: TA16005'
+
+
+class TestCapabilityStore(unittest.TestCase):
+    """ Tests the capability store and capability-cached connect """
+
+    def setUp(self):
+        # Other test modules replace pyserial with a mock
+        self._serialModule = gsmmodem.serial_comms.serial
+        gsmmodem.serial_comms.serial = serial
+        self.tmpDir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpDir, 'capabilities.json')
+
+    def tearDown(self):
+        gsmmodem.serial_comms.serial = self._serialModule
+        shutil.rmtree(self.tmpDir)
+
+    def test_persistence(self):
+        store = CapabilityStore(self.path)
+        self.assertIsNone(store.get('9602', 'TA1'))
+        caps = DeviceCapabilities('1', '9602', 'TA1')
+        caps.record('AT&K3', True, ['OK'], 0.01)
+        caps.record('AT+CSQ', True, ['+CSQ:5', 'OK'], 1.2345)
+        caps.record('AT+CIER?', False)
+        store.put(caps)
+        caps = CapabilityStore(self.path).get('9602', 'TA1')
+        self.assertTrue(caps.supports('AT&K3'))
+        self.assertFalse(caps.supports('AT+CIER?'))
+        self.assertIsNone(caps.supports('AT+CSQF'))
+        self.assertEqual(['+CSQ:#'], caps.commands['AT+CSQ'].shape)
+        self.assertEqual(1.234, caps.commands['AT+CSQ'].latency)
+        self.assertIsNone(caps.commands['AT+CIER?'].latency)
+        self.assertEqual(['&K', '+CSQ'], caps.supportedCommands())
+        # Another unit of the same model and firmware shares the entry
+        self.assertEqual('2', caps.forUnit('2').imei)
+        self.assertTrue(store.get('9602', 'TA1').forUnit('2').supports('AT&K3'))
+        self.assertIsNone(store.get('9602', 'TA2'))
+        # The store keeps its own copy, so probing one unit can't change what another thread is saving
+        caps = DeviceCapabilities('3', '9603', 'TA1')
+        store.put(caps)
+        caps.record('AT+CSQ', True, ['+CSQ:5', 'OK'])
+        store.get('9603', 'TA1').record('AT&K3', True, ['OK'])
+        self.assertEqual({}, store.get('9603', 'TA1').commands)
+
+    def test_unsupportedExpires(self):
+        now = [1000000.0]
+        caps = DeviceCapabilities('1', '9602', 'TA1', clock=lambda: now[0])
+        caps.record('AT+SBDMTA?', False, ['ERROR'])
+        caps.record('AT+CSQ', True, ['+CSQ:5', 'OK'])
+        self.assertFalse(caps.supports('AT+SBDMTA?'))
+        now[0] += UNSUPPORTED_TTL + 1
+        self.assertIsNone(caps.supports('AT+SBDMTA?'))
+        self.assertTrue(caps.supports('AT+CSQ'))
+        # Entries saved without a time are probed again
+        caps = DeviceCapabilities.fromDict({'model': '9602', 'commands': {'AT+CIER?': False}})
+        self.assertIsNone(caps.supports('AT+CIER?'))
+
+    def connect(self, store, commands=()):
+        """ Connects to a fake modem, then sends it commands, ignoring errors """
+        fake = PtyModem(IDENTITY)
+        modem = IridiumModem(fake.port)
+        modem.timeout = 0.1 # serial read timeout, so that close() returns quickly
+        modem.capabilityStore = store
+        modem.indicatorEvents = True
+        try:
+            modem.connect()
+            for command in commands:
+                try:
+                    modem.write(command)
+                except CommandError:
+                    pass
+        finally:
+            modem.close()
+            fake.stop()
+        return modem, fake.commands
+
+    def test_fastConnect(self):
+        modem, commands = self.connect(CapabilityStore(self.path))
+        self.assertEqual('IRIDIUM 9600 Family SBD Transceiver', modem._modelName)
+        self.assertIn('AT+CIER?', commands)
+        caps = modem.capabilities
+        self.assertEqual('300234010753370', caps.imei)
+        self.assertEqual({'AT&K3': True, 'AT&D2': True, 'AT+CMEE=1': False, 'AT+CSQF': True, 'AT+SBDMTA?': True, 'AT+CIER?': False},
+                         dict((command, support.supported) for command, support in caps.commands.items()))
+        self.assertEqual(['+CSQF:#'], caps.commands['AT+CSQF'].shape)
+
+        # Connecting again skips the probes and the unsupported commands; commands
+        # known to fail are still sent if asked for
+        modem, commands = self.connect(CapabilityStore(self.path), ['AT+CIER?', 'AT+CSQF'])
+        self.assertEqual(['ATZ', 'ATE0', 'AT+CGSN', 'AT+CGMM', 'AT+CGMR', 'AT&K3', 'AT&D2', 'AT+CIER?', 'AT+CSQF'], commands)
+        self.assertEqual(['&D', '&K', '+CSQF', '+SBDMTA'], modem.supportedCommands)
+
+    def test_probeCommands(self):
+        store = CapabilityStore(self.path)
+        responses = dict(IDENTITY)
+        del responses['AT+CMEE=1'] # needed by GsmModem.connect()
+        fake = PtyModem(responses)
+        modem = IridiumModem(fake.port)
+        modem.timeout = 0.1
+        try:
+            modem.connect()
+            self.assertRaises(InvalidStateException, getattr, modem, 'supportedCommands')
+            modem.capabilityStore = store
+            caps = modem.probeCommands(['AT+CGMI', 'AT+CIER?'])
+        finally:
+            modem.close()
+            fake.stop()
+        self.assertTrue(caps.supports('AT+CGMI'))
+        self.assertFalse(caps.supports('AT+CIER?'))
+        saved = CapabilityStore(self.path).get('IRIDIUM 9600 Family SBD Transceiver', 'Call Processor Version: TA16005')
+        self.assertFalse(saved.supports('AT+CIER?'))
+
+    def test_reconnectWithCapabilities(self):
+        # Known capabilities must not let GsmModem.connect() set up GSM features
+        responses = dict(IDENTITY)
+        del responses['AT+CMEE=1']
+        responses['AT+CMGF=0'] = b'\r\nERROR\r\n'
+        fake = PtyModem(responses)
+        modem = IridiumModem(fake.port)
+        modem.timeout = 0.1
+        try:
+            modem.connect()
+            modem.probeCommands(['AT+CIER?'])
+            modem.close()
+            modem.connect()
+        finally:
+            modem.close()
+            fake.stop()
+        self.assertNotIn('AT+CMGF=0', fake.commands)
+        self.assertEqual([], modem.supportedCommands)
+
+    def test_timeoutNotRecorded(self):
+        responses = dict(IDENTITY)
+        responses['AT+SBDMTA?'] = b'' # no answer
+        fake = PtyModem(responses)
+        modem = IridiumModem(fake.port)
+        modem.timeout = 0.1
+        modem.timeoutPolicy.setTimeout('+SBDMTA', 0.5)
+        modem.capabilityStore = CapabilityStore(self.path)
+        try:
+            modem.connect()
+        finally:
+            modem.close()
+            fake.stop()
+        self.assertIsNone(modem.capabilities.supports('AT+SBDMTA?'))
+        self.assertNotIn('AT+SBDMTA?', CapabilityStore(self.path).devices()[0].commands)
+
+    def test_failedInitReprobes(self):
+        store = CapabilityStore(self.path)
+        caps = DeviceCapabilities('1', IDENTITY_MODEL, IDENTITY_REVISION)
+        for command in IridiumModem.INIT_COMMANDS + IridiumModem.PROBE_COMMANDS:
+            caps.record(command, True, ['OK'])
+        store.put(caps)
+        # AT+CMEE=1 fails, though it is stored as supported
+        modem, commands = self.connect(store)
+        self.assertEqual(2, commands.count('AT+CMEE=1'))
+        self.assertIn('AT+SBDMTA?', commands)
+        self.assertFalse(CapabilityStore(self.path).get(IDENTITY_MODEL, IDENTITY_REVISION).supports('AT+CMEE=1'))
+        self.assertEqual('300234010753370', modem.capabilities.imei)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.DEBUG)
+    unittest.main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+""" Test suite for iridiummodem.clock """
+import sys, unittest
+sys.path.append('..')
+
+from datetime import datetime, timezone
+from gsmmodem.exceptions import CommandError
+
+from iridiummodem.modem import IridiumProtocol
+from iridiummodem.clock import IridiumClock, TICK
+
+
+class FakeModem(IridiumProtocol):
+    """ Answers AT-MSSTM with the given responses, taking roundTrip seconds """
+
+    def __init__(self, test, responses, roundTrip):
+        self.test = test
+        self.responses = responses
+        self.roundTrip = roundTrip
+        self.commands = 0
+
+    def write(self, command):
+        self.commands += 1
+        self.test.now += self.roundTrip
+        return self.responses.pop(0)
+
+
+class TestIridiumClock(unittest.TestCase):
+    """ Tests Iridium time extrapolated from AT-MSSTM readings """
+
+    def setUp(self):
+        self.now = 100.0
+
+    def test_extrapolation(self):
+        modem = FakeModem(self, [['-MSSTM: 7b8bd31d', 'OK']], 0.2)
+        clock = IridiumClock(modem, clock=lambda: self.now)
+        self.assertRaises(CommandError, clock.timestamp)
+        self.assertAlmostEqual(0.1 + TICK / 2, clock.sync(), places=4)
+        # 2020-04-08 17:25:35.530 plus half a tick, read 0.1s ago
+        self.now += 9.9
+        when, uncertainty = clock.now()
+        self.assertEqual(datetime(2020, 4, 8, 17, 25, 45, 575000, tzinfo=timezone.utc), when.replace(microsecond=round(when.microsecond, -3)))
+        self.assertAlmostEqual(0.1 + TICK / 2 + 10 * 50e-6, uncertainty)
+        self.assertEqual(int('7b8bd31d', 16) + int(10 / TICK), clock.iridiumTime())
+        self.assertAlmostEqual(when.timestamp() - 1000.0, clock.offset(lambda: 1000.0), places=5)
+        self.assertEqual(1, modem.commands)
+
+    def test_resync(self):
+        ticks = int('7b8bd31d', 16)
+        responses = [['-MSSTM: {0:08x}'.format(ticks), 'OK'],
+                     # 1000s later, with a quicker round trip
+                     ['-MSSTM: {0:08x}'.format(ticks + int(1000.05 / TICK)), 'OK'],
+                     # The network time has jumped
+                     ['-MSSTM: {0:08x}'.format(ticks + int(3000 / TICK)), 'OK']]
+        modem = FakeModem(self, responses, 0.5)
+        clock = IridiumClock(modem, maxUncertainty=0.3, clock=lambda: self.now)
+        clock.sync()
+        start = clock.timestamp()
+        modem.roundTrip = 0.01
+        self.now += 1000
+        # The uncertainty has grown past maxUncertainty, so the time is read again
+        self.assertAlmostEqual(start + 1000, clock.timestamp(), delta=0.4)
+        self.assertEqual(2, modem.commands)
+        self.assertLess(abs(clock.lastStep), 0.5)
+        self.assertLess(clock.uncertainty, 0.1)
+        clock.sync()
+        self.assertAlmostEqual(2000, clock.lastStep, delta=1)
+
+    def test_unachievableUncertainty(self):
+        self.assertRaises(ValueError, IridiumClock, None, maxUncertainty=TICK / 4)
+        # A round trip too slow for any reading to meet maxUncertainty
+        modem = FakeModem(self, [['-MSSTM: 7b8bd31d', 'OK']] * 4, 0.5)
+        clock = IridiumClock(modem, maxUncertainty=0.2, clock=lambda: self.now)
+        self.assertGreater(clock.sync(), 0.2)
+        # Read again once, then not on every call
+        for i in range(10):
+            clock.timestamp()
+        self.assertEqual(2, modem.commands)
+        self.now += 1.5
+        clock.timestamp()
+        clock.timestamp()
+        self.assertEqual(3, modem.commands)
+        # The retries back off
+        self.now += 1.5
+        clock.timestamp()
+        self.assertEqual(3, modem.commands)
+        self.now += 1
+        clock.timestamp()
+        self.assertEqual(4, modem.commands)
+
+
+if __name__ == "__main__":
+    unittest.main()
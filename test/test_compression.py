@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+
+""" Test suite for iridiummodem.compression """
+import sys, struct, unittest
+sys.path.append('..')
+
+from iridiummodem.compression import CodecRegistry, RawCodec, DeflateCodec, DeltaVarintCodec, \
+    trainDictionary, benchmark, RAW, DEFLATE, DELTA_VARINT
+
+
+def telemetry(i):
+    """ @return: a small text telemetry record, like the ones the dictionary is trained on """
+    return 'id=TRK{0:03d};batt={1:.2f};temp={2:.1f};status=OK;mode=track'.format(i % 7, 3.7 - i * 0.01, 20 + i % 5).encode()
+
+
+class TestCompression(unittest.TestCase):
+    """ Tests the payload codecs """
+
+    def test_roundTrip(self):
+        registry = CodecRegistry()
+        samples = [b'', b'\x00', b'\x01\x02\x03\x04' * 20, telemetry(1), bytes(range(256))]
+        for sample in samples:
+            for codec in registry.codecs:
+                if codec.codecId == DELTA_VARINT and len(sample) % 2 != 0:
+                    continue
+                compressed = registry.compress(sample, codec.codecId)
+                self.assertEqual(codec.codecId, compressed[0])
+                self.assertEqual(sample, registry.decompress(compressed))
+            self.assertEqual(sample, registry.decompress(registry.compress(sample)))
+
+    def test_bestCodec(self):
+        registry = CodecRegistry()
+        # Incompressible data goes raw, with just the header byte added
+        data = bytes(range(1, 200, 3))
+        self.assertEqual(bytes([RAW]) + data, registry.compress(data))
+        self.assertEqual(DEFLATE, registry.compress(b'abcdefgh' * 20)[0])
+        # Slowly changing 16 bit readings
+        readings = struct.pack('<30h', *[1000 + i * 3 for i in range(30)])
+        compressed = registry.compress(readings)
+        self.assertEqual(DELTA_VARINT, compressed[0])
+        self.assertEqual(1 + 2 + 29, len(compressed))
+
+    def test_errors(self):
+        registry = CodecRegistry()
+        self.assertRaises(ValueError, registry.decompress, b'')
+        self.assertRaises(ValueError, registry.decompress, b'\x63abc')
+        self.assertRaises(ValueError, registry.decompress, bytes([DEFLATE]) + b'\xff\xff\xff')
+        truncated = registry.compress(b'abcdefgh' * 20, DEFLATE)[:-2]
+        self.assertRaises(ValueError, registry.decompress, truncated)
+        self.assertRaises(ValueError, registry.compress, b'\x01\x02\x03', DELTA_VARINT)
+        # 40000 does not fit in a signed 16 bit integer
+        self.assertRaises(ValueError, DeltaVarintCodec().decode, DeltaVarintCodec(width=4).encode(struct.pack('<i', 40000)))
+        self.assertRaises(ValueError, registry.register, RawCodec(256))
+
+    def test_dictionary(self):
+        dictionary = trainDictionary([telemetry(i) for i in range(50)], size=256)
+        self.assertLessEqual(len(dictionary), 256)
+        self.assertIn(b'status=OK;mode=track', dictionary)
+        plain = DeflateCodec()
+        trained = DeflateCodec(16, dictionary=dictionary)
+        registry = CodecRegistry([plain, trained])
+        message = telemetry(77)
+        self.assertLess(len(trained.encode(message)) * 2, len(plain.encode(message)))
+        compressed = registry.compress(message)
+        self.assertEqual(16, compressed[0])
+        self.assertEqual(message, registry.decompress(compressed))
+        # Without the dictionary the payload can't be read
+        self.assertRaises(ValueError, CodecRegistry().decompress, compressed)
+
+    def test_benchmark(self):
+        samples = [telemetry(i) for i in range(10)]
+        dictionary = trainDictionary([telemetry(i) for i in range(20, 70)], size=256)
+        codecs = [RawCodec(), DeflateCodec(), DeflateCodec(16, dictionary=dictionary), DeltaVarintCodec()]
+        results = benchmark(codecs, samples, repeat=2)
+        self.assertEqual(['raw', 'deflate', 'deflate+dict', 'delta-varint16'], [result['name'] for result in results])
+        raw, deflate, trained, delta = results
+        self.assertAlmostEqual(sum(len(s) + 1 for s in samples) / float(sum(len(s) for s in samples)), raw['ratio'])
+        # Records this short are too small for deflate on its own
+        self.assertGreater(deflate['ratio'], 1.0)
+        self.assertLess(trained['ratio'], 0.5)
+        self.assertGreaterEqual(trained['encodeTime'], 0.0)
+        self.assertGreaterEqual(trained['decodeTime'], 0.0)
+        self.assertEqual(0, trained['skipped'])
+        self.assertEqual(len([s for s in samples if len(s) % 2 != 0]), delta['skipped'])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+""" Test suite for iridiummodem.fleet """
+import sys, unittest, logging, json, os, tempfile, shutil
+sys.path.append('..')
+
+import serial
+import gsmmodem.serial_comms
+
+from iridiummodem.modem import IridiumModem
+from iridiummodem.capabilities import CapabilityStore
+from iridiummodem.fleet import probeFleet, fleetReport, writeFleetReport
+from test.ptymodem import PtyModem
+
+
+def identity(imei):
+    return {'AT+CGSN': '\r\n{0}\r\n\r\nOK\r\n'.format(imei).encode(),
+            'AT+CGMM': b'\r\nIRIDIUM 9600 Family SBD Transceiver\r\n\r\nOK\r\n',
+            'AT+CGMR': b'\r\nCall Processor Version: TA16005\r\n\r\nOK\r\n',
+            'AT+CIER?': b'\r\nERROR\r\n'}
+
+
+def quickModem(port, baudrate):
+    modem = IridiumModem(port, baudrate)
+    modem.timeout = 0.1 # serial read timeout, so that close() returns quickly
+    return modem
+
+
+class TestFleet(unittest.TestCase):
+    """ Tests probing several modems at once """
+
+    def setUp(self):
+        # Other test modules replace pyserial with a mock
+        self._serialModule = gsmmodem.serial_comms.serial
+        gsmmodem.serial_comms.serial = serial
+        self.tmpDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        gsmmodem.serial_comms.serial = self._serialModule
+        shutil.rmtree(self.tmpDir)
+
+    def test_probeFleet(self):
+        fakes = [PtyModem(identity('300234010000001')), PtyModem(identity('300234010000002'))]
+        store = CapabilityStore(os.path.join(self.tmpDir, 'capabilities.json'))
+        ports = [fake.port for fake in fakes] + ['/dev/nonexistent-iridium']
+        try:
+            results = probeFleet(ports, commands=['AT+CGMI', 'AT+CIER?'], store=store, modemFactory=quickModem)
+        finally:
+            for fake in fakes:
+                fake.stop()
+        self.assertEqual(ports, [result.port for result in results])
+        self.assertEqual(['300234010000001', '300234010000002'], [result.capabilities.imei for result in results[:2]])
+        for result in results[:2]:
+            self.assertTrue(result.ok)
+            self.assertTrue(result.capabilities.supports('AT+CGMI'))
+            self.assertFalse(result.capabilities.supports('AT+CIER?'))
+        self.assertFalse(results[2].ok)
+        self.assertIsNone(results[2].capabilities)
+        # Both units are the same model and firmware, so share one entry
+        self.assertEqual(1, len(CapabilityStore(store.path).devices()))
+
+        path = os.path.join(self.tmpDir, 'report.json')
+        writeFleetReport(results, path)
+        with open(path) as f:
+            report = json.load(f)
+        self.assertEqual(3, len(report['units']))
+        self.assertEqual('300234010000002', report['units'][1]['imei'])
+        self.assertIsNotNone(report['units'][2]['error'])
+
+    def test_noPorts(self):
+        self.assertEqual([], probeFleet([]))
+        self.assertEqual([], fleetReport([])['units'])
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.DEBUG)
+    unittest.main()
@@ -4,6 +4,7 @@
 import sys, time, unittest, datetime, logging
 sys.path.append('..')
 from iridiummodem.modem import IridiumModem
+from iridiummodem import geo
 
 class TestGeo(unittest.TestCase):
     """ Tests geolocation functions in iridiummodem.modem """
@@ -75,6 +76,41 @@ class TestGeo(unittest.TestCase):
         self.assertEqual(itHex, 'd2ae1b4c')
 
 
+    def test_xyzToLatLon(self):
+        lat, lon = geo.xyzToLatLon(4024, -96, 4928)
+        self.assertEqual(50.758367137486, lat)
+        self.assertEqual(-1.366638089814213, lon)
+        # Longitudes more than 90 degrees from Greenwich keep their quadrant
+        self.assertAlmostEqual(135.0, geo.xyzToLatLon(-1000, 1000, 0)[1])
+        self.assertAlmostEqual(-135.0, geo.xyzToLatLon(-1000, -1000, 0)[1])
+        self.assertAlmostEqual(180.0, geo.xyzToLatLon(-1000, 0, 0)[1])
+        self.assertAlmostEqual(90.0, geo.xyzToLatLon(0, 0, 6000)[0])
+        self.assertAlmostEqual(-90.0, geo.xyzToLatLon(0, 0, -6000)[0])
+        self.assertRaises(ValueError, geo.xyzToLatLon, 0, 0, 0)
+
+    @unittest.skipIf(geo.numpy == None, 'needs NumPy')
+    def test_geoLocations(self):
+        """ Batch conversion gives the same results as converting each fix """
+        fixes = [(4024, -96, 4928, 0x7b8bd31d), (-1000, 1000, 300, 0x2c781713),
+                 (-3000, -2500, -4000, 0x2c799555), (10, 6000, -50, 0x12345678)]
+        x, y, z, ticks = zip(*fixes)
+        lat, lon, times = geo.geoLocations(x, y, z, ticks)
+        for i, fix in enumerate(fixes):
+            expected = geo.geoLocation(*fix)
+            self.assertAlmostEqual(expected[0], lat[i], places=12)
+            self.assertAlmostEqual(expected[1], lon[i], places=12)
+            self.assertEqual(expected[2].replace(tzinfo=None), times[i].astype(datetime.datetime))
+
+    @unittest.skipIf(geo.numpy == None, 'needs NumPy')
+    def test_parseGeoLines(self):
+        lines = ['-MSGEO: 4024,-96,4928,7b8bd31d', 'OK', '-MSGEO: 0,0,0,2c781713', '-MSSTM: 2c781713']
+        lat, lon, times = geo.parseGeoLines(lines)
+        self.assertEqual(2, len(lat))
+        self.assertAlmostEqual(50.758367137486, lat[0], places=12)
+        self.assertAlmostEqual(-1.366638089814213, lon[0], places=12)
+        self.assertTrue(geo.numpy.isnan(lat[1]))
+        self.assertEqual(geo.numpy.datetime64('2020-04-08T17:25:35.530'), times[0])
+
 
 if __name__ == "__main__":
     logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.DEBUG)
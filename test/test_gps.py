@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+
+""" Test suite for iridiummodem.gps """
+import sys, time, unittest
+sys.path.append('..')
+
+from gsmmodem.exceptions import CommandError, TimeoutException
+
+from iridiummodem.modem import IridiumProtocol
+from iridiummodem.capabilities import DeviceCapabilities
+from iridiummodem.gps import GpsFix, PositionStream, parseGpsPosition
+
+
+class FakeModem(IridiumProtocol):
+    """ Answers each command with the next of its responses; None raises CommandError, and an exception is raised as it is """
+
+    def __init__(self, responses, capabilities=None):
+        self.responses = responses # command: list of responses
+        self.capabilities = capabilities
+        self.written = []
+
+    def write(self, command):
+        self.written.append(command)
+        responses = self.responses.get(command)
+        if not responses:
+            raise CommandError(command)
+        response = responses.pop(0) if len(responses) > 1 else responses[0]
+        if response == None:
+            raise CommandError(command)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+def gpspos(text):
+    return [[text, 'OK']]
+
+
+class TestParseGpsPosition(unittest.TestCase):
+    """ Tests parsing of AT+GPSPOS responses """
+
+    def test_hemispheres(self):
+        fix = parseGpsPosition(['51.3842,S,001.2051,W,A', 'OK'], when=5.0)
+        self.assertEqual(-51.3842, fix.latitude)
+        self.assertEqual(-1.2051, fix.longitude)
+        self.assertTrue(fix.valid)
+        self.assertEqual(5.0, fix.when)
+        fix = parseGpsPosition(['+GPSPOS: 51.3842,N,001.2051,E,A'])
+        self.assertEqual((51.3842, 1.2051), (fix.latitude, fix.longitude))
+
+    def test_noFix(self):
+        fix = parseGpsPosition(['00.0000,N,000.0000,E,V', 'OK'])
+        self.assertEqual((0.0, 0.0), (fix.latitude, fix.longitude))
+        self.assertFalse(fix.valid)
+        self.assertRaises(CommandError, parseGpsPosition, ['ERROR'])
+
+    def test_gpsLocation(self):
+        modem = FakeModem({})
+        self.assertEqual([-12.5, 130.845], modem._parseGpsLocation(['12.5000,S,130.8450,E,A']))
+
+
+class TestPositionStream(unittest.TestCase):
+    """ Tests adaptive polling of the GPS receiver """
+
+    def setUp(self):
+        self.now = 0.0
+
+    def stream(self, modem, **kwargs):
+        return PositionStream(modem, minInterval=5, maxInterval=40, searchInterval=15, movementThreshold=25,
+                              clock=lambda: self.now, **kwargs)
+
+    def test_adaptiveInterval(self):
+        modem = FakeModem({'AT+GPSSTA?': [None],
+                           'AT+GPSUPD': [['OK']],
+                           'AT+GPSPOS': [['00.0000,N,000.0000,E,V'],
+                                         ['51.3842,N,001.2051,W,A'],
+                                         ['51.3842,N,001.2051,W,A'],
+                                         ['51.3843,N,001.2051,W,A'], # about 11m
+                                         ['51.3842,N,001.2051,W,A'],
+                                         ['51.3900,N,001.2051,W,A']]}) # about 640m
+        stream = self.stream(modem)
+        published = []
+        stream.subscribe(published.append)
+        # No fix: poll at the search interval and ask for an update
+        self.assertFalse(stream.poll().valid)
+        self.assertEqual(15, stream.interval)
+        self.assertIn('AT+GPSUPD', modem.written)
+        self.assertTrue(stream.poll().valid)
+        self.assertEqual(5, stream.interval)
+        # Staying put: back off, and don't publish the same position again
+        self.assertEqual(None, stream.poll())
+        self.assertEqual(10, stream.interval)
+        self.assertNotEqual(None, stream.poll())
+        self.assertEqual(20, stream.interval)
+        stream.poll()
+        self.assertEqual(40, stream.interval)
+        # Moving: poll often again
+        stream.poll()
+        self.assertEqual(5, stream.interval)
+        self.assertEqual(5, len(published))
+        self.assertEqual(6, stream.polls)
+        self.assertEqual(-1.2051, published[-1].longitude)
+        # AT+GPSSTA? failed once and is not sent again
+        self.assertEqual(1, modem.written.count('AT+GPSSTA?'))
+
+    def test_receiverOff(self):
+        modem = FakeModem({'AT+GPSSTA?': [['+GPSSTA: 0', 'OK'], ['+GPSSTA: 1', 'OK']],
+                           'AT+GPSPOS': gpspos('51.3842,N,001.2051,W,A')})
+        stream = self.stream(modem)
+        self.assertEqual(None, stream.poll())
+        self.assertEqual(40, stream.interval)
+        self.assertNotIn('AT+GPSPOS', modem.written)
+        self.assertTrue(stream.poll().valid)
+
+    def test_unsupportedCommands(self):
+        caps = DeviceCapabilities('300434060000000', 'IRIDIUM 9575', 'TA13001')
+        caps.record('AT+GPSSTA?', False)
+        caps.record('AT+GPSUPD', False)
+        modem = FakeModem({'AT+GPSPOS': gpspos('00.0000,N,000.0000,E,V')}, caps)
+        stream = self.stream(modem)
+        stream.poll()
+        self.assertEqual(['AT+GPSPOS'], modem.written)
+
+    def test_positions(self):
+        modem = FakeModem({'AT+GPSSTA?': [None],
+                           'AT+GPSUPD': [None],
+                           'AT+GPSPOS': [None,
+                                         ['51.3842,N,001.2051,W,A'],
+                                         ['51.3842,N,001.2051,W,A'],
+                                         ['52.0000,N,001.2051,W,A']]})
+        stream = PositionStream(modem, minInterval=0, maxInterval=0, searchInterval=0)
+        fixes = []
+        for fix in stream.positions():
+            self.assertIsInstance(fix, GpsFix)
+            fixes.append(fix)
+            if len(fixes) == 2:
+                stream.stop()
+        self.assertEqual([51.3842, 52.0], [fix.latitude for fix in fixes])
+        self.assertEqual(4, stream.polls)
+
+    def test_positionsTimeout(self):
+        modem = FakeModem({'AT+GPSSTA?': [None],
+                           'AT+GPSPOS': [TimeoutException(),
+                                         ['51.3842,N,001.2051,W,A']]})
+        stream = PositionStream(modem, minInterval=0, maxInterval=0, searchInterval=0)
+        for fix in stream.positions():
+            stream.stop()
+        self.assertEqual(51.3842, fix.latitude)
+        self.assertEqual(2, stream.polls)
+        # The polling thread survives a timeout too
+        modem.responses['AT+GPSPOS'] = [TimeoutException(), ['52.0000,N,001.2051,W,A']]
+        published = []
+        stream.subscribe(published.append)
+        stream.start()
+        deadline = time.time() + 5
+        while len(published) == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        stream.stop()
+        self.assertEqual(52.0, published[0].latitude)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+""" Test suite for iridiummodem.indicators """
+import sys, unittest, logging, threading, time
+sys.path.append('..')
+
+from iridiummodem.indicators import IndicatorMonitor, SIGNAL, SERVICE, ANTENNA
+
+class TestIndicatorMonitor(unittest.TestCase):
+    """ Tests tracking of +CIEV indicator events """
+
+    def test_state(self):
+        monitor = IndicatorMonitor()
+        self.assertIsNone(monitor.state.signal)
+        events = []
+        monitor.subscribe(lambda indicator, value, state: events.append((indicator, value, state.signal)))
+        monitor.update(SIGNAL, 3)
+        monitor.update(SERVICE, 1)
+        monitor.update(ANTENNA, 0)
+        state = monitor.state
+        self.assertEqual(3, state.signal)
+        self.assertTrue(state.service)
+        self.assertFalse(state.antennaFault)
+        self.assertEqual([(SIGNAL, 3, 3), (SERVICE, 1, 3), (ANTENNA, 0, 3)], events)
+        monitor.reset()
+        self.assertIsNone(monitor.state.signal)
+
+    def test_waitForSignal(self):
+        monitor = IndicatorMonitor()
+        self.assertFalse(monitor.waitForSignal(2, timeout=0.01))
+        monitor.update(SIGNAL, 2)
+        self.assertTrue(monitor.waitForSignal(2, timeout=0.01))
+
+    def test_waitForSignalSamples(self):
+        monitor = IndicatorMonitor()
+        monitor.update(SIGNAL, 3)
+        def report():
+            for value in (1, 4, 5, 4):
+                time.sleep(0.02)
+                monitor.update(SIGNAL, value)
+        thread = threading.Thread(target=report)
+        thread.start()
+        # The dip to 1 restarts the count, so three good samples take until the last event
+        self.assertTrue(monitor.waitForSignal(3, samples=3, timeout=5))
+        thread.join()
+        self.assertEqual(4, monitor.state.signal)
+
+    def test_waitForSignalHoldTime(self):
+        monitor = IndicatorMonitor()
+        monitor.update(SIGNAL, 4)
+        start = time.monotonic()
+        self.assertTrue(monitor.waitForSignal(3, holdTime=0.1, timeout=5))
+        self.assertGreaterEqual(time.monotonic() - start, 0.1)
+        self.assertFalse(monitor.waitForSignal(3, holdTime=1, timeout=0.05))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.DEBUG)
+    unittest.main()
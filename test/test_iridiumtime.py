@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+
+""" Test suite for iridiummodem.iridiumtime """
+import sys, unittest
+sys.path.append('..')
+
+from datetime import datetime, timezone
+
+from iridiummodem import iridiumtime
+from iridiummodem.iridiumtime import ticksToDatetime, datetimeToTicks, ticksToDatetime64, datetime64ToTicks
+
+
+class TestIridiumTime(unittest.TestCase):
+    """ Tests conversion of Iridium tick counts to and from UTC """
+
+    def test_eras(self):
+        self.assertEqual((833587211000, 1173325821000, 1399818235000), iridiumtime.ERA_EPOCHS_MS)
+
+    def test_scalar(self):
+        dt = ticksToDatetime('2c781713')
+        self.assertEqual(datetime(2016, 6, 26, 18, 5, 30, 790000, tzinfo=timezone.utc), dt)
+        self.assertEqual(dt, ticksToDatetime(0x2c781713))
+        self.assertEqual(0x2c781713, datetimeToTicks(dt))
+        # Every tick converts exactly, with no float rounding
+        for ticks in range(0x2c799550, 0x2c799560):
+            self.assertEqual(ticks, datetimeToTicks(ticksToDatetime(ticks)))
+        self.assertEqual(0x12345678, datetimeToTicks(ticksToDatetime(0x12345678, 0), 0))
+        self.assertRaises(ValueError, datetimeToTicks, datetime(1990, 1, 1, tzinfo=timezone.utc))
+
+    @unittest.skipIf(iridiumtime.numpy == None, 'needs NumPy')
+    def test_batch(self):
+        numpy = iridiumtime.numpy
+        hexTimes = ['2c781713', '2c781714', '153456df']
+        times = ticksToDatetime64(hexTimes)
+        self.assertEqual(numpy.dtype('datetime64[ms]'), times.dtype)
+        self.assertEqual([ticksToDatetime(value).replace(tzinfo=None) for value in hexTimes], times.tolist())
+        ticks = numpy.array([int(value, 16) for value in hexTimes])
+        self.assertTrue(numpy.array_equal(times, ticksToDatetime64(ticks)))
+        self.assertTrue(numpy.array_equal(ticks, datetime64ToTicks(times)))
+        # The era is chosen per value
+        mixed = numpy.array(['2006-06-30T21:38:36.080', '2016-06-30T21:38:36.010'], dtype='datetime64[ms]')
+        self.assertEqual([0xd2ae1b4c, 0x2cb4d9fd], datetime64ToTicks(mixed).tolist())
+        self.assertRaises(ValueError, datetime64ToTicks, mixed, 2)
+        self.assertRaises(ValueError, datetime64ToTicks, numpy.array(['1990-01-01'], dtype='datetime64[ms]'))
+
+
+if __name__ == "__main__":
+    unittest.main()
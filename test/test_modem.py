@@ -4,7 +4,7 @@
 
 from __future__ import print_function
 
-import sys, time, unittest, logging, codecs
+import sys, time, unittest, logging, codecs, threading, hashlib
 
 from datetime import datetime, timezone
 import dateutil.parser
@@ -19,6 +19,9 @@ PYTHON_VERSION = sys.version_info[0]
 import gsmmodem.serial_comms
 import iridiummodem.modem
 from iridiummodem.modem import ISUSBDStatus, SBDTransferStatus, SBDBinaryMessage
+from iridiummodem.arbiter import CommandArbiter
+from iridiummodem.cache import PropertyCache
+from iridiummodem.compression import CodecRegistry, HEADER_LENGTH
 import gsmmodem.pdu
 from gsmmodem.util import SimpleOffsetTzInfo
 
@@ -119,6 +122,19 @@ class TestIridiumModemGeneralApi(unittest.TestCase):
         self.modem.serial.responseSequence = ['{0}\r\n'.format('+SBDIX: 2, 6, 0, 0, 0, 0\r\n'), 'OK\r\n']
         self.assertEqual(SBDTransferStatus(6, 0, False, False, 0, 2, 0), self.modem.initiateSBDSession)
 
+    def test_initiateSBDSession_statusMismatch(self):
+        # Only a local status that was known can fail to match
+        self.modem.serial.responseSequence = ['+SBDIX: 0, 6, 0, 0, 0, 0\r\n', 'OK\r\n']
+        with self.assertLogs(self.modem.log, logging.DEBUG) as logs:
+            self.modem.initiateSBDSession
+        self.assertFalse(any('does not match local status' in line for line in logs.output))
+        self.modem._sbdState.sync(ISUSBDStatus(3, -1, False, False, 0))
+        self.modem.serial.responseSequence = ['+SBDIX: 0, 6, 0, 0, 0, 0\r\n', 'OK\r\n']
+        with self.assertLogs(self.modem.log, logging.DEBUG) as logs:
+            self.modem.initiateSBDSession
+        self.assertTrue(any('does not match local status' in line for line in logs.output))
+        self.assertFalse(self.modem._sbdState.synced)
+
     def test_initiateSBDSession_messagePresent(self):
         # Used to check the right command is sent to the modem
         def writeCallbackFunc(data):
@@ -165,6 +181,192 @@ class TestIridiumModemGeneralApi(unittest.TestCase):
 
         self.assertEqual(SBDBinaryMessage(data=b'\x07\x08\x19\x17\x17\x12\x13'), self.modem.readSBDMessageFromIsu)
 
+    def test_readSBDMessageFromIsu_binary(self):
+        # Payload contains a line terminator and bytes that are not valid utf-8
+        self.modem.serial.responseSequence = ['{0}\r\n'.format('+SBDS: 0, 5, 1, 9\r\n'), 'OK\r\n', b'\x00\x05\r\n\xf0\xff\x00\x02\x06\r\n', 'OK\r\n']
+
+        msg = self.modem.readSBDMessageFromIsu
+        self.assertEqual(9, msg.sequence)
+        self.assertIsInstance(msg.data, memoryview)
+        self.assertEqual(b'\r\n\xf0\xff\x00', bytes(msg.data))
+
+    def test_payloadCodecs(self):
+        self.modem.payloadCodecs = CodecRegistry()
+        written = []
+        self.modem.serial.writeCallbackFunc = written.append
+        # Answer each write in turn, so a result code isn't read before the data has been written
+        self.modem.serial.flushResponseSequence = False
+        self.modem.serial.responseSequence = ['READY\r\n', '0\r\nOK\r\n', '+SBDS: 0, 5, 1, -1\r\nOK\r\n']
+        payload = b'temperature=21.5;' * 4
+        compressed = self.modem.payloadCodecs.compress(payload)
+        self.assertLess(len(compressed), len(payload))
+        msgToSend = SBDBinaryMessage(data=payload)
+        self.modem.writeSBDMessageToIsu(msgToSend)
+        self.assertIn('AT+SBDWB={0}\r'.format(len(compressed)), written)
+        self.assertEqual(payload, msgToSend.data)
+        # Messages read are decompressed
+        frame = bytearray([0, len(compressed)]) + compressed + SBDBinaryMessage(data=compressed).generateChecksum
+        self.modem.serial.responseSequence = ['+SBDS: 0, 5, 1, 9\r\nOK\r\n', bytes(frame) + b'\r\nOK\r\n']
+        msg = self.modem.readSBDMessageFromIsu
+        self.assertEqual(9, msg.sequence)
+        self.assertEqual(payload, msg.data)
+        self.assertEqual(None, msg.payloadError)
+        # Ones that aren't compressed payloads are passed on as they are
+        self.modem.serial.responseSequence = ['+SBDS: 0, 5, 1, 9\r\nOK\r\n', b'\x00\x01\x41\x00\x41\r\nOK\r\n']
+        msg = self.modem.readSBDMessageFromIsu
+        self.assertEqual(b'A', bytes(msg.data))
+        self.assertIn('unknown codec', msg.payloadError)
+        # A payload that doesn't fit once its header byte is added is refused before it is written
+        del written[:]
+        incompressible = b''.join(hashlib.sha256(bytes([i])).digest() for i in range(11))[:340]
+        self.assertEqual(self.modem.maxMOLength, len(incompressible))
+        self.assertRaises(ValueError, self.modem.writeSBDMessageToIsu, SBDBinaryMessage(data=incompressible))
+        self.assertEqual([], written)
+        self.modem.serial.responseSequence = ['READY\r\n', '0\r\nOK\r\n', '+SBDS: 0, 5, 1, -1\r\nOK\r\n']
+        self.modem.writeSBDMessageToIsu(SBDBinaryMessage(data=incompressible[HEADER_LENGTH:]))
+        self.assertIn('AT+SBDWB={0}\r'.format(self.modem.maxMOLength), written)
+
+    def test_readSBDMessageFromIsu_badChecksum(self):
+        self.modem.serial.responseSequence = ['{0}\r\n'.format('+SBDS: 0, 5, 1, 9\r\n'), 'OK\r\n', b'\x00\x02\x01\x02\x00\x04\r\n', 'OK\r\n']
+
+        with self.assertRaises(CommandError):
+            self.modem.readSBDMessageFromIsu
+
+
+    def test_leanSBDTransactions(self):
+        self.modem.leanSBDTransactions = True
+        written = []
+        self.modem.serial.writeCallbackFunc = written.append
+        self.modem.serial.responseSequence = ['READY\r\n', '0\r\n', 'OK\r\n', '+SBDS: 1, 5, 0, -1\r\n', 'OK\r\n',
+                                              '+SBDIX: 0, 5, 1, 3, 1, 0\r\n', 'OK\r\n', b'\x00\x01\x41\x00\x41\r\n', 'OK\r\n']
+
+        msgToSend = SBDBinaryMessage(data=b'\x07')
+        self.assertEqual(ISUSBDStatus(5, -1, True, False, -1), self.modem.writeSBDMessageToIsu(msgToSend))
+        self.assertEqual(5, msgToSend.sequence)
+        self.modem.initiateSBDSession
+        self.assertEqual(ISUSBDStatus(6, 3, True, True, 0), self.modem.localSBDStatus)
+        msg = self.modem.readSBDMessageFromIsu
+        self.assertEqual(3, msg.sequence)
+        self.assertEqual(b'A', bytes(msg.data))
+        # Only the first write needed AT+SBDS to learn the sequence numbers
+        self.assertEqual(['AT+SBDWB=1\r', 'AT+SBDS\r', 'AT+SBDIX\r', 'AT+SBDRB\r'], [cmd for cmd in written if type(cmd) == str and cmd.startswith('AT')])
+
+    def test_leanSBDTransactions_mismatch(self):
+        self.modem.leanSBDTransactions = True
+        self.modem.serial.responseSequence = ['+SBDS: 0, 5, 0, -1\r\n', 'OK\r\n', '+SBDIX: 0, 7, 0, 0, 0, 0\r\n', 'OK\r\n']
+
+        self.modem.getSBDStatus
+        self.assertEqual(ISUSBDStatus(5, -1, False, False, -1), self.modem.localSBDStatus)
+        # Someone else used the ISU in between; the local copy must be dropped
+        self.modem.initiateSBDSession
+        self.assertIsNone(self.modem.localSBDStatus)
+
+    def test_drainSBDMessages(self):
+        written = []
+        self.modem.serial.writeCallbackFunc = written.append
+        self.modem.serial.responseSequence = ['+SBDIX: 0, 5, 1, 3, 1, 1\r\n', 'OK\r\n', '0\r\n', 'OK\r\n', b'\x00\x01\x41\x00\x41\r\n', 'OK\r\n',
+                                              '+SBDIX: 0, 6, 1, 4, 1, 0\r\n', 'OK\r\n', b'\x00\x01\x42\x00\x42\r\n', 'OK\r\n']
+
+        messages = [(msg.sequence, bytes(msg.data)) for msg in self.modem.drainSBDMessages()]
+        self.assertEqual([(3, b'A'), (4, b'B')], messages)
+        # Whatever was in the MO buffer goes out on the first session, and is only cleared after that
+        self.assertEqual(['AT+SBDIX\r', 'AT+SBDD0\r', 'AT+SBDRB\r', 'AT+SBDIX\r', 'AT+SBDRB\r'], [cmd for cmd in written if type(cmd) == str])
+
+    def test_drainSBDMessages_clearMO(self):
+        written = []
+        self.modem.serial.writeCallbackFunc = written.append
+        self.modem.serial.responseSequence = ['0\r\n', 'OK\r\n',
+                                              '+SBDIX: 0, 5, 1, 3, 1, 0\r\n', 'OK\r\n', b'\x00\x01\x41\x00\x41\r\n', 'OK\r\n']
+
+        messages = [bytes(msg.data) for msg in self.modem.drainSBDMessages(clearMO=True)]
+        self.assertEqual([b'A'], messages)
+        self.assertEqual(['AT+SBDD0\r', 'AT+SBDIX\r', 'AT+SBDRB\r'], [cmd for cmd in written if type(cmd) == str])
+
+    def test_drainSBDMessages_withOutbound(self):
+        written = []
+        self.modem.serial.writeCallbackFunc = written.append
+        self.modem.serial.responseSequence = ['READY\r\n', '0\r\n', 'OK\r\n', '+SBDS: 1, 5, 0, -1\r\n', 'OK\r\n',
+                                              '+SBDIX: 0, 5, 1, 3, 1, 0\r\n', 'OK\r\n', '0\r\n', 'OK\r\n', b'\x00\x01\x41\x00\x41\r\n', 'OK\r\n']
+
+        messages = list(self.modem.drainSBDMessages([SBDBinaryMessage(data=b'\x01')]))
+        self.assertEqual([b'A'], [bytes(msg.data) for msg in messages])
+        # The sent message is cleared so that it does not go out again
+        self.assertEqual(['AT+SBDWB=1\r', 'AT+SBDS\r', 'AT+SBDIX\r', 'AT+SBDD0\r', 'AT+SBDRB\r'],
+                         [cmd for cmd in written if type(cmd) == str and cmd.startswith('AT')])
+
+    def test_unsolicitedDuringCommand(self):
+        notifications = []
+        self.modem.notifyCallback = notifications.append
+        self.modem.serial.responseSequence = ['+CSQ:3\r\n', 'SBDRING\r\n', 'OK\r\n']
+        self.assertEqual(3, self.modem.signalStrength)
+        self.assertEqual([['SBDRING']], notifications)
+
+    def test_sbdRingNotification(self):
+        ringing = threading.Event()
+        self.modem._handleSBDRing = ringing.set
+        self.modem._handleIncomingCall = lambda lines: self.fail('SBD ring alert taken for a call')
+        self.modem._handleModemNotification(['SBDRING'])
+        self.assertTrue(ringing.wait(5))
+        self.modem._handleModemNotification(['+AREG: 1,0'])
+        self.assertEqual((1, 0), self.modem.registrationStatus)
+
+    def test_indicatorEvents(self):
+        self.modem.serial.responseSequence = ['+CSQ:3\r\n', '+CIEV:0,4\r\n', 'OK\r\n']
+        self.assertEqual(3, self.modem.signalStrength)
+        self.modem._handleModemNotification(['+CIEV:1,1', '+CIEV:2,0'])
+        state = self.modem.indicators.state
+        self.assertEqual(4, state.signal)
+        self.assertTrue(state.service)
+        self.assertFalse(state.antennaFault)
+
+    def test_sbdRingRetrieval(self):
+        received = []
+        written = []
+        self.modem.sbdReceivedCallback = received.append
+        self.modem.serial.writeCallbackFunc = written.append
+        # Nothing is waiting to go out
+        self.modem._sbdState.sync(ISUSBDStatus(5, -1, False, False, -1))
+        self.modem.serial.responseSequence = ['+SBDIX: 0, 5, 1, 3, 1, 0\r\n', 'OK\r\n', b'\x00\x01\x41\x00\x41\r\n', 'OK\r\n']
+        self.modem._handleSBDRing()
+        self.assertEqual([b'A'], [bytes(msg.data) for msg in received])
+        self.assertEqual(['AT+SBDIXA\r', 'AT+SBDRB\r'], [cmd for cmd in written if type(cmd) == str])
+
+    def test_sbdRingRetrieval_pendingMO(self):
+        received = []
+        written = []
+        self.modem.sbdReceivedCallback = received.append
+        self.modem.serial.writeCallbackFunc = written.append
+        # A message written but not yet sent goes out with the answer to the ring
+        self.modem._sbdState.sync(ISUSBDStatus(5, -1, True, False, -1))
+        self.modem.serial.responseSequence = ['+SBDIX: 0, 5, 1, 3, 1, 0\r\n', 'OK\r\n', '0\r\n', 'OK\r\n',
+                                              b'\x00\x01\x41\x00\x41\r\n', 'OK\r\n']
+        self.modem._handleSBDRing()
+        self.assertEqual([b'A'], [bytes(msg.data) for msg in received])
+        commands = [cmd for cmd in written if type(cmd) == str]
+        self.assertEqual('AT+SBDIXA\r', commands[0])
+        self.assertEqual(['AT+SBDIXA\r', 'AT+SBDD0\r', 'AT+SBDRB\r'], commands)
+
+    def test_sbdRingHoldsModem(self):
+        """ Other threads can't send commands between the ring's sessions and reads, but can during the callback """
+        acquired = []
+        def otherThread():
+            acquired.append(self.modem._txLock.acquire(timeout=0))
+            if acquired[-1]:
+                self.modem._txLock.release()
+        def probe():
+            thread = threading.Thread(target=otherThread)
+            thread.start()
+            thread.join()
+        readSBDMessage = self.modem._readSBDMessage
+        def reading(sequence):
+            probe()
+            return readSBDMessage(sequence)
+        self.modem._readSBDMessage = reading
+        self.modem.sbdReceivedCallback = lambda msg: probe()
+        self.modem._sbdState.sync(ISUSBDStatus(5, -1, False, False, -1))
+        self.modem.serial.responseSequence = ['+SBDIX: 0, 5, 1, 3, 1, 0\r\n', 'OK\r\n', b'\x00\x01\x41\x00\x41\r\n', 'OK\r\n']
+        self.modem._handleSBDRing()
+        self.assertEqual([False, True], acquired)
 
     def test_signalStrength(self):
         # Set fake response
@@ -172,6 +374,65 @@ class TestIridiumModemGeneralApi(unittest.TestCase):
 
         self.assertEqual(3, self.modem.signalStrength)
 
+    def test_signalStrengthFast(self):
+        self.modem.serial.responseSequence = ['+CSQF:2\r\n', 'OK\r\n']
+        self.assertEqual(2, self.modem.signalStrengthFast)
+        # Units without AT+CSQF fall back to AT+CSQ
+        self.modem.serial.responseSequence = ['ERROR\r\n', '+CSQ:4\r\n', 'OK\r\n']
+        self.assertEqual(4, self.modem.signalStrengthFast)
+        self.assertFalse(self.modem._csqfSupported)
+
+    def test_queryBatch(self):
+        written = []
+        self.modem.serial.writeCallbackFunc = written.append
+        self.modem.serial.responseSequence = ['Iridium\r\n', '300234010753370\r\n', '-MSSTM: 7b8bd31d\r\n',
+                                              '+SBDSX: 1, 5, 0, -1, 0, 2\r\n', 'OK\r\n']
+        manufacturer, imei, systemTime, status = self.modem.queryBatch(['AT+CGMI', 'AT+CGSN', 'AT-MSSTM', 'AT+SBDSX'])
+        self.assertEqual(['AT+CGMI;+CGSN;-MSSTM;+SBDSX\r'], written)
+        self.assertEqual('Iridium', manufacturer)
+        self.assertEqual('300234010753370', imei)
+        self.assertEqual(datetime(2020, 4, 8, 17, 25, 35, 530000, tzinfo=timezone.utc), systemTime)
+        self.assertEqual(ISUSBDStatus(5, -1, True, False, 2), status)
+        self.assertRaises(ValueError, self.modem.queryBatch, ['AT+SBDIX'])
+        # The chained line is not timed as its first command, nor learned from
+        self.assertEqual([], self.modem.timeoutPolicy.samples('+CGMI'))
+        self.modem.timeoutPolicy.setTimeout('+CGMI', 0.1)
+        self.assertAlmostEqual(60.1, self.modem._batchTimeout(['AT+CGMI', 'AT+CSQ']))
+
+    def test_queryBatch_noChaining(self):
+        # Modems that reject chained commands are sent them one at a time
+        written = []
+        self.modem.serial.writeCallbackFunc = written.append
+        self.modem.serial.responseSequence = ['ERROR\r\n', 'Iridium\r\n', 'OK\r\n', '+CSQ:4\r\n', 'OK\r\n']
+        self.assertEqual(['Iridium', 4], self.modem.queryBatch(['AT+CGMI', 'AT+CSQ']))
+        self.assertEqual(['AT+CGMI;+CSQ\r', 'AT+CGMI\r', 'AT+CSQ\r'], written)
+        self.assertFalse(self.modem.commandChaining)
+
+    def test_arbiter(self):
+        self.modem.arbiter = CommandArbiter()
+        self.modem.serial.responseSequence = ['+CSQF:2\r\n', 'OK\r\n']
+        self.assertEqual(2, self.modem.signalStrengthFast)
+        self.assertEqual(1, self.modem.arbiter.granted)
+        # The commands writing an SBD message hold the modem throughout
+        self.modem.serial.responseSequence = ['READY\r\n', '0\r\n', 'OK\r\n', '+SBDS: 1, 5, 0, -1\r\n', 'OK\r\n']
+        self.modem.writeSBDMessageToIsu(SBDBinaryMessage(data=b'hello'))
+        self.assertEqual(2, self.modem.arbiter.granted)
+
+    def test_propertyCache(self):
+        written = []
+        self.modem.propertyCache = PropertyCache()
+        self.modem.serial.writeCallbackFunc = written.append
+        self.modem.serial.responseSequence = ['IRIDIUM 9600 Family SBD Transceiver\r\n', 'OK\r\n']
+        self.assertEqual('IRIDIUM 9600 Family SBD Transceiver', self.modem.model)
+        self.assertEqual('IRIDIUM 9600 Family SBD Transceiver', self.modem.model)
+        self.assertEqual(['AT+CGMM\r'], written)
+        self.assertEqual({'hits': 1, 'misses': 1, 'coalesced': 0}, self.modem.propertyCache.stats())
+        # The network time is a clock reading, so is read every time
+        self.modem.serial.responseSequence = ['-MSSTM: 7b8bd31d\r\n', 'OK\r\n', '-MSSTM: 7b8bd31e\r\n', 'OK\r\n']
+        first = self.modem.systemTime
+        self.assertLess(first, self.modem.systemTime)
+        self.assertEqual(['AT-MSSTM\r', 'AT-MSSTM\r'], written[1:])
+
     def test_copySentSBDToReceived(self):
         # Used to check the right command is sent to the modem
         def writeCallbackFunc(data):
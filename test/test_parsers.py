@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+
+""" Test suite for iridiummodem.parsers """
+import sys, unittest
+sys.path.append('..')
+
+from gsmmodem.exceptions import CommandError
+
+from iridiummodem.parsers import ResponseParser, ResponseFormat
+
+
+class TestResponseParser(unittest.TestCase):
+    """ Tests the prefix-dispatched response parser """
+
+    def setUp(self):
+        self.parser = ResponseParser()
+
+    def test_parseLine(self):
+        line = self.parser.parseLine('+SBDIX: 0, 8, 0, 0, 0, 0')
+        self.assertEqual('+SBDIX', line.prefix)
+        self.assertEqual((0, 8, 0, 0, 0, 0), line.values)
+        self.assertEqual((4024, -100, 4924, '2c781713'), self.parser.parseLine('-MSGEO: 4024,-100,4924,2c781713').values)
+        self.assertEqual((5,), self.parser.parseLine('+CSQ:5').values)
+        self.assertEqual((1, 5, 0, -1), self.parser.parseLine('\nSBDS: 1, 5, 0, -1').values)
+        self.assertIsNone(self.parser.parseLine('Call Processor Version: TA16005'))
+        self.assertIsNone(self.parser.parseLine('-MSSTM: no network service'))
+        self.assertIsNone(self.parser.parseLine('+SBDS: 1, 5'))
+
+    def test_unsolicited(self):
+        self.assertTrue(self.parser.isUnsolicited('SBDRING'))
+        self.assertTrue(self.parser.isUnsolicited('+CIEV:0,4'))
+        self.assertFalse(self.parser.isUnsolicited('+CSQ:4'))
+        self.assertFalse(self.parser.isUnsolicited('OK'))
+        self.assertEqual((0, 4), self.parser.parseLine('+CIEV:0,4').values)
+
+    def test_expect(self):
+        self.assertEqual((3,), self.parser.expect(['', '+CSQF:3', 'OK'], '+CSQ', '+CSQF'))
+        self.assertRaises(CommandError, self.parser.expect, ['+CSQ:3', 'OK'], '+SBDS')
+        self.assertRaises(CommandError, self.parser.expect, ['ERROR'], '+CSQ')
+
+    def test_register(self):
+        self.parser.register(ResponseFormat('+CGSN', (str,)))
+        self.assertEqual(('300234010753370',), self.parser.expect(['+CGSN: 300234010753370', 'OK'], '+CGSN'))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+""" Test suite for iridiummodem.pool """
+import sys, time, unittest, logging, threading
+sys.path.append('..')
+
+from gsmmodem.exceptions import TimeoutException, InvalidStateException
+
+from iridiummodem.modem import SBDBinaryMessage, SBDTransferStatus
+from iridiummodem.pool import ModemPool
+
+class StubModem(object):
+    """ Stands in for an IridiumModem, answering SBD sessions with a fixed status """
+
+    def __init__(self, port, signal=4, moStatus=0, gate=None):
+        self.port = port
+        self.signal = signal
+        self.moStatus = moStatus
+        self.gate = gate # threading.Event that sessions wait for, if set
+        self.sent = []
+        self.connected = False
+        self.error = None
+
+    def connect(self):
+        self.connected = True
+
+    def close(self):
+        self.connected = False
+
+    @property
+    def signalStrength(self):
+        return self.signal
+
+    def writeSBDMessageToIsu(self, msg):
+        self.sent.append(msg)
+
+    @property
+    def initiateSBDSession(self):
+        if self.gate != None:
+            self.gate.wait(5)
+        if self.error != None:
+            raise self.error
+        return SBDTransferStatus(len(self.sent), 0, self.moStatus > 4, False, 0, self.moStatus, 0)
+
+
+class TestModemPool(unittest.TestCase):
+    """ Tests routing of SBD messages across modems """
+
+    def test_bestSignalChosen(self):
+        weak, strong = StubModem('weak', signal=1), StubModem('strong', signal=5)
+        pool = ModemPool([weak, strong])
+        pool.connect()
+        pool.refreshSignalStrength()
+        status = pool.send(SBDBinaryMessage(data=b'hello')).result(5)
+        self.assertEqual(0, status.lastOutboundTransferStatus)
+        self.assertEqual(1, len(strong.sent))
+        self.assertEqual(0, len(weak.sent))
+        pool.close()
+        self.assertFalse(strong.connected)
+        with self.assertRaises(InvalidStateException):
+            pool.send(SBDBinaryMessage(data=b'late'))
+
+    def test_concurrentSessions(self):
+        gate = threading.Event()
+        modems = [StubModem(str(i), gate=gate) for i in range(3)]
+        pool = ModemPool(modems)
+        futures = [pool.send(SBDBinaryMessage(data=bytes([i]))) for i in range(4)]
+        # Three sessions are in progress at once; the fourth waits for a free modem
+        self.assertEqual(1, pool.queued)
+        for i in range(100):
+            if [len(modem.sent) for modem in modems] == [1, 1, 1]:
+                break
+            time.sleep(0.01)
+        self.assertEqual([1, 1, 1], [len(modem.sent) for modem in modems])
+        gate.set()
+        for future in futures:
+            future.result(5)
+        self.assertEqual(4, sum(len(modem.sent) for modem in modems))
+        pool.close()
+
+    def test_failuresLowerScore(self):
+        flaky, steady = StubModem('flaky', moStatus=32), StubModem('steady')
+        pool = ModemPool([flaky, steady])
+        pool.modems[1].lastUsed = 1 # so the flaky modem is tried first
+        self.assertEqual(32, pool.send(SBDBinaryMessage(data=b'1')).result(5).lastOutboundTransferStatus)
+        self.assertLess(pool.modems[0].successRate, 1.0)
+        self.assertEqual(1, pool.modems[0].failures)
+        for i in range(3):
+            pool.send(SBDBinaryMessage(data=b'2')).result(5)
+        self.assertEqual(1, len(flaky.sent))
+        self.assertEqual(3, len(steady.sent))
+        steady.error = TimeoutException()
+        with self.assertRaises(TimeoutException):
+            pool.send(SBDBinaryMessage(data=b'3')).result(5)
+        self.assertIs(steady.error, pool.modems[1].lastError)
+        pool.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.DEBUG)
+    unittest.main()
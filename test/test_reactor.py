@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+""" Test suite for iridiummodem.reactor """
+import sys, unittest, logging, threading
+sys.path.append('..')
+
+import serial
+import gsmmodem.serial_comms
+
+from iridiummodem.modem import IridiumModem, SBDBinaryMessage
+from iridiummodem.reactor import SerialReactor
+from test.ptymodem import PtyModem
+
+
+class TestSerialReactor(unittest.TestCase):
+    """ Tests IridiumModems sharing one reactor thread """
+
+    def setUp(self):
+        # Other test modules replace pyserial with a mock
+        self._serialModule = gsmmodem.serial_comms.serial
+        gsmmodem.serial_comms.serial = serial
+        self.reactor = SerialReactor()
+        self.reactor.start()
+
+    def tearDown(self):
+        self.reactor.stop()
+        gsmmodem.serial_comms.serial = self._serialModule
+
+    def test_manyModems(self):
+        fakes = [PtyModem({'AT+CSQ': '\r\n+CSQ:{0}\r\n\r\nOK\r\n'.format(i).encode()}) for i in range(4)]
+        modems = []
+        try:
+            for fake in fakes:
+                modem = IridiumModem(fake.port)
+                modem.reactor = self.reactor
+                modem.connect()
+                modems.append(modem)
+            self.assertEqual(set(modems), set(self.reactor.modems))
+            # The read threads exit as soon as the ports are handed to the reactor
+            for modem in modems:
+                modem.rxThread.join(5)
+                self.assertFalse(modem.rxThread.is_alive())
+            results = {}
+            def query(i):
+                results[i] = modems[i].signalStrength
+            threads = [threading.Thread(target=query, args=(i,)) for i in range(len(modems))]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual({0: 0, 1: 1, 2: 2, 3: 3}, results)
+        finally:
+            for modem in modems:
+                modem.close()
+            for fake in fakes:
+                fake.stop()
+        self.assertEqual([], self.reactor.modems)
+
+    def test_notificationsAndBinaryRead(self):
+        payload = b'\x00\r\nOK\r\n\xff'
+        msg = SBDBinaryMessage(data=bytearray(payload))
+        fake = PtyModem({'AT+SBDS': b'\r\n+SBDS: 0, 5, 1, 7\r\n\r\nOK\r\n',
+                         'AT+SBDRB': bytes([0, len(payload)]) + payload + bytes(msg.generateChecksum) + b'\r\nOK\r\n'})
+        notifications = []
+        received = threading.Event()
+        modem = IridiumModem(fake.port)
+        modem.reactor = self.reactor
+        def handleNotification(lines):
+            notifications.append(lines)
+            received.set()
+        try:
+            modem.connect()
+            modem.notifyCallback = handleNotification
+            fake.send(b'\r\nSBDRING\r\n')
+            self.assertTrue(received.wait(5))
+            self.assertEqual([['SBDRING']], notifications)
+            self.assertEqual(payload, bytes(modem.readSBDMessageFromIsu.data))
+        finally:
+            modem.close()
+            fake.stop()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.DEBUG)
+    unittest.main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+
+""" Test suite for iridiummodem.sampler """
+import sys, unittest, logging
+sys.path.append('..')
+
+from iridiummodem.sampler import SignalSampler
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestSignalSampler(unittest.TestCase):
+    """ Tests the rolling signal statistics """
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_empty(self):
+        sampler = SignalSampler(clock=self.clock)
+        self.assertIsNone(sampler.mean)
+        self.assertIsNone(sampler.minimum)
+        self.assertIsNone(sampler.percentile(0.5))
+        self.assertEqual(0.0, sampler.timeAbove(1))
+
+    def test_statistics(self):
+        sampler = SignalSampler(clock=self.clock)
+        for when, level in ((0, 1), (10, 3), (20, 5), (30, 2), (40, -1)):
+            sampler.add(level, 100 + when)
+        self.assertEqual(4, len(sampler))
+        self.assertEqual(2.75, sampler.mean)
+        self.assertEqual(1, sampler.minimum)
+        self.assertEqual(5, sampler.maximum)
+        self.assertEqual(2, sampler.latest)
+        self.assertEqual(2, sampler.percentile(0.5))
+        self.assertEqual(5, sampler.percentile(1.0))
+        # 3 from 110-120, 5 from 120-130, 2 from 130 until now
+        self.clock.now = 140
+        self.assertEqual(20, sampler.timeAbove(3))
+        self.assertEqual(30, sampler.timeAbove(2))
+        self.assertEqual(0.75, sampler.fractionAbove(2))
+
+    def test_ringBuffer(self):
+        sampler = SignalSampler(capacity=3, clock=self.clock)
+        for i, level in enumerate((0, 5, 5, 4, 1)):
+            sampler.add(level, 100 + i)
+        self.assertEqual([(102, 5), (103, 4), (104, 1)], sampler.samples())
+        self.assertEqual(1, sampler.minimum)
+        self.assertEqual(10 / 3.0, sampler.mean)
+        self.clock.now = 105
+        # Only the time between the samples still held counts
+        self.assertEqual(2, sampler.timeAbove(4))
+        self.assertEqual(3, sampler.timeAbove(0))
+
+    def test_sample(self):
+        class Modem(object):
+            signalStrengthFast = 4
+        sampler = SignalSampler(clock=self.clock)
+        self.assertEqual(4, sampler.sample(Modem()))
+        self.assertEqual(4, sampler.latest)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.DEBUG)
+    unittest.main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+
+""" Test suite for iridiummodem.sbdqueue """
+import sys, os, unittest, logging, tempfile
+sys.path.append('..')
+
+from iridiummodem.encoding import encodeVarint, decodeVarint
+from iridiummodem.modem import SBDTransferStatus, sbdMaxMOLength
+from iridiummodem.sbdqueue import SBDRecordQueue, packRecords, unpackRecords
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class StubModem(object):
+    def __init__(self, moStatuses):
+        self.moStatuses = list(moStatuses)
+        self.sent = []
+
+    def writeSBDMessageToIsu(self, msg):
+        self.sent.append(bytes(msg.data))
+
+    @property
+    def initiateSBDSession(self):
+        return SBDTransferStatus(len(self.sent), 0, False, False, 0, self.moStatuses.pop(0), 0)
+
+
+class TestSBDRecordQueue(unittest.TestCase):
+    """ Tests packing and persistence of queued records """
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_varint(self):
+        for value in (0, 1, 127, 128, 300, 16383, 16384, 2**40):
+            data = encodeVarint(value)
+            self.assertEqual((value, len(data)), decodeVarint(data))
+        self.assertEqual(b'\xac\x02', encodeVarint(300))
+        with self.assertRaises(ValueError):
+            decodeVarint(b'\x80')
+
+    def test_packing(self):
+        records = [b'', b'a' * 10, b'b' * 200]
+        self.assertEqual(records, unpackRecords(packRecords(records)))
+        with self.assertRaises(ValueError):
+            unpackRecords(b'\x05abc')
+
+    def test_maxMOLength(self):
+        self.assertEqual(340, sbdMaxMOLength('IRIDIUM 9600 Family SBD Transceiver'))
+        self.assertEqual(1960, sbdMaxMOLength('IRIDIUM 9523'))
+        self.assertEqual(340, sbdMaxMOLength(None))
+
+    def test_greedyPacking(self):
+        queue = SBDRecordQueue(maxPayload=100, clock=self.clock)
+        for size in (40, 40, 30, 10):
+            queue.put(b'x' * size)
+        self.assertEqual(124, queue.pendingBytes)
+        self.assertTrue(queue.payloadReady)
+        msg = queue.nextPayload()
+        # The 30 byte record does not fit after the first two, but the 10 byte one does
+        self.assertEqual([b'x' * 40, b'x' * 40, b'x' * 10], unpackRecords(msg.data))
+        self.assertLessEqual(len(msg.data), 100)
+        self.assertEqual(31, queue.pendingBytes)
+        queue.acknowledge(msg)
+        self.assertEqual(1, len(queue))
+        with self.assertRaises(ValueError):
+            queue.put(b'x' * 100)
+
+    def test_latency(self):
+        queue = SBDRecordQueue(maxLatency=60, clock=self.clock)
+        self.assertFalse(queue.payloadReady)
+        queue.put(b'hello')
+        self.assertFalse(queue.payloadReady)
+        self.clock.now += 60
+        self.assertTrue(queue.payloadReady)
+
+    def test_persistence(self):
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        try:
+            queue = SBDRecordQueue(path, clock=self.clock)
+            queue.put(b'one')
+            queue.put(b'two')
+            msg = queue.nextPayload()
+            self.assertIsNone(queue.nextPayload())
+            queue.close()
+            # Records that were in flight are sent again after a restart
+            queue = SBDRecordQueue(path, clock=self.clock)
+            self.assertEqual(unpackRecords(msg.data), unpackRecords(queue.nextPayload().data))
+            queue.close()
+        finally:
+            os.remove(path)
+
+    def test_flush(self):
+        queue = SBDRecordQueue(maxPayload=20, clock=self.clock)
+        for i in range(5):
+            queue.put(bytes([i]) * 8)
+        modem = StubModem([0, 18])
+        self.assertEqual(1, queue.flush(modem))
+        # The failed session leaves its records queued
+        self.assertEqual(3, len(queue))
+        self.assertEqual(2, len(modem.sent))
+        self.assertEqual(modem.sent[1], bytes(queue.nextPayload().data))
+        modem = StubModem([0, 0])
+        queue = SBDRecordQueue(maxPayload=20, clock=self.clock)
+        queue.put(b'short')
+        self.assertEqual(0, queue.flush(modem))
+        self.assertEqual(1, queue.flush(modem, force=True))
+        self.assertEqual(0, len(queue))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.DEBUG)
+    unittest.main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+
+""" Test suite for iridiummodem.scheduler """
+import sys, unittest, logging
+sys.path.append('..')
+
+from gsmmodem.exceptions import TimeoutException
+
+from iridiummodem.modem import SBDTransferStatus
+from iridiummodem.scheduler import SBDSessionScheduler, SBDSessionError, statusClass, SUCCESS, RADIO, BUSY, TRY_LATER, FATAL, GATEWAY
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class ScriptedModem(object):
+    """ Returns signal readings and SBD session results from lists """
+    def __init__(self, signals, moStatuses):
+        self.signals = list(signals)
+        self.moStatuses = list(moStatuses)
+        self.sessions = 0
+
+    @property
+    def signalStrength(self):
+        return self.signals.pop(0)
+
+    @property
+    def initiateSBDSession(self):
+        self.sessions += 1
+        return SBDTransferStatus(1, 0, False, False, 0, self.moStatuses.pop(0), 0)
+
+
+def status(moStatus):
+    return SBDTransferStatus(1, 0, False, False, 0, moStatus, 0)
+
+
+class TestSBDSessionScheduler(unittest.TestCase):
+    """ Tests SBD session scheduling and backoff """
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def scheduler(self, modem=None, **kwargs):
+        return SBDSessionScheduler(modem, clock=self.clock, sleep=self.clock.sleep, rand=lambda: 0, **kwargs)
+
+    def test_statusClass(self):
+        self.assertEqual(SUCCESS, statusClass(0))
+        self.assertEqual(SUCCESS, statusClass(4))
+        self.assertEqual(RADIO, statusClass(18))
+        self.assertEqual(BUSY, statusClass(35))
+        self.assertEqual(TRY_LATER, statusClass(36))
+        self.assertEqual(FATAL, statusClass(34))
+        self.assertEqual(GATEWAY, statusClass(99))
+
+    def test_backoff(self):
+        scheduler = self.scheduler()
+        scheduler.recordSignal(4)
+        self.assertTrue(scheduler.readyToSend)
+        self.assertEqual(RADIO, scheduler.recordOutcome(status(18)))
+        self.assertEqual(10, scheduler.backoffRemaining)
+        self.assertFalse(scheduler.readyToSend)
+        scheduler.recordOutcome(status(17))
+        self.assertEqual(20, scheduler.backoffRemaining)
+        # A different class of failure starts its own backoff
+        scheduler.recordOutcome(status(36))
+        self.assertEqual(180, scheduler.backoffRemaining)
+        scheduler.recordOutcome(status(0))
+        self.assertEqual(0, scheduler.backoffRemaining)
+
+    def test_jitter(self):
+        scheduler = SBDSessionScheduler(clock=self.clock, rand=lambda: 1)
+        scheduler.recordOutcome(status(18))
+        self.assertEqual(5, scheduler.backoffRemaining)
+
+    def test_signalRequired(self):
+        scheduler = self.scheduler()
+        self.assertFalse(scheduler.readyToSend)
+        scheduler.recordSignal(1)
+        self.assertFalse(scheduler.readyToSend)
+        scheduler.recordSignal(2)
+        self.assertTrue(scheduler.readyToSend)
+        # Old readings are not acted on
+        self.clock.now += 31
+        self.assertIsNone(scheduler.signal)
+        self.assertFalse(scheduler.readyToSend)
+
+    def test_expectedTimeToSend(self):
+        scheduler = self.scheduler()
+        scheduler.recordSignal(5)
+        good = scheduler.expectedTimeToSend()
+        scheduler.recordSignal(2)
+        fair = scheduler.expectedTimeToSend()
+        self.assertLess(good, fair)
+        scheduler.recordOutcome(status(36))
+        self.assertGreater(scheduler.expectedTimeToSend(), 180)
+        # Failures at a signal strength lower the estimate of success there
+        before = scheduler.successProbability(2)
+        scheduler.recordOutcome(status(32))
+        self.assertLess(scheduler.successProbability(2), before)
+
+    def test_runSession(self):
+        modem = ScriptedModem([1, 3, 4], [18, 0])
+        scheduler = self.scheduler(modem)
+        result = scheduler.runSession()
+        self.assertEqual(0, result.lastOutboundTransferStatus)
+        self.assertEqual(2, modem.sessions)
+        # Waited for signal, then backed off after the failed session
+        self.assertEqual([10, 10], self.clock.sleeps)
+
+    def test_runSession_fatal(self):
+        scheduler = self.scheduler(ScriptedModem([5], [34]))
+        with self.assertRaises(SBDSessionError) as cm:
+            scheduler.runSession()
+        self.assertEqual(34, cm.exception.status.lastOutboundTransferStatus)
+
+    def test_runSession_timeout(self):
+        scheduler = self.scheduler(ScriptedModem([0, 0, 0], []), signalPollInterval=10)
+        with self.assertRaises(TimeoutException):
+            scheduler.runSession(timeout=25)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.DEBUG)
+    unittest.main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+
+""" Test suite for iridiummodem.timeouts """
+import sys, unittest, logging
+sys.path.append('..')
+from iridiummodem.timeouts import CommandTimeoutPolicy, commandVerb, DEFAULT_TIMEOUT
+
+class TestCommandTimeoutPolicy(unittest.TestCase):
+    """ Tests the per-command timeout policy """
+
+    def test_commandVerb(self):
+        self.assertEqual('+SBDWB', commandVerb('AT+SBDWB=10'))
+        self.assertEqual('-MSSTM', commandVerb('AT-MSSTM'))
+        self.assertEqual('&K', commandVerb('AT&K3'))
+        self.assertEqual('Z', commandVerb('ATZ'))
+        self.assertEqual('+CIER', commandVerb('at+cier?'))
+        self.assertEqual('', commandVerb('AT'))
+        self.assertIsNone(commandVerb(b'\x01\x02'))
+
+    def test_defaults(self):
+        policy = CommandTimeoutPolicy()
+        self.assertEqual(300, policy.timeoutFor('AT+SBDIX'))
+        self.assertEqual(60, policy.timeoutFor('AT+CSQ'))
+        self.assertEqual(DEFAULT_TIMEOUT, policy.timeoutFor('AT+CGMI'))
+        self.assertEqual(DEFAULT_TIMEOUT, policy.timeoutFor(b'\x01\x02'))
+
+    def test_learning(self):
+        policy = CommandTimeoutPolicy(minSamples=3)
+        for elapsed in (0.5, 0.8, 1.0):
+            policy.record('AT+CGMI', elapsed, '9602')
+        # 95th percentile of the samples, doubled, plus a second of margin
+        self.assertAlmostEqual(3.0, policy.timeoutFor('AT+CGMI', '9602'))
+        # Other models are unaffected
+        self.assertEqual(DEFAULT_TIMEOUT, policy.timeoutFor('AT+CGMI', '9555'))
+        self.assertEqual([0.5, 0.8, 1.0], policy.samples('+CGMI', '9602'))
+
+    def test_fixedCommandsNotLearned(self):
+        policy = CommandTimeoutPolicy(minSamples=1)
+        policy.record('AT+SBDIX', 5)
+        self.assertEqual(300, policy.timeoutFor('AT+SBDIX'))
+
+    def test_timeoutLoosens(self):
+        policy = CommandTimeoutPolicy(minSamples=1, windowSize=2)
+        policy.record('AT+CGSN', 0.1)
+        self.assertEqual(2, policy.timeoutFor('AT+CGSN'))
+        policy.recordTimeout('AT+CGSN', 2)
+        self.assertEqual(5, policy.timeoutFor('AT+CGSN'))
+
+    def test_override(self):
+        policy = CommandTimeoutPolicy()
+        policy.setTimeout('+csq', 20, model='9602')
+        self.assertEqual(20, policy.timeoutFor('AT+CSQ', '9602'))
+        self.assertEqual(60, policy.timeoutFor('AT+CSQ', '9555'))
+        self.assertEqual(20, policy.table()[('9602', '+CSQ')])
+        policy.setTimeout('+CSQ', None, model='9602')
+        self.assertEqual(60, policy.timeoutFor('AT+CSQ', '9602'))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.DEBUG)
+    unittest.main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+
+""" Test suite for iridiummodem.track """
+import sys, time, unittest
+sys.path.append('..')
+
+from datetime import datetime, timezone
+
+from iridiummodem.encoding import encodeSignedVarint, decodeSignedVarint, zigzag
+from iridiummodem.geo import surfaceDistance
+from iridiummodem.gps import GpsFix
+from iridiummodem.modem import SBDBinaryMessage
+from iridiummodem.track import TrackCompressor, simplifyTrack, encodeTrack, decodeTrack
+
+START = 1586366735 # 2020-04-08 17:25:35 UTC
+
+
+def straightTrack(count, start=START, lat=50.75, lon=-1.36, dlat=0.0009, dlon=0.0):
+    """ @return: count fixes a minute apart, moving steadily (0.0009 degrees of latitude is about 100m) """
+    return [(lat + i * dlat, lon + i * dlon, start + i * 60) for i in range(count)]
+
+
+class TestTrack(unittest.TestCase):
+    """ Tests simplification and packing of position tracks """
+
+    def test_signedVarints(self):
+        self.assertEqual([0, 1, 2, 3, 4], [zigzag(value) for value in (0, -1, 1, -2, 2)])
+        for value in (0, 1, -1, 63, -64, 64, -65, 123456789, -123456789):
+            data = encodeSignedVarint(value)
+            self.assertEqual((value, len(data)), decodeSignedVarint(data))
+        self.assertEqual(1, len(encodeSignedVarint(-64)))
+
+    def test_simplifyStraightLine(self):
+        track = straightTrack(30)
+        self.assertEqual([track[0], track[-1]], simplifyTrack(track, 10))
+        # A turn is kept
+        track = straightTrack(30) + straightTrack(30, START + 1800, 50.75 + 30 * 0.0009, -1.36, 0.0, 0.0014)
+        simplified = simplifyTrack(track, 10)
+        self.assertEqual(3, len(simplified))
+        self.assertIn(track[30], simplified)
+        # As is a stop, though the position stays on the line
+        track = straightTrack(10) + [(50.75 + 9 * 0.0009, -1.36, START + 60 * (10 + i)) for i in range(10)] + \
+            straightTrack(10, START + 1200, 50.75 + 10 * 0.0009)
+        simplified = simplifyTrack(track, 10)
+        self.assertIn(track[9], simplified)
+        self.assertIn(track[19], simplified)
+
+    def test_errorBound(self):
+        # Wandering track: every dropped point is within the tolerance of the simplified track
+        track = [(50.75 + i * 0.0009 + (0.0002 if i % 3 == 0 else 0.0), -1.36 + (i % 7) * 0.00005, START + i * 60)
+                 for i in range(60)]
+        simplified = simplifyTrack(track, 25)
+        self.assertLess(len(simplified), len(track))
+        kept = [point[2] for point in simplified]
+        for point in track:
+            for before, after in zip(simplified, simplified[1:]):
+                if before[2] <= point[2] <= after[2]:
+                    fraction = (point[2] - before[2]) / float(after[2] - before[2])
+                    lat = before[0] + (after[0] - before[0]) * fraction
+                    lon = before[1] + (after[1] - before[1]) * fraction
+                    self.assertLessEqual(surfaceDistance(lat, lon, point[0], point[1]), 25.0001)
+                    break
+        self.assertEqual(kept, sorted(kept))
+
+    def test_encodeDecode(self):
+        track = [(50.75837, -1.36664, START), (50.759, -1.3651, START + 61), (-33.86882, 151.20929, START + 90000)]
+        data = encodeTrack(track)
+        self.assertEqual(track, decodeTrack(data))
+        # Fixes a minute and about 100m apart take 4 bytes each
+        data = encodeTrack(straightTrack(10))
+        self.assertEqual(1 + 12 + 9 * 4, len(data))
+        self.assertRaises(ValueError, encodeTrack, [(0, 0, START + 60), (0, 0, START)])
+        self.assertRaises(ValueError, decodeTrack, data[:-1])
+        self.assertRaises(ValueError, decodeTrack, b'')
+
+    def test_compressor(self):
+        compressor = TrackCompressor(tolerance=25, clock=lambda: START)
+        # An hour of mostly straight tracking, with one turn
+        track = straightTrack(30) + straightTrack(30, START + 1800, 50.75 + 30 * 0.0009, -1.36, 0.0, 0.0014)
+        for lat, lon, when in track:
+            compressor.add(lat, lon, datetime.fromtimestamp(when, timezone.utc))
+        compressor.addLocation([50.75 + 30 * 0.0009, -1.36 + 30 * 0.0014])
+        self.assertEqual(61, len(compressor))
+        message = compressor.message()
+        self.assertIsInstance(message, SBDBinaryMessage)
+        self.assertEqual(0, len(compressor))
+        points = decodeTrack(message.data)
+        self.assertEqual(START, points[0][2])
+        # Each fix on its own would take at least 12 bytes (two floats and a time)
+        self.assertLess(len(message.data) * 20, 61 * 12)
+        self.assertEqual(None, compressor.pack())
+
+    def test_maxPayload(self):
+        # A zigzag track, where every point is kept
+        track = [(50.75 + (0.01 if i % 2 else 0.0), -1.36, START + i * 60) for i in range(100)]
+        compressor = TrackCompressor(maxPayload=50)
+        for point in track:
+            compressor.add(*point)
+        blocks = []
+        while len(compressor) > 0:
+            block = compressor.pack()
+            self.assertLessEqual(len(block), 50)
+            blocks.append(block)
+        self.assertGreater(len(blocks), 1)
+        self.assertEqual(track, [point for block in blocks for point in decodeTrack(block)])
+
+    def test_sampleGps(self):
+        class FakeModem(object):
+            gpsFix = GpsFix(0.0, 0.0, False, time.monotonic())
+        modem = FakeModem()
+        compressor = TrackCompressor(clock=lambda: START)
+        # No fix: nothing is buffered
+        self.assertEqual(None, compressor.sample(modem, useGps=True))
+        self.assertEqual(0, len(compressor))
+        # A fix read 30 seconds ago is buffered at the time it was read
+        modem.gpsFix = GpsFix(50.75, -1.36, True, time.monotonic() - 30)
+        self.assertEqual([50.75, -1.36], compressor.sample(modem, useGps=True))
+        lat, lon, when = compressor.simplified()[0]
+        self.assertEqual((50.75, -1.36), (lat, lon))
+        self.assertAlmostEqual(START - 30, when, delta=1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+#!/usr/bin/python3.4
+
+import sys
+import argparse
+
+sys.path.append('..')
+
+from iridiummodem.compression import RawCodec, DeflateCodec, DeltaVarintCodec, trainDictionary, benchmark
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare SBD payload codecs on sample payloads')
+    parser.add_argument('samples', nargs='+',
+                        help='files holding one sample payload each')
+    parser.add_argument('--dictionary-size', dest='dictionarySize', type=int, default=1024,
+                        help='size of the preset dictionary trained on the samples (default: %(default)s)')
+    parser.add_argument('--save-dictionary', dest='saveDictionary',
+                        help='file to write the trained dictionary to')
+    parser.add_argument('--repeat', type=int, default=20,
+                        help='times to encode and decode each sample (default: %(default)s)')
+
+    args = parser.parse_args()
+
+    samples = []
+    for path in args.samples:
+        with open(path, 'rb') as f:
+            samples.append(f.read())
+
+    # Train on every other sample and measure on the rest, so the dictionary
+    # isn't judged on the payloads it was built from
+    training = samples[0::2]
+    testing = samples[1::2] if len(samples) > 1 else samples
+    dictionary = trainDictionary(training, args.dictionarySize)
+    if args.saveDictionary:
+        with open(args.saveDictionary, 'wb') as f:
+            f.write(dictionary)
+
+    codecs = [RawCodec(), DeflateCodec(), DeflateCodec(16, dictionary=dictionary),
+              DeltaVarintCodec(), DeltaVarintCodec(3, width=4)]
+    print('{0:<16} {1:>7} {2:>12} {3:>12} {4:>8}'.format('codec', 'ratio', 'encode us', 'decode us', 'skipped'))
+    for result in benchmark(codecs, testing, args.repeat):
+        if result['ratio'] == None:
+            print('{0:<16} {1:>7} {2:>12} {3:>12} {4:>8}'.format(result['name'], '-', '-', '-', result['skipped']))
+        else:
+            print('{0:<16} {1:>7.3f} {2:>12.1f} {3:>12.1f} {4:>8}'.format(result['name'], result['ratio'],
+                  result['encodeTime'] * 1e6, result['decodeTime'] * 1e6, result['skipped']))
@@ -11,6 +11,8 @@ import argparse
 sys.path.append('..')
 
 from iridiummodem.modem import IridiumModem
+from iridiummodem.capabilities import CapabilityStore
+from iridiummodem.fleet import discoverPorts, probeFleet, writeFleetReport
 commandList = { 'AT+ADJANT', 
                 # +CAPBD would edit the phonebook                
                 # 'AT+CAPBD', 
@@ -211,15 +213,40 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Check command support for a modem')
     parser.add_argument('--dev', dest='dev', default='/dev/ttyACM0',
                         help='serial device name (default: %(default)s)')
+    parser.add_argument('--store', default='capabilities.json',
+                        help='capability store to record the results in (default: %(default)s)')
+    parser.add_argument('--fleet', action='store_true',
+                        help='probe every attached modem at once instead of just --dev')
+    parser.add_argument('--report', default='fleet-report.json',
+                        help='report to write in --fleet mode (default: %(default)s)')
     args = parser.parse_args()
     logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.DEBUG)
+
+    if args.fleet:
+        ports = discoverPorts()
+        print('Probing '+format(ports))
+        results = probeFleet(ports, 19200, sorted(commandList), CapabilityStore(args.store))
+        for result in results:
+            if result.ok:
+                print(result.port+': '+format(result.capabilities.model)+' '+format(result.capabilities.imei)+' in '+format(result.elapsed)+'s')
+            else:
+                print(result.port+': failed: '+format(result.error))
+        writeFleetReport(results, args.report)
+        print('Saved to '+args.store+' and '+args.report)
+        exit(0 if all(result.ok for result in results) else -1)
+
     modem = IridiumModem(args.dev, 19200)
+    modem.capabilityStore = CapabilityStore(args.store)
     modem.connect()
 
-    for cmd in commandList:
-        try:
-            response = modem.write(cmd)
-            print(''+cmd+' response '+format(response))
-            sys.stdout.flush()
-        except:
-            pass
+    caps = modem.probeCommands(sorted(commandList))
+    for cmd in sorted(commandList):
+        support = caps.commands.get(cmd)
+        if support == None:
+            print(''+cmd+' no response')
+        elif support.supported:
+            print(''+cmd+' response '+format(support.shape)+' in '+format(support.latency)+'s')
+        else:
+            print(''+cmd+' not supported')
+        sys.stdout.flush()
+    print('Saved to '+args.store)
@@ -12,17 +12,39 @@ from __future__ import print_function
 import sys
 
 from iridiummodem.modem import IridiumModem
+from iridiummodem.fleet import discoverPorts, probeFleet, writeFleetReport
 from gsmmodem.exceptions import TimeoutException, PinRequiredError, IncorrectPinError
 
 def parseArgs():
     """ Argument parser for Python 2.7 and above """
     from argparse import ArgumentParser
     parser = ArgumentParser(description='Identify and debug attached GSM modem')    
-    parser.add_argument('port', metavar='PORT', help='port to which the GSM modem is connected; a number or a device name.')
+    parser.add_argument('port', metavar='PORT', nargs='?', help='port to which the GSM modem is connected; a number or a device name.')
     parser.add_argument('-b', '--baud', metavar='BAUDRATE', default=115200, help='set baud rate')
     parser.add_argument('-p', '--pin', metavar='PIN', default=None, help='SIM card PIN')
     parser.add_argument('-d', '--debug',  action='store_true', help='dump modem debug information (for python-gsmmodem development)')    
-    return parser.parse_args()
+    parser.add_argument('-f', '--fleet', action='store_true', help='identify every attached modem at once instead of PORT')
+    parser.add_argument('-r', '--report', metavar='FILE', default=None, help='write a JSON report of the modems found (with --fleet)')
+    args = parser.parse_args()
+    if args.port == None and not args.fleet:
+        parser.error('please specify a PORT to connect to, or --fleet')
+    return args
+
+def identifyFleet(args):
+    """ Identifies the modems on all attached ports in parallel """
+    ports = discoverPorts()
+    print('Identifying modems on {0}...'.format(', '.join(ports) if len(ports) > 0 else 'no ports'))
+    results = probeFleet(ports, int(args.baud))
+    print('\n== FLEET INFORMATION ==\n')
+    for result in results:
+        caps = result.capabilities
+        if caps != None:
+            print('{0}: {1} (IMEI {2}, {3})'.format(result.port, caps.model, caps.imei, caps.revision))
+        else:
+            print('{0}: not identified ({1})'.format(result.port, result.error))
+    if args.report != None:
+        writeFleetReport(results, args.report)
+    print()
 
 def parseArgsPy26():
     """ Argument parser for Python 2.6 """
@@ -42,6 +64,9 @@ def parseArgsPy26():
 def main():
     args = parseArgsPy26() if sys.version_info[0] == 2 and sys.version_info[1] < 7 else parseArgs()
     print ('args:',args)
+    if getattr(args, 'fleet', False):
+        identifyFleet(args)
+        return
     modem = IridiumModem(args.port, args.baud)    
     
     print('Connecting to GSM modem on {0}...'.format(args.port))
@@ -14,11 +14,14 @@ import dateutil.parser
 sys.path.append('..')
 
 from iridiummodem.modem import IridiumModem
+from iridiummodem.gps import PositionStream
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Start a voice call')
     parser.add_argument('--dev', dest='dev', default='/dev/ttyACM0',
                         help='serial device name (default: %(default)s)')
+    parser.add_argument('--follow', action='store_true',
+                        help='keep printing new positions as they are read')
     
     args = parser.parse_args()
 
@@ -32,3 +35,8 @@ if __name__ == '__main__':
     (lat, lon) = modem.gpsLocation
 
     print('lat '+format(lat)+' lon '+format(lon))
+
+    if args.follow:
+        for fix in PositionStream(modem).positions():
+            print('lat '+format(fix.latitude)+' lon '+format(fix.longitude)+(' (no fix)' if not fix.valid else ''))
+            sys.stdout.flush()
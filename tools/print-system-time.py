@@ -14,11 +14,14 @@ import dateutil.parser
 sys.path.append('..')
 
 from iridiummodem.modem import IridiumModem
+from iridiummodem.clock import IridiumClock
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Start a voice call')
     parser.add_argument('--dev', dest='dev', default='/dev/ttyUSB0',
                         help='serial device name (default: %(default)s)')
+    parser.add_argument('--offset', action='store_true',
+                        help='also print how far the system clock is behind Iridium time')
     
     args = parser.parse_args()
 
@@ -33,6 +36,11 @@ if __name__ == '__main__':
     
     timeStruct = modem.systemTime
     print('timeStruct '+format(timeStruct))
+    if args.offset:
+        clock = IridiumClock(modem)
+        uncertainty = clock.sync()
+        print('system clock offset {0:+.3f}s (+/- {1:.3f}s)'.format(clock.offset(), uncertainty))
+
     # This blows up with python3.4 on the PI :(
     timeString = time.strftime("%Y-%m-%d-%H:%M:%S", timeStruct)
     print('timeString '+format(timeString))
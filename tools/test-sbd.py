@@ -35,12 +35,8 @@ if __name__ == '__main__':
     #msgToSend = SBDBinaryMessage(data=b'hello')
     msgToSend = SBDBinaryMessage(data=bytearray(args.message, "utf-8"))
     
-    # Binary data can be sent but not read, mostly because the gsmmodem
-    # read data loop calls decode() (which defaults to utf-8) without 
-    # giving us a chance to pick up the binary data itself.
-    #
-    # No obvious combination of PYTHONCOERCECLOCALE, PYTHONUTF8, and LC_CTYPE
-    # seemed to make any difference with python 3.10 . . . 
+    # Binary data can be read back as well, as AT+SBDRB responses are read
+    # as raw bytes rather than through the gsmmodem text line reader.
     #msgToSend = SBDBinaryMessage(data=b'\x07\x08\xf0\x09\x10\x11')
 
     modem.writeSBDMessageToIsu(msgToSend)
@@ -51,5 +47,5 @@ if __name__ == '__main__':
     modem.copySentSBDToReceived
     rcvMsg = modem.readSBDMessageFromIsu
     modem.clearIsuSBDInboundMessage
-    print("rcvMsg |"+format(rcvMsg.data)+"|");
+    print("rcvMsg |"+format(bytes(rcvMsg.data))+"|");
     #modem.testStuff
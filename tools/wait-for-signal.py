@@ -18,6 +18,8 @@ if __name__ == '__main__':
                         help='serial device name (default: %(default)s)')
     parser.add_argument('--number', default='3',
                         help='number of successive samples required (default: %(default)s)')
+    parser.add_argument('--events', action='store_true',
+                        help='wait for indicator events (AT+CIER) instead of polling AT+CSQ')
     parser.add_argument('signal', help='minimum signal strength (1-5)')
     
     args = parser.parse_args()
@@ -25,11 +27,22 @@ if __name__ == '__main__':
     desiredNumber = int(args.number)
     #logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.DEBUG)
     modem = IridiumModem(args.dev, 19200)
+    modem.indicatorEvents = args.events
     modem.connect()
 
     print('modem.model '+format(modem.model))
     sys.stdout.flush()
-    
+
+    if args.events:
+        # The ISU only reports the signal when it changes, so ask for it to
+        # hold for as long as the polling below would take to see it
+        if modem.indicators.waitForSignal(desiredSignal, holdTime=10 * (desiredNumber - 1), timeout=900):
+            print('Success')
+            exit(0)
+        else:
+            print('Failed to acquire good signal')
+            exit(-1)
+
     count = 0
     successiveGoodSignals = 0
     while count < 90: